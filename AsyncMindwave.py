@@ -0,0 +1,176 @@
+"""
+class AsyncMindwave:
+    asyncio client for one ThinkGear connector (same protocol, headers and validation as Mindwave)
+    connect() / close(), or use it as an async context manager
+    authenticate_async(): 
+    - sends the authentication request on the open connection
+    stream_data():
+    - async iterator of (timestamp, entry) for every valid reading; the timeout also
+      covers connecting
+    collect_data():
+    - same json as Mindwave.collect_data(), without blocking the event loop
+
+stream_many() / collect_many():
+    - run many headsets (host:port endpoints, e.g. relay hosts) in one event loop
+"""
+
+import time
+import json
+import asyncio
+import hashlib
+import logging
+
+from Mindwave import Mindwave, ThinkGearReader, record_stats
+
+log = logging.getLogger(__name__)
+
+
+class AsyncMindwave(Mindwave):
+    def __init__(self, appname="myapp", appkey="mykey", host="127.0.0.1", port=13854):
+        Mindwave.__init__(self, appname, appkey, host, port)
+        self._reader = None
+        self._writer = None
+
+    async def connect(self, timeout=None):
+        """Opens the connection (raises asyncio.TimeoutError after <timeout> seconds) and sends the configuration. """
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.TGHOST, int(self.TGPORT)),
+                                                            timeout)
+        self._writer.write(self.CONFSTRING.encode('utf-8'))
+        await self._writer.drain()
+
+    async def authenticate_async(self):
+        """Sends the authentication request on the open connection. """
+        app_key = hashlib.sha1(self.APPKEY.encode('utf-8')).hexdigest()
+        auth_request = json.dumps({"appName": self.APPNAME, "appKey": app_key}, sort_keys=False)
+        self._writer.write(auth_request.encode('utf-8'))
+        await self._writer.drain()
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._reader = self._writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def stream_data(self, duration=40, timeout=80):
+        """Async iterator of (timestamp, entry) for <duration> valid readings.
+        Stops early and sets self.timed_out if it takes longer than <timeout> seconds,
+        connecting included. """
+        frames = ThinkGearReader(None)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + timeout
+        d = 0
+        invalid = 0
+        self.timed_out = False
+        try:
+            if self._writer is None:
+                try:
+                    await self.connect(timeout)
+                except asyncio.TimeoutError:
+                    log.warning('Could not connect to %s:%s within %s s', self.TGHOST, self.TGPORT, timeout)
+                    self.timed_out = True
+                    return
+            while d < duration:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.timed_out = True
+                    break
+                try:
+                    data = await asyncio.wait_for(self._reader.read(4096), min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    frames.timeouts += 1
+                    continue
+                except OSError as e:
+                    log.warning('Could not read from %s:%s: %s', self.TGHOST, self.TGPORT, e)
+                    self.timed_out = True
+                    break
+                if not data:
+                    # connector closed the connection
+                    self.timed_out = True
+                    break
+                for json_data in frames.feed(data):
+                    entry = self._entry(json_data)
+                    if entry is None:
+                        invalid += isinstance(json_data, dict) and 'eegPower' in json_data
+                        continue
+                    d += 1
+                    yield str(time.time()), entry
+                    if d >= duration:
+                        break
+        finally:
+            self.stats = dict(frames.stats(), readings=d, invalid=invalid)
+            record_stats(self.stats, self.timed_out, loop.time() - start)
+
+    async def collect_data(self, duration=40, timeout=80):
+        data_all = {}
+        async for t, entry in self.stream_data(duration, timeout):
+            data_all[t] = entry
+        if self.timed_out:
+            return None
+        return json.dumps(data_all)
+
+
+def _endpoint(endpoint):
+    """'host:port' or (host, port) -> (host, port). """
+    if isinstance(endpoint, str):
+        host, _, port = endpoint.rpartition(':')
+        return host, int(port)
+    return endpoint[0], int(endpoint[1])
+
+
+async def stream_many(endpoints, duration=40, timeout=80):
+    """Async iterator of (endpoint, timestamp, entry) merged from all headsets as readings arrive. """
+    queue = asyncio.Queue()
+    done = object()
+
+    async def pump(endpoint):
+        host, port = _endpoint(endpoint)
+        headset = AsyncMindwave(host=host, port=port)
+        try:
+            async for t, entry in headset.stream_data(duration, timeout):
+                await queue.put((endpoint, t, entry))
+        except OSError as e:
+            log.warning('Could not connect to %s: %s', endpoint, e)
+        finally:
+            await headset.close()
+            await queue.put(done)
+
+    tasks = [asyncio.ensure_future(pump(endpoint)) for endpoint in endpoints]
+    try:
+        running = len(tasks)
+        while running:
+            item = await queue.get()
+            if item is done:
+                running -= 1
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def collect_many(endpoints, duration=40, timeout=80):
+    """Collects from all headsets concurrently, returns {endpoint: json or None (timeout/error)}. """
+    async def collect(endpoint):
+        host, port = _endpoint(endpoint)
+        headset = AsyncMindwave(host=host, port=port)
+        try:
+            return await headset.collect_data(duration, timeout)
+        except OSError as e:
+            log.warning('Could not connect to %s: %s', endpoint, e)
+            return None
+        finally:
+            await headset.close()
+    results = await asyncio.gather(*[collect(endpoint) for endpoint in endpoints])
+    return dict(zip(endpoints, results))
@@ -1,26 +1,59 @@
 """
 class Dynamo :
-    - create/retrieve table on DynamoDB
-    - add item to table
-    - query table to retrieve items
+    - create/retrieve table on DynamoDB (checked once per process)
+    - add item to table, or a batch of items (batch_write_item, unprocessed items are resent)
+    - query table to retrieve items (paginated), or only the summary fields of items
+    - scan the whole table (paginated, optionally one segment of a parallel scan)
+    Every DynamoDB call is timed into metrics (dynamo_call_seconds{op=...}).
+    Implements storage.SessionStore. Dynamo.shared() returns the process-wide handle; all calls go
+    through the one thread-safe DynamoDB client of get_aws, which caches credentials and connections.
 """
 
 import numpy as np
 import time,json,sys
+import threading
+import logging
 
 import boto3
-from boto3.dynamodb.conditions import Key,Attr
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from botocore.exceptions import ClientError
 import get_aws as aws
+from storage import SessionStore
+import metrics
 
 DYNAMO_TABLE_NAME = "mindWave"
+BATCH_LIMIT = 25    # items per batch_write_item call
 
-class Dynamo:
+log = logging.getLogger(__name__)
+
+_shared = None
+_shared_lock = threading.Lock()
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _dump(item):
+    """Helper function: Python item -> DynamoDB attribute values. """
+    return {k: _serializer.serialize(v) for k, v in item.items()}
+
+
+def _load(item):
+    """Helper function: DynamoDB attribute values -> Python item (Binary, Decimal as with boto3 resources). """
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+class Dynamo(SessionStore):
     def __init__(self):
-        dynamo = aws.getResource('dynamodb')
+        dynamo = aws.getClient('dynamodb')
 
-        # First try and create the table
+        # Check the table once, create it if it does not exist
         try:
-            table = dynamo.create_table(
+            dynamo.describe_table(TableName=DYNAMO_TABLE_NAME)
+            log.info('Table ' + DYNAMO_TABLE_NAME + ' has been retrieved.')
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+            dynamo.create_table(
                 TableName=DYNAMO_TABLE_NAME,
                 KeySchema=[
                     {
@@ -47,28 +80,88 @@ class Dynamo:
                     'WriteCapacityUnits': 10
                 }
             )
-            while table.table_status != 'ACTIVE':
-                table.reload()
-            print ('Table ' + DYNAMO_TABLE_NAME + ' has been created.')
-        except Exception as e:
-            # print e
-            table = dynamo.Table(DYNAMO_TABLE_NAME)
-            print ('Table ' + DYNAMO_TABLE_NAME + ' has been retrieved.')
-        self.table_dynamo = table
-
-    def dynamoAdd(self, userName, time, data, result):
-        self.table_dynamo.put_item(
-            Item = {
-               'userName' : userName,
-               'time' : time,
-               'data' : data,
-               'result': result
-            }
-        )
+            dynamo.get_waiter('table_exists').wait(TableName=DYNAMO_TABLE_NAME)
+            log.info('Table ' + DYNAMO_TABLE_NAME + ' has been created.')
+
+    @classmethod
+    def shared(cls):
+        """Returns the process-wide Dynamo handle. """
+        global _shared
+        if _shared is None:
+            with _shared_lock:
+                if _shared is None:
+                    _shared = cls()
+        return _shared
+
+    @property
+    def client(self):
+        # shared by all threads, rebuilt by get_aws only when credentials are refreshed
+        return aws.getClient('dynamodb')
+
+    def dynamoAdd(self, userName, time, data, result, cls=None):
+        with metrics.timer('dynamo_call', op='put_item'):
+            self.client.put_item(TableName = DYNAMO_TABLE_NAME,
+                                 Item = _dump(self.makeItem(userName, time, data, result, cls)))
+
+    def dynamoAddBatch(self, items):
+        """Writes items made by makeItem() (the last one of a key wins), resending unprocessed items. """
+        unique = {(item['userName'], item['time']): item for item in items}
+        requests = [{'PutRequest': {'Item': _dump(item)}} for item in unique.values()]
+        for start in range(0, len(requests), BATCH_LIMIT):
+            pending = requests[start:start+BATCH_LIMIT]
+            attempt = 0
+            while pending:
+                with metrics.timer('dynamo_call', op='batch_write'):
+                    response = self.client.batch_write_item(RequestItems = {DYNAMO_TABLE_NAME: pending})
+                pending = response.get('UnprocessedItems', {}).get(DYNAMO_TABLE_NAME, [])
+                if pending:
+                    attempt += 1
+                    time.sleep(min(0.05 * 2 ** attempt, 1.0))
+
+    def _pages(self, operation='query', **kwargs):
+        """Helper function: yields items of all pages of a query (or scan). """
+        while True:
+            with metrics.timer('dynamo_call', op=operation):
+                response = getattr(self.client, operation)(TableName = DYNAMO_TABLE_NAME, **kwargs)
+            for item in response['Items']:
+                yield _load(item)
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _user_pages(self, userName, **kwargs):
+        """Helper function: yields the items of a user, in key order. """
+        names = dict(kwargs.pop('ExpressionAttributeNames', {}), **{'#u': 'userName'})
+        return self._pages(KeyConditionExpression = '#u = :u',
+                           ExpressionAttributeNames = names,
+                           ExpressionAttributeValues = {':u': {'S': userName}},
+                           **kwargs)
 
     def dynamoQuery(self, userName):
-        response = self.table_dynamo.query(
-            KeyConditionExpression = Key('userName').eq(userName)
+        return list(self._user_pages(userName))
+
+    def dynamoSummaries(self, userName):
+        """Yields time, result and cls (if stored) of every item of a user, in key order. """
+        return self._user_pages(
+            userName,
+            ProjectionExpression = '#t, #r, cls',
+            ExpressionAttributeNames = {'#t': 'time', '#r': 'result'}
         )
-        items = response['Items']
-        return items
\ No newline at end of file
+
+    def dynamoGetData(self, userName, time):
+        """Returns the data blob of one item (see session_codec.decode_session). """
+        with metrics.timer('dynamo_call', op='get_item'):
+            response = self.client.get_item(
+                TableName = DYNAMO_TABLE_NAME,
+                Key = _dump({'userName': userName, 'time': time}),
+                ProjectionExpression = '#d',
+                ExpressionAttributeNames = {'#d': 'data'}
+            )
+        return _load(response['Item'])['data']
+
+    def dynamoScan(self, segment=None, total_segments=None):
+        """Yields every item of the table, page by page. """
+        kwargs = {}
+        if total_segments:
+            kwargs.update(Segment = segment, TotalSegments = total_segments)
+        return self._pages('scan', **kwargs)
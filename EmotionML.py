@@ -5,65 +5,205 @@
 """
 class EmotionML: 
     - load EEG data
-    - clean data: remove missing values
-    - divide data into time series sequences
-    - extract feature from time series using tsfresh package
-    - classify emotion using machine learning ensemble
+    - clean data: remove missing values and 0s (optionally interpolate short gaps), data-quality report
+    - divide data into time series sequences (optionally overlapping, and of several sizes)
+    - extract feature from time series (native NumPy equivalent of tsfresh MinimalFCParameters, or tsfresh itself),
+      cached by content hash of the cleaned data (see feature_cache.py)
+    - classify emotion using machine learning ensemble, per-sequence votes aggregated
+      with optional recency weighting
+    Every stage is timed into metrics (emotionml_stage_seconds{stage=...}); progress is logged at DEBUG level.
 """
 
 # import libraries
-import os, glob, copy, warnings
+# (the ensemble's sklearn/xgboost modules are imported when the models are unpickled)
+import warnings
 warnings.filterwarnings('ignore')
 import numpy as np
 import pandas as pd
 import json
-import pickle
+import logging
 from statistics import mean 
-from tsfresh import extract_features
-from tsfresh.feature_extraction import MinimalFCParameters
-from sklearn import model_selection
-from sklearn.metrics import accuracy_score, log_loss
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier, GradientBoostingClassifier
-from sklearn.naive_bayes import GaussianNB
-from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
-from xgboost import XGBClassifier
-
-from voting import VotingClassifier
-
-MODEL_PATH = './Models/'
-MODEL_NAMES = ['./Models/KNeighborsClassifier_model.pkl',
-               './Models/DecisionTreeClassifier_model.pkl',
-               './Models/RandomForestClassifier_model.pkl',
-               './Models/AdaBoostClassifier_model.pkl',
-               './Models/GradientBoostingClassifier_model.pkl',
-               './Models/GaussianNB_model.pkl',
-               './Models/LinearDiscriminantAnalysis_model.pkl',
-               './Models/XGBClassifier_model.pkl']
-
-TSFRESH_SETTINGS = MinimalFCParameters()
+
+from registry import get_registry
+from features import extract_minimal_features, FEATURE_CALCULATORS
+from feature_cache import get_feature_cache, feature_key
+import metrics
+
 RAW_COLUMNS = ['attention', 'meditation', 'delta', 'theta', 'lowAlpha', 'highAlpha', 'lowBeta', 'highBeta', 'lowGamma', 'highGamma']
 COLUMNS = ['delta', 'theta', 'lowAlpha', 'highAlpha', 'lowBeta', 'highBeta', 'lowGamma', 'highGamma']
 NEW_COLUMNS = ['id', 'time', 'delta', 'theta', 'lowAlpha', 'highAlpha', 'lowBeta', 'highBeta', 'lowGamma', 'highGamma']
 SEQ_SIZE = 8
+CLASS_NAMES = ['very negative', 'negative', 'neutral', 'positive', 'very positive']
+NO_SEQUENCE = 'no complete sequence'    # error of a recording too short (or too noisy) to be scored
+
+log = logging.getLogger(__name__)
+
+
+def make_windows(values, seq_size=SEQ_SIZE, hop_size=None): 
+    """Cuts a (N, bands) array into windows without copying.
+
+    Parameter
+    ----------
+    values: array of shape (N, bands)
+    seq_size: number of samples per window
+    hop_size: samples between the starts of two windows (default: seq_size, no overlap)
+
+    Return
+    ----------
+    windows: read-only strided view of shape (num_windows, seq_size, bands).
+             Windows are aligned to the end of the recording, so the leading
+             (N - seq_size) % hop_size samples are skipped.
+    """
+    hop_size = hop_size or seq_size
+    assert seq_size > 0 and hop_size > 0, 'ERROR: seq_size and hop_size must be positive'
+    values = np.ascontiguousarray(values)
+    n, bands = values.shape
+    if n < seq_size: 
+        return np.empty((0, seq_size, bands), dtype=values.dtype)
+    num_windows = (n - seq_size) // hop_size + 1
+    skip = (n - seq_size) % hop_size
+    row, col = values.strides
+    return np.lib.stride_tricks.as_strided(values[skip:], 
+                                           shape=(num_windows, seq_size, bands), 
+                                           strides=(hop_size*row, row, col), 
+                                           writeable=False)
+
+
+def window_ends(n, seq_size=SEQ_SIZE, hop_size=None): 
+    """End (exclusive sample index) of every window make_windows(values of length n) returns. """
+    hop_size = hop_size or seq_size
+    if n < seq_size: 
+        return np.empty(0, dtype=int)
+    skip = (n - seq_size) % hop_size
+    return skip + seq_size + hop_size*np.arange((n - seq_size) // hop_size + 1)
+
+
+def windows_to_long(windows): 
+    """Converts (num_windows, seq_size, bands) windows to the long (id, time, band...) 
+    format of tsfresh in a single allocation. """
+    num_windows, seq_size, bands = windows.shape
+    table = np.empty((num_windows*seq_size, bands+2), dtype=float)
+    table[:, 0] = np.repeat(np.arange(num_windows), seq_size)
+    table[:, 1] = np.tile(np.arange(seq_size), num_windows)
+    table[:, 2:] = windows.reshape(num_windows*seq_size, bands)
+    return pd.DataFrame(table, columns=NEW_COLUMNS)
+
+
+def _runs(mask): 
+    """Start and end (exclusive) indices of the runs of True in a 1d boolean array. """
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def clean_bands(values, max_gap=0): 
+    """Typed cleaning of the 8 brainwave bands in one pass.
+
+    Parameter
+    ----------
+    values: array of shape (N, 8), numeric or numeric strings
+    max_gap: gaps (runs of invalid samples) of at most max_gap samples with valid samples on
+             both sides are linearly interpolated instead of dropped (default 0: drop every gap)
+
+    Return
+    ----------
+    cleaned: float array of shape (M, 8), no NaNs, no 0s
+    report: {'samples', 'kept', 'dropped', 'interpolated',
+             'invalid': {band: number of 0 or missing values},
+             'gaps': {'count', 'longest', 'mean', 'interpolated'}}
+    """
+    try: 
+        values = np.array(values, dtype=float)
+    except (TypeError, ValueError): 
+        # non-numeric entries become missing values (in a writable copy, interpolation fills it in place)
+        values = np.array(pd.DataFrame(values).apply(pd.to_numeric, errors='coerce').values, dtype=float)
+    assert values.ndim == 2 and values.shape[1] == len(COLUMNS), 'ERROR: number of columns is NOT 8'
+    n = values.shape[0]
+    invalid_cells = np.isnan(values) | (values == 0)
+    invalid = invalid_cells.any(axis=1)
+    starts, ends = _runs(invalid)
+    lengths = ends - starts
+    # gaps that are short enough and enclosed by valid samples
+    fill = (lengths <= max_gap) & (starts > 0) & (ends < n)
+    keep = ~invalid
+    if fill.any(): 
+        valid_idx = np.flatnonzero(~invalid)
+        fill_rows = np.zeros(n, dtype=bool)
+        for start, end in zip(starts[fill], ends[fill]): 
+            fill_rows[start:end] = True
+        fill_idx = np.flatnonzero(fill_rows)
+        for b in range(values.shape[1]): 
+            cells = fill_idx[invalid_cells[fill_idx, b]]
+            if cells.size: 
+                values[cells, b] = np.interp(cells, valid_idx, values[valid_idx, b])
+        keep |= fill_rows
+    cleaned = values[keep]
+    report = {
+        'samples': n, 
+        'kept': int(keep.sum()), 
+        'dropped': int(n - keep.sum()), 
+        'interpolated': int(lengths[fill].sum()), 
+        'invalid': dict(zip(COLUMNS, invalid_cells.sum(axis=0).tolist())), 
+        'gaps': {
+            'count': int(len(lengths)), 
+            'longest': int(lengths.max()) if len(lengths) else 0, 
+            'mean': float(lengths.mean()) if len(lengths) else 0.0, 
+            'interpolated': int(fill.sum()), 
+        }, 
+    }
+    return cleaned, report
+
 
 class EmotionML(object): 
-    def __init__(self): 
-        self.models = None
-        self.raw = None         # raw data from json.loads
+    def __init__(self, registry=None, seq_size=SEQ_SIZE, hop_size=None, feature_backend='native', max_gap=0, 
+                 feature_cache=None, seq_sizes=None, recency_half_life=None): 
+        """
+        seq_size: samples per sequence; seq_sizes: several sizes scored together (multi-resolution),
+                  the first one takes the place of seq_size. The ensemble is trained on SEQ_SIZE,
+                  so other sizes only make sense with models trained on them.
+        hop_size: samples between the starts of two sequences, smaller than the size for overlapping
+                  sequences (default: the size of each sequence, no overlap)
+        recency_half_life: the overall vote weighs each sequence by 0.5 ** (age / recency_half_life),
+                  age in samples from the end of the recording (default: plain mean)
+        """
+        assert feature_backend in ('native', 'tsfresh'), "ERROR: feature_backend must be 'native' or 'tsfresh'"
+        self.seq_sizes = tuple(seq_sizes or (seq_size,))
+        assert feature_backend == 'native' or len(self.seq_sizes) == 1, \
+               'ERROR: several sequence sizes need the native feature backend'
+        self.models = registry if registry is not None else get_registry()
+        self.seq_size = self.seq_sizes[0]
+        self.hop_size = hop_size    # None: every size hops by itself
+        self.recency_half_life = recency_half_life
+        self.feature_backend = feature_backend
+        self.max_gap = max_gap  # longest gap (in samples) that is interpolated instead of dropped
+        # FeatureCache, None for the process-wide one, False to disable caching
+        self.feature_cache = get_feature_cache() if feature_cache is None else feature_cache
+        self.raw = None         # raw data from json.loads, or the ReadingBuffer
+        self.times = None       # timestamps of the readings, as strings
         self.data = None        # pd dataframe
         self.cleaned = None     # data after cleaning
-        self.sequences = None
+        self.quality = None     # data-quality report of the cleaning, see clean_bands()
+        self.sequences = None   # sequences of seq_size
+        self.windows = None     # [(size, sequences)] for every size in seq_sizes
+        self.window_ends = None # end (sample index in the cleaned data) of every row of MLInput
         self.MLInput = None
 
+    @metrics.timer('emotionml_stage', stage='load_data')
     def load_data(self, json_data): 
         """Loads data from json and convert to pandas dataframe. """
         loaded = json.loads(json_data)
         self.raw = loaded
+        self.times = list(loaded.keys())
         df = pd.DataFrame.from_dict(loaded, orient='index', columns=RAW_COLUMNS)
         self.data = df
-        print('Data loaded. ')
+        log.debug('Data loaded. ')
+
+    @metrics.timer('emotionml_stage', stage='load_data')
+    def load_buffer(self, buffer): 
+        """Loads data from a readings.ReadingBuffer (typed, no json round trip). """
+        self.raw = buffer
+        self.times = [repr(t) for t in buffer.times().tolist()]
+        self.data = pd.DataFrame(buffer.values(), columns=RAW_COLUMNS, copy=False)
+        log.debug('Data loaded. ')
 
     def __clean_df(self, df): 
         """Helper funtion: cleans a dataframe
@@ -73,63 +213,44 @@ class EmotionML(object):
 
         Return
         ----------
-        df: 8 columns (removed attention and meditation), no NaNs, no 0s
+        df: 8 float columns (removed attention and meditation), no NaNs, no 0s
+        report: data-quality report, see clean_bands()
         """
         # check if columns are correct
         assert df.shape[1] == 10, 'ERROR: number of columns is NOT 10'
         assert df.columns[0] == 'attention' and df.columns[1] == 'meditation', \
                "ERROR: headers of first 2 columns are not 'attention' and 'meditation'"
-        # drop attention and meditation columns
-        df = df.iloc[:, 2:]
-        # drop rows with any 0
-        df = df[(df != 0).all(1)]
-        # drop rows with missing values
-        df = df.dropna()
-        # reset index
-        df.reset_index(drop=True, inplace=True)
-        return df
+        # drop attention and meditation columns, cast once and clean
+        cleaned, report = clean_bands(df.values[:, 2:], self.max_gap)
+        return pd.DataFrame(cleaned, columns=df.columns[2:], copy=False), report
 
+    @metrics.timer('emotionml_stage', stage='clean')
     def _clean_data(self): 
         """Cleans data for preprocessing. """
         df = self.data
-        # check if data is loaded
-        assert df.empty == False, 'ERROR: data not loaded, please load data first. '
+        # check if data is loaded (an empty recording is cleaned to no sequences)
+        assert df is not None, 'ERROR: data not loaded, please load data first. '
         # clean data
-        df = self.__clean_df(df)
+        df, self.quality = self.__clean_df(df)
         self.cleaned = df
-        print('Data cleaning completed. ')
-
-    def __gen_seq(self, df, seq_size): 
-        """Helper function: generates sequences from a dataframe. """
-        ret = []
-        num_seq = int(df.shape[0] / seq_size)
-        skip = df.shape[0] % seq_size
-        for i in range(num_seq): 
-            ret.append([df.iloc[skip+i*seq_size:skip+(i+1)*seq_size, :].values])
-            #ret[i].reset_index(drop=True, inplace=True)
-        return ret
+        log.debug('Data cleaning completed: %d of %d samples kept, %d interpolated. ', 
+                  self.quality['kept'], self.quality['samples'], self.quality['interpolated'])
 
+    @metrics.timer('emotionml_stage', stage='data2seq')
     def _data2seq(self): 
         """Converts data to sequences for feature extraction. E.g. 40 seconds of data --> 5 sequences * 8 second/sequence"""
         df = self.cleaned
         # check if number of cols is 8
         assert df.shape[1] == 8, 'ERROR: number of columns is NOT 8'
-        # generate sequences
-        seqs = self.__gen_seq(df, SEQ_SIZE)
-        # convert to np array
-        self.sequences = np.asarray(seqs)
-        print('Data converted to sequences of size {}.'.format(SEQ_SIZE))
-
-    def __format_tsfresh(self, seqs, ret):
-        """Helper function: converts sequences to input format of tsfresh"""
-        for i in range(seqs.shape[0]): 
-            df = pd.DataFrame(data=seqs[i, 0], columns=COLUMNS)
-            df = df.assign(id=[i]*SEQ_SIZE)
-            df = df.assign(time=df.index)
-            df = df.reindex(columns = NEW_COLUMNS)
-            ret = ret.append(df)
-        return ret
+        # generate sequences: (num_seq, size, 8) per size, all views of the same array
+        values = np.asarray(df.values, dtype=float)
+        self.windows = [(size, make_windows(values, size, self.hop_size or size)) for size in self.seq_sizes]
+        self.window_ends = np.concatenate([window_ends(len(values), size, self.hop_size or size) 
+                                           for size in self.seq_sizes])
+        self.sequences = self.windows[0][1]
+        log.debug('Data converted to sequences of size %s.', ', '.join(map(str, self.seq_sizes)))
 
+    @metrics.timer('emotionml_stage', stage='preprocess')
     def preprocess(self): 
         """Extracts features from sequences"""
         self._clean_data()
@@ -137,17 +258,35 @@ class EmotionML(object):
         # check if sequences is available
         assert self.sequences is not None, 'ERROR: no sequences available, please run data2seq first'
 
-        # format sequences for tsfresh
-        formated_seqs = pd.DataFrame(columns=NEW_COLUMNS)
-        formated_seqs = self.__format_tsfresh(self.sequences, formated_seqs)
-        # reset index and convert to float
-        formated_seqs.reset_index(drop=True, inplace=True)
-        formated_seqs = formated_seqs.astype(float)
+        # reuse features of identical recordings
+        key = None
+        if self.feature_cache: 
+            key = feature_key(self.cleaned.values, seq_sizes=self.seq_sizes, hop_size=self.hop_size, 
+                              backend=self.feature_backend, features=tuple(sorted(FEATURE_CALCULATORS)))
+            cached = self.feature_cache.get(key)
+            if cached is not None: 
+                self.MLInput = cached
+                metrics.inc('feature_cache_hits')
+                log.debug('Data preprocessing completed (cached features). ')
+                return
 
         # extract features
-        features = extract_features(formated_seqs, column_id="id", column_sort="time", default_fc_parameters=TSFRESH_SETTINGS)
-        self.MLInput = np.array(features)
-        print('Data preprocessing completed. ')
+        if key is not None: 
+            metrics.inc('feature_cache_misses')
+        with metrics.timer('emotionml_stage', stage='extract_features'): 
+            if self.feature_backend == 'native': 
+                self.MLInput = np.concatenate([extract_minimal_features(sequences, COLUMNS) 
+                                               for _, sequences in self.windows])
+            else: 
+                from tsfresh import extract_features
+                from tsfresh.feature_extraction import MinimalFCParameters
+                # format sequences for tsfresh
+                formated_seqs = windows_to_long(self.sequences)
+                features = extract_features(formated_seqs, column_id="id", column_sort="time", default_fc_parameters=MinimalFCParameters())
+                self.MLInput = np.array(features)
+        if key is not None: 
+            self.MLInput = self.feature_cache.put(key, self.MLInput)
+        log.debug('Data preprocessing completed. ')
 
     def prob2class(self, prob): 
         if prob <= 0.2: 
@@ -162,46 +301,162 @@ class EmotionML(object):
             c = 5
         return c
 
+    def aggregate(self, display_probs, ends=None): 
+        """Overall probability of a recording from its per-sequence probabilities
+        (recency-weighted mean with recency_half_life, else the mean). """
+        if not self.recency_half_life: 
+            return mean(display_probs)
+        ends = np.asarray(self.window_ends if ends is None else ends, dtype=float)
+        weights = 0.5 ** ((ends.max() - ends) / self.recency_half_life)
+        return float(np.average(np.asarray(display_probs, dtype=float), weights=weights))
+
+    def vote(self, prob): 
+        """Converts a probability to [percentage, class, class name]. """
+        c = self.prob2class(prob)
+        return [round(prob*100), c, CLASS_NAMES[c-1]]
+
+    @metrics.timer('emotionml_stage', stage='predict')
     def predict(self): 
-        # load models
-        knn = pickle.load(open(MODEL_NAMES[0], 'rb'))
-        rf = pickle.load(open(MODEL_NAMES[2], 'rb'))
-        adaB = pickle.load(open(MODEL_NAMES[3], 'rb'))
-        gb = pickle.load(open(MODEL_NAMES[4], 'rb'))
-        nb = pickle.load(open(MODEL_NAMES[5], 'rb'))
-        lda = pickle.load(open(MODEL_NAMES[6], 'rb'))
-        xgb = pickle.load(open(MODEL_NAMES[7], 'rb'))
-
-        voting_clf = VotingClassifier(
-                estimators = [('xgb', xgb), ('knn', knn), ('rf', rf), ('gb', gb), ('adaB', adaB), ('nb', nb), ('lda', lda)],
-                voting = 'hard')
+        # shared ensemble, loaded once per process
+        voting_clf = self.models.voting_classifier()
         #model_predictions = voting_clf._predict(self.MLInput)
         #model_probs = voting_clf._collect_probas(self.MLInput)
+        if len(self.MLInput) == 0: 
+            raise ValueError(NO_SEQUENCE)
         _, display_probs = voting_clf.predict(self.MLInput)
-        avg_prob = mean(display_probs)
-        final_c = self.prob2class(avg_prob)
-        Cs = []
-        for prob in display_probs: 
-            Cs.append(self.prob2class(prob))
-        class_names = ['very negative', 'negative', 'neutral', 'positive', 'very positive']
+        return self._assemble_result(display_probs)
+
+    @classmethod
+    def score_batch(cls, recordings, registry=None, **kwargs): 
+        """Scores many recordings with one ensemble pass, one recording failing does not stop the others.
+
+        Parameter
+        ----------
+        recordings: list of json strings (as accepted by load_data) or readings.ReadingBuffer
+        registry, kwargs: passed to EmotionML()
+
+        Return
+        ----------
+        list of (ML, display_probs, error), one per recording: the EmotionML object and its
+        per-sequence probabilities, or (ML or None, None, error message) if it could not be scored
+        """
+        scored = []
+        for recording in recordings: 
+            ML = cls(registry, **kwargs)
+            try: 
+                if isinstance(recording, str): 
+                    ML.load_data(recording)
+                else: 
+                    ML.load_buffer(recording)
+                ML.preprocess()
+                error = NO_SEQUENCE if len(ML.MLInput) == 0 else ''
+            except Exception as e: 
+                log.warning('Recording %d could not be scored: %s', len(scored), e)
+                error = '{}: {}'.format(type(e).__name__, e)
+            scored.append((ML, None, error))
+        inputs = [ML.MLInput for ML, _, error in scored if not error]
+        if not inputs: 
+            return scored
+        groups = iter(scored[0][0].models.voting_classifier().predict_groups(inputs))
+        return [(ML, None, error) if error else (ML, next(groups)[1], error) for ML, _, error in scored]
+
+    @classmethod
+    def predict_batch(cls, recordings, registry=None, **kwargs): 
+        """Predicts many recordings (e.g. archived sessions) with one ensemble pass.
+
+        Parameter
+        ----------
+        recordings, registry, kwargs: see score_batch()
+
+        Return
+        ----------
+        list of dicts, one per recording, same structure as predict(); a recording that could
+        not be scored gives {'error': <message>, 'vote0': [nan, -1, None]}
+        """
+        return [{'error': error, 'vote0': [np.nan, -1, None]} if error else ML._assemble_result(display_probs)
+                for ML, display_probs, error in cls.score_batch(recordings, registry, **kwargs)]
+
+    def _assemble_result(self, display_probs, ends=None): 
+        """Builds the result dict (overall vote, per-sequence votes and raw series) from per-sequence probabilities. """
+        if len(display_probs) == 0: 
+            raise ValueError(NO_SEQUENCE)
         ret = {}
-        ret['vote0'] = [round(avg_prob*100), final_c, class_names[final_c-1]]
-        ret['vote1'] = [round(display_probs[0]*100), Cs[0], class_names[Cs[0]-1]]
-        ret['vote2'] = [round(display_probs[1]*100), Cs[1], class_names[Cs[1]-1]]
-        ret['vote3'] = [round(display_probs[2]*100), Cs[2], class_names[Cs[2]-1]]
-        ret['vote4'] = [round(display_probs[3]*100), Cs[3], class_names[Cs[3]-1]]
-        ret['vote5'] = [round(display_probs[4]*100), Cs[4], class_names[Cs[4]-1]]
-        ret['feat_time'] = list(self.raw.keys())
-        ret['attention'] = self.data['attention'].tolist()
-        ret['meditation'] = self.data['meditation'].tolist()
-        ret['delta'] = self.data['delta'].tolist()
-        ret['theta'] = self.data['theta'].tolist()
-        ret['lowAlpha'] = self.data['lowAlpha'].tolist()
-        ret['highAlpha'] = self.data['highAlpha'].tolist()
-        ret['lowBeta'] = self.data['lowBeta'].tolist()
-        ret['highBeta'] = self.data['highBeta'].tolist()
-        ret['lowGamma'] = self.data['lowGamma'].tolist()
-        ret['highGamma'] = self.data['highGamma'].tolist()
+        ends = np.asarray(self.window_ends if ends is None else ends)
+        ret['vote0'] = self.vote(self.aggregate(display_probs, ends))
+        # vote1..vote5: 5 consecutive parts of the recording (one sequence each for 5 sequences)
+        probs = np.asarray(display_probs, dtype=float)[np.argsort(ends, kind='stable')]
+        if len(probs) >= 5: 
+            parts = [part.mean() for part in np.array_split(probs, 5)]
+        else: 
+            parts = probs[np.round(np.linspace(0, len(probs)-1, 5)).astype(int)]
+        for i, prob in enumerate(parts): 
+            ret['vote{}'.format(i+1)] = self.vote(float(prob))
+        ret['feat_time'] = list(self.times)
+        ret['attention'] = self._series('attention')
+        ret['meditation'] = self._series('meditation')
+        ret['delta'] = self._series('delta')
+        ret['theta'] = self._series('theta')
+        ret['lowAlpha'] = self._series('lowAlpha')
+        ret['highAlpha'] = self._series('highAlpha')
+        ret['lowBeta'] = self._series('lowBeta')
+        ret['highBeta'] = self._series('highBeta')
+        ret['lowGamma'] = self._series('lowGamma')
+        ret['highGamma'] = self._series('highGamma')
 
         return ret
 
+    def _series(self, column): 
+        """A raw series as the strings of Mindwave.collect_data(), whether loaded from json or a ReadingBuffer. """
+        return [str(v) for v in self.data[column].tolist()]
+
+    def stream_predict(self, readings): 
+        """Scores readings as they arrive, e.g. from Mindwave.stream_data().
+
+        Parameter
+        ----------
+        readings: iterable of (timestamp, entry), entry holding the 10 values of RAW_COLUMNS
+
+        Yields
+        ----------
+        {'type': 'window', 'index': i, 'size': size, 'vote': [percentage, class, class name]} as soon
+        as a sequence of <size> clean samples is complete (then every hop samples), for every size
+        in seq_sizes, and {'type': 'result', 'result': <same dict as predict()>} once readings are
+        exhausted. Sequences start at the first clean sample instead of being aligned to the end.
+        """
+        voting_clf = self.models.voting_classifier()
+        raw = {}
+        window = np.empty((max(self.seq_sizes), len(COLUMNS)))
+        filled = 0                                      # clean samples seen so far
+        since_last = dict.fromkeys(self.seq_sizes, 0)   # clean samples since the last scored sequence
+        features = []
+        display_probs = []
+        ends = []
+        for t, entry in readings: 
+            raw[t] = entry
+            bands = np.asarray(entry[2:], dtype=float)
+            # same validity rule as __clean_df: no 0s, no NaNs
+            if bands.shape[0] != len(COLUMNS) or not np.all(bands != 0) or np.isnan(bands).any(): 
+                continue
+            # rolling window: drop the oldest sample, append the newest
+            window[:-1] = window[1:]
+            window[-1] = bands
+            filled += 1
+            for size in self.seq_sizes: 
+                since_last[size] += 1
+                if filled < size or (filled > size and since_last[size] < (self.hop_size or size)): 
+                    continue
+                since_last[size] = 0
+                feat = extract_minimal_features(window[np.newaxis, -size:], COLUMNS)
+                _, prob = voting_clf.predict(feat)
+                features.append(feat[0])
+                display_probs.append(prob[0])
+                ends.append(filled)
+                yield {'type': 'window', 'index': len(display_probs)-1, 'size': size, 'vote': self.vote(prob[0])}
+
+        # aggregate over the whole recording
+        self.raw = raw
+        self.times = list(raw.keys())
+        self.data = pd.DataFrame.from_dict(raw, orient='index', columns=RAW_COLUMNS)
+        self.MLInput = np.asarray(features).reshape(-1, len(COLUMNS)*len(FEATURE_CALCULATORS))
+        self.window_ends = np.asarray(ends, dtype=int)
+        yield {'type': 'result', 'result': self._assemble_result(display_probs)}
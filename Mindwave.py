@@ -8,10 +8,22 @@ class Mindwave:
     authenticate(): 
     - sends authentication request to the headset
     - each device only need to authenticate once
+    stream_values() / stream_data(): 
+    - reads data from the headset through ThinkGearReader (framed, select-based)
+    - yields (timestamp, values) for every valid reading as soon as it arrives, typed or as strings
+    collect_buffer(): 
+    - fills a readings.ReadingBuffer with <duration> seconds of data in place
     collect_data(): 
-    - reads data from the headset
-    - return 1 json containing <duration> seconds of data with timestamp as key
+    - same, exported as 1 json containing <duration> seconds of data with timestamp as key
     - For ML, use duration=40 to collect 40 seconds of data (8 second/prediction * 5 predictions)
+
+class ThinkGearReader: 
+    - buffered, line-framed reader of the ThinkGear JSON stream
+    - yields every complete JSON message, including those split across recv() calls
+    - counts frames, malformed frames and dropped (oversized) data
+
+Socket reads are timed into metrics (thinkgear_read_seconds), frame/drop counters of every
+capture are added to the mindwave_* counters; messages are logged at DEBUG level.
 """
 
 # import libraries
@@ -19,14 +31,84 @@ import time
 import json
 import socket, select
 import hashlib
-import numpy as np
+import logging
+
+from readings import ReadingBuffer
+import metrics
+
+log = logging.getLogger(__name__)
+
+MAX_FRAME = 65536   # bytes without a frame terminator before the buffer is dropped
+
+
+class ThinkGearReader(object): 
+    def __init__(self, sock, bufsize=4096): 
+        self.sock = sock
+        self._chunk = bytearray(bufsize)     # reused by every recv_into
+        self._view = memoryview(self._chunk)
+        self._buffer = bytearray()           # bytes of the current, incomplete frame
+        self.frames = 0
+        self.malformed = 0
+        self.dropped = 0
+        self.timeouts = 0
+
+    def feed(self, data): 
+        """Adds received bytes, returns the complete JSON messages. ThinkGear ends
+        each message with '\r' (some connectors send '\r\n'). """
+        self._buffer += data
+        messages = []
+        start = 0
+        while True: 
+            end = self._buffer.find(b'\r', start)
+            if end < 0: 
+                break
+            frame = bytes(self._buffer[start:end]).strip()
+            start = end + 1
+            if not frame: 
+                continue
+            try: 
+                messages.append(json.loads(frame.decode('utf-8')))
+                self.frames += 1
+            except ValueError: 
+                self.malformed += 1
+        del self._buffer[:start]
+        if len(self._buffer) > MAX_FRAME: 
+            self.dropped += 1
+            del self._buffer[:]
+        return messages
+
+    def read(self, timeout): 
+        """Waits up to <timeout> seconds for data, returns the complete JSON messages. """
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready: 
+            self.timeouts += 1
+            return []
+        n = self.sock.recv_into(self._chunk)
+        if n == 0: 
+            raise ConnectionError('ThinkGear connector closed the connection')
+        return self.feed(self._view[:n])
+
+    def stats(self): 
+        return {'frames': self.frames, 'malformed': self.malformed, 
+                'dropped': self.dropped, 'timeouts': self.timeouts}
+
+
+def record_stats(stats, timed_out, seconds): 
+    """Adds the counters of one capture (Mindwave.stats) to the process-wide metrics. """
+    for name, value in stats.items(): 
+        metrics.inc('mindwave_' + name, value)
+    metrics.inc('mindwave_captures', timed_out=str(timed_out).lower())
+    metrics.observe('mindwave_capture', seconds)
+
 
 class Mindwave(object): 
-    def __init__(self, appname="myapp", appkey="mykey"): 
-        self.TGHOST = "127.0.0.1"
-        self.TGPORT = 13854
+    def __init__(self, appname="myapp", appkey="mykey", host="127.0.0.1", port=13854): 
+        self.TGHOST = host
+        self.TGPORT = port
         self.APPNAME = appname
         self.APPKEY = appkey
+        self.timed_out = False
+        self.stats = {}
         self.CONFSTRING = '{"enableRawOutput": false, "format": "Json"}'
         self.HEADER_EEGPOWER = [u'delta',
                                 u'theta',
@@ -40,25 +122,48 @@ class Mindwave(object):
                               u'meditation']
 
     def authenticate(self): 
-        # open socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((self.TGHOST, int(self.TGPORT)))
-        
         # hash app key
         app_key = hashlib.sha1(self.APPKEY.encode('utf-8')).hexdigest()
-
-        # authenticate
         auth_request = json.dumps({"appName": self.APPNAME, "appKey": app_key}, sort_keys=False)
-        sock.setblocking(0)
-        sock.send(str(auth_request).encode('utf-8'))
-        print('Authentication request sent. ')
-        try:
-            sock.recv(1024)
-            print('Authentication complete. ')
-        except:
-            print('Device already authenticated. ')
 
-    def collect_data(self, duration=40): 
+        # open socket, closed once the request is answered (or found to be unnecessary)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock: 
+            sock.connect((self.TGHOST, int(self.TGPORT)))
+
+            # authenticate
+            sock.setblocking(0)
+            sock.send(str(auth_request).encode('utf-8'))
+            log.debug('Authentication request sent. ')
+            try:
+                sock.recv(1024)
+                log.info('Authentication complete. ')
+            except OSError:
+                log.info('Device already authenticated. ')
+
+    def _values(self, json_data): 
+        """Returns the 10 values of a reading as ints, or None if the message is not a valid reading. """
+        if not isinstance(json_data, dict) or 'eegPower' not in json_data: 
+            return None
+        esense = json_data.get('eSense', {})
+        power = json_data['eegPower']
+        try: 
+            values = [int(esense[i]) for i in self.HEADER_ESENSE] + [int(power[i]) for i in self.HEADER_EEGPOWER]
+        except (KeyError, TypeError, ValueError): 
+            return None
+        # check if data is valid (no 0s, no empty values)
+        if 0 in values: 
+            return None
+        return values
+
+    def _entry(self, json_data): 
+        """Returns the 10 values of a reading as strings, or None if the message is not a valid reading. """
+        values = self._values(json_data)
+        return None if values is None else [str(v) for v in values]
+
+    def stream_values(self, duration=40, timeout=80): 
+        """Yields (timestamp, values) for <duration> valid readings, values as 10 ints. 
+        Stops early and sets self.timed_out if it takes longer than <timeout> seconds. 
+        Frame counters of the last stream are kept in self.stats. """
         # open socket
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.connect((self.TGHOST, int(self.TGPORT)))
@@ -66,54 +171,62 @@ class Mindwave(object):
         # configuration
         sock.send(self.CONFSTRING.encode('utf-8'))
 
-        data_all = {}
-        s = '\r\n'.encode('utf-8')
+        reader = ThinkGearReader(sock)
         d = 0
+        invalid = 0
+        self.timed_out = False
         start_time = time.time()
-        print('Data collection started. Do not remove headset. ')
-        while (d<duration):
-            # entry: array to hold one-time reading
-            entry = []
-            try:
-                print('Reading data ', d)
-                data = sock.recv(1024).strip()
-                if s in data: 
-                    data = data.split(s)[1]
-                #print(data)
-                json_data = json.loads(data)
-                print(json_data)
-                # read data and add entry to json_all
-                if 'eegPower' in json_data:
-                    for i in self.HEADER_ESENSE:
-                        if i in json_data['eSense']:
-                            entry.append(str(json_data['eSense'][i]))
-                    for i in self.HEADER_EEGPOWER:
-                        if i in json_data['eegPower']:
-                            entry.append(str(json_data[u'eegPower'][i]))
-                    
-                    # check if data is valid (no 0s, no empty values)
-                    entry = np.array(entry)
-                    if len(entry)==10 and len(entry[entry=='0'])==0: 
-                        # get current time
-                        t = str(time.time())
-                        data_all[t] = entry.tolist()
-                        d += 1
+        log.info('Data collection started. Do not remove headset. ')
+        try: 
+            while (d<duration):
                 # check if timeout
-                curr_time = time.time()
-                if curr_time-start_time > 80:
-                    data_all = None
+                remaining = timeout - (time.time()-start_time)
+                if remaining <= 0: 
+                    self.timed_out = True
                     break
-            except:
-                print ('Could not read from socket. Please try again. ')
-                #break
-        
-        # finished
-        if data_all == None: 
-            return data_all
+                try:
+                    with metrics.timer('thinkgear_read'): 
+                        messages = reader.read(min(remaining, 1.0))
+                except OSError as e: 
+                    log.warning('Could not read from socket: %s', e)
+                    self.timed_out = True
+                    break
+                for json_data in messages: 
+                    log.debug('%s', json_data)
+                    values = self._values(json_data)
+                    if values is None: 
+                        invalid += isinstance(json_data, dict) and 'eegPower' in json_data
+                        continue
+                    d += 1
+                    yield time.time(), values
+                    if d >= duration: 
+                        break
+        finally: 
+            sock.close()
+            self.stats = dict(reader.stats(), readings=d, invalid=invalid)
+            record_stats(self.stats, self.timed_out, time.time() - start_time)
 
-        json_all = json.dumps(data_all)
-        print('Data collection finished. ')
-        return json_all
+    def stream_data(self, duration=40, timeout=80): 
+        """Yields (timestamp, entry) for <duration> valid readings, as strings (see stream_values). """
+        for t, values in self.stream_values(duration, timeout): 
+            yield str(t), [str(v) for v in values]
 
+    def collect_buffer(self, duration=40, buffer=None): 
+        """Fills a ReadingBuffer (new one of <duration> readings by default) in place. 
+        Returns it, or None on timeout. """
+        if buffer is None: 
+            buffer = ReadingBuffer(duration)
+        for t, values in self.stream_values(duration): 
+            buffer.append(t, values)
 
+        # finished
+        if self.timed_out: 
+            return None
+        log.info('Data collection finished. ')
+        return buffer
 
+    def collect_data(self, duration=40): 
+        buffer = self.collect_buffer(duration)
+        if buffer is None: 
+            return None
+        return buffer.to_json()
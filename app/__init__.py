@@ -1,3 +1,4 @@
+import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -11,4 +12,15 @@ migrate = Migrate(app, db)
 login = LoginManager(app)
 login.login_view = 'login'
 
+if app.config['LOG_LEVEL']:
+    logging.basicConfig(level=app.config['LOG_LEVEL'].upper(),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+if app.config['METRICS_PROFILE']:
+    import metrics
+    metrics.start_profiler(app.config['METRICS_PROFILE'])
+
 from app import routes, models
+
+if app.config['PRELOAD_MODELS']:
+    from warmup import warmup
+    warmup()
@@ -0,0 +1,115 @@
+"""
+class JobQueue:
+    - runs long jobs (headset capture + ML + DynamoDB write) on a bounded worker pool
+    - submit() returns a job id right away, get() returns the job status and result
+    - a running job may publish partial results with report(partial=...), get() returns them
+      while it runs
+    - job state lives in a job store: MemoryJobStore (this process only) by default, or
+      app.sql_store.SqlJobStore (the app database) so that every web worker sees every job
+    - finished jobs are forgotten after <ttl> seconds; jobs still unfinished after <ttl>
+      (e.g. their worker died) are marked failed
+    - job durations and outcomes go to metrics (job_seconds, jobs_total{status=...})
+
+class MemoryJobStore:
+    - job dicts in a dict of this process; only valid with a single web worker
+"""
+
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class MemoryJobStore(object):
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add_if_room(self, job, max_pending):
+        """Adds the job unless max_pending jobs are queued or running; returns whether it was added. """
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j['status'] in ('queued', 'running'))
+            if pending >= max_pending:
+                return False
+            self._jobs[job['id']] = dict(job)
+            return True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def expire(self, ttl):
+        now = time.time()
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job['finished'] is None and now - job['submitted'] > ttl:
+                    job.update(status='failed', finished=now)
+                elif job['finished'] is not None and now - job['finished'] > ttl:
+                    del self._jobs[job_id]
+
+
+class JobQueue(object):
+    def __init__(self, max_workers=2, max_pending=8, ttl=600, store=None):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.store = store if store is not None else MemoryJobStore()
+        self._pool = ThreadPoolExecutor(max_workers)
+        self._current = threading.local()   # id of the job run by this worker thread
+
+    def submit(self, owner, fn, *args):
+        """Queues fn(*args) and returns the job id. Raises QueueFull if too many jobs are waiting. """
+        self.store.expire(self.ttl)
+        job_id = uuid.uuid4().hex
+        job = {'id': job_id, 'owner': owner, 'status': 'queued',
+               'result': None, 'partial': None, 'submitted': time.time(), 'finished': None}
+        if not self.store.add_if_room(job, self.max_pending):
+            metrics.inc('jobs', status='rejected')
+            raise QueueFull()
+        self._pool.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def get(self, job_id, owner=None):
+        """Returns a copy of the job, or None if unknown (or owned by someone else). """
+        job = self.store.get(job_id)
+        if job is None or (owner is not None and job['owner'] != owner):
+            return None
+        return job
+
+    def report(self, **fields):
+        """Updates fields (e.g. partial=...) of the job running in this thread; no-op outside a job. """
+        job_id = getattr(self._current, 'job_id', None)
+        if job_id is not None:
+            self.store.update(job_id, **fields)
+
+    def _run(self, job_id, fn, args):
+        self.store.update(job_id, status='running')
+        self._current.job_id = job_id
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+            status = 'done' if result else 'failed'
+            self.store.update(job_id, status=status, result=result, finished=time.time())
+        except Exception as e:
+            log.exception('Job %s failed: %s', job_id, e)
+            status = 'failed'
+            self.store.update(job_id, status='failed', finished=time.time())
+        finally:
+            self._current.job_id = None
+        metrics.observe('job', time.perf_counter() - start)
+        metrics.inc('jobs', status=status)
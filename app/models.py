@@ -34,3 +34,31 @@ class Post(db.Model):
 
     def __repr__(self):
         return '<Post {}>'.format(self.body)
+
+
+class EmotionSession(db.Model):
+    """Local emotion history (app.sql_store.SqlStore), one row per test. """
+    __table_args__ = (db.Index('ix_emotion_session_user_time', 'username', 'time', unique=True),)
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(64), nullable=False)
+    time = db.Column(db.String(32), nullable=False)
+    result = db.Column(db.String(8))
+    cls = db.Column(db.Integer)
+    data = db.Column(db.LargeBinary)
+
+    def __repr__(self):
+        return '<EmotionSession {} {}>'.format(self.username, self.time)
+
+
+class CollectJob(db.Model):
+    """State of a /collect job (app.sql_store.SqlJobStore), shared by all web workers. """
+    id = db.Column(db.String(32), primary_key=True)
+    owner = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(16), nullable=False, index=True)
+    result = db.Column(db.Text)
+    partial = db.Column(db.Text)    # json list of the votes published while the job runs
+    submitted = db.Column(db.Float, nullable=False)
+    finished = db.Column(db.Float)
+
+    def __repr__(self):
+        return '<CollectJob {} {}>'.format(self.id, self.status)
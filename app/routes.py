@@ -1,15 +1,46 @@
-from flask import render_template, flash, redirect, url_for, request, send_from_directory, jsonify
+from flask import render_template, flash, redirect, url_for, request, send_from_directory, jsonify, Response
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.urls import url_parse
 from app import app, db
 from app.forms import LoginForm, RegistrationForm
 from app.models import User
+from app.jobs import JobQueue, QueueFull
+from app.sql_store import SqlJobStore
 from time import gmtime, strftime
 import json
-from EmotionML import EmotionML
-from Mindwave import Mindwave
-import time, datetime
-from Dynamo import Dynamo
+import logging
+import threading
+import metrics
+# the pipeline (EmotionML: pandas/NumPy, Mindwave, Dynamo: boto3) is imported on first use,
+# so static pages do not pay for it; warmup.warmup() preloads it (PRELOAD_MODELS)
+
+jobs = JobQueue(app.config['COLLECT_WORKERS'], app.config['COLLECT_MAX_PENDING'], store=SqlJobStore())
+_history = None
+_history_lock = threading.Lock()
+log = logging.getLogger(__name__)
+
+
+def get_history():
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = _make_history()
+    return _history
+
+
+def _make_history():
+    from history import History
+    if app.config['SESSION_BACKEND'] == 'sql':
+        from app.sql_store import SqlStore
+        store = SqlStore()
+    else:
+        from Dynamo import Dynamo
+        store = Dynamo.shared()
+        if app.config['DYNAMO_WRITE_BEHIND']:
+            from write_behind import WriteBehind
+            store = WriteBehind(store, app.config['DYNAMO_JOURNAL'])
+    return History(store, ttl=app.config['HISTORY_CACHE_TTL'])
 
 
 @app.route('/assets/<path:path>')
@@ -34,64 +65,80 @@ def test():
     return render_template('test_ajax.html')
 
 
-# data collecting and uploading in /test @button
-def func1():
-    sensor = Mindwave()
-    json_data = sensor.collect_data()
-    if json_data:
-        ML = EmotionML()
-        ML.load_data(json_data)
-        ML.preprocess()
-        res = ML.predict()
-
-        dynamo = Dynamo()
-        username = current_user.username
-        now = strftime("%a, %d %b %Y %X GMT", gmtime())
-        data = json.dumps(res)
+# data collecting and uploading in /test @button, runs on the job queue;
+# every sequence is scored while the capture runs and published as a partial vote
+@metrics.timer('collect')
+def func1(username):
+    from EmotionML import EmotionML
+    from Mindwave import Mindwave
+    from history import iso_now
+    from session_codec import encode_session
+    sensor = Mindwave(host=app.config['MINDWAVE_HOST'], port=app.config['MINDWAVE_PORT'])
+    ML = EmotionML(max_gap=app.config['CLEAN_MAX_GAP'], seq_sizes=app.config['SEQ_SIZES'],
+                   hop_size=app.config['SEQ_HOP'] or None,
+                   recency_half_life=app.config['RECENCY_HALF_LIFE'] or None)
+    partial = []
+    res = None
+    for event in ML.stream_predict(sensor.stream_data(app.config['CAPTURE_SECONDS'])):
+        if event['type'] == 'window':
+            partial.append({'index': event['index'], 'size': event['size'], 'vote': event['vote']})
+            jobs.report(partial=list(partial))
+        else:
+            res = event['result']
+    if not sensor.timed_out:
+        now = iso_now()
+        data = encode_session(res)
         result = str(res["vote0"][0])
-        res['time'] = now
-        dynamo.dynamoAdd(username, now, data, result)
-        print(username, now, data, result)
+        res['time'] = strftime("%a, %d %b %Y %X GMT", gmtime())
+        get_history().add(username, now, data, result, res["vote0"][1])
+        log.info('%s %s: %d bytes stored, result %s', username, now, len(data), result)
         return res
     return {}
 
 
-def getKey(item):
-    return time.mktime(time.strptime(item['time'], '%a, %d %b %Y %X GMT'))
-
-
-# history data retrieving from dynamoDB with username provided for /profile
+# history summary (time, result, pie chart) for /profile, cached per user
 def func2(username):
-    dynamo = Dynamo()
-    data = dynamo.dynamoQuery(username)
-    pie =[0, 0, 0, 0, 0]
-    data = sorted(data, key=getKey)
-    print("data",data)
-
-    for d in data:
-        print(d)
-        pie[json.loads(d['data'])['vote0'][1]-1] += 1
-
-    if not data:
-        return {}
-    res = {"earliest": data[0]["time"],
-           "latest": data[-1]["time"],
-           "num": len(data),
-           "data": data,
-           "pie": pie
-           }
-
-    return res
+    return get_history().summary(username)
 
 
 @app.route('/collect', methods=['GET'])
 @login_required
 def collect():
-    res = func1()
-    if res:
-        res["name"] = current_user.username
-        return jsonify(res)
-    return "", 500
+    try:
+        job_id = jobs.submit(current_user.username, func1, current_user.username)
+    except QueueFull:
+        return "", 503
+    return jsonify({"job": job_id}), 202
+
+
+@app.route('/collect/<job_id>', methods=['GET'])
+@login_required
+def collect_status(job_id):
+    job = jobs.get(job_id, owner=current_user.username)
+    if job is None:
+        return "", 404
+    if job["status"] == "failed":
+        return jsonify({"status": "failed"}), 500
+    if job["status"] != "done":
+        return jsonify({"status": job["status"], "partial": job["partial"] or []}), 202
+    res = dict(job["result"])
+    res["name"] = current_user.username
+    return jsonify(res)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# stack samples show the code and what it is doing: signed-in users only
+@app.route('/metrics/profile')
+@login_required
+def metrics_profile():
+    profiler = metrics.get_profiler()
+    if profiler is None:
+        return "", 404
+    return Response(profiler.collapsed(), mimetype='text/plain')
 
 
 @app.route('/result', methods=['POST'])
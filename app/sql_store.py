@@ -0,0 +1,121 @@
+"""
+class SqlStore:
+    - SessionStore backed by the app's SQLAlchemy database (SQLite app.db by default)
+    - rows indexed on (username, time), with the summary columns (result, cls)
+      next to the compact session blob
+    - usable from any thread: every call runs in its own app context
+    Tables come from the migrations (flask db upgrade).
+
+class SqlJobStore:
+    - job store of app.jobs.JobQueue in the same database, so a job started by one web
+      worker can be polled through any other; results and partial results are stored as json
+"""
+
+import json
+import time
+
+from app import app, db
+from app.models import EmotionSession, CollectJob
+from storage import SessionStore
+
+
+class SqlStore(SessionStore):
+    def _put(self, item):
+        row = EmotionSession.query.filter_by(username=item['userName'], time=item['time']).first()
+        if row is None:
+            row = EmotionSession(username=item['userName'], time=item['time'])
+            db.session.add(row)
+        data = item['data']
+        row.data = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+        row.result = item['result']
+        row.cls = item.get('cls')
+
+    def dynamoAdd(self, userName, time, data, result, cls=None):
+        self.dynamoAddBatch([self.makeItem(userName, time, data, result, cls)])
+
+    def dynamoAddBatch(self, items):
+        with app.app_context():
+            for item in items:
+                self._put(item)
+            db.session.commit()
+
+    def _rows(self, userName, *columns):
+        with app.app_context():
+            return db.session.query(*columns).filter(EmotionSession.username == userName) \
+                                             .order_by(EmotionSession.time).all()
+
+    def dynamoQuery(self, userName):
+        rows = self._rows(userName, EmotionSession.time, EmotionSession.result, EmotionSession.cls, EmotionSession.data)
+        return [self.makeItem(userName, t, data, result, cls) for t, result, cls, data in rows]
+
+    def dynamoSummaries(self, userName):
+        rows = self._rows(userName, EmotionSession.time, EmotionSession.result, EmotionSession.cls)
+        return [{'time': t, 'result': result, 'cls': cls} for t, result, cls in rows]
+
+    def dynamoGetData(self, userName, time):
+        with app.app_context():
+            row = db.session.query(EmotionSession.data).filter_by(username=userName, time=time).one()
+            return row[0]
+
+    def dynamoScan(self):
+        with app.app_context():
+            rows = db.session.query(EmotionSession.username, EmotionSession.time, EmotionSession.result,
+                                    EmotionSession.cls, EmotionSession.data).yield_per(100)
+            for userName, t, result, cls, data in rows:
+                yield self.makeItem(userName, t, data, result, cls)
+
+
+class SqlJobStore(object):
+    @staticmethod
+    def _job(row):
+        return {'id': row.id, 'owner': row.owner, 'status': row.status,
+                'result': json.loads(row.result) if row.result is not None else None,
+                'partial': json.loads(row.partial) if row.partial is not None else None,
+                'submitted': row.submitted, 'finished': row.finished}
+
+    def add_if_room(self, job, max_pending):
+        """Counts the pending jobs and adds the job in one transaction that holds the write
+        lock from the start, so concurrent workers cannot both take the last free place. """
+        with app.app_context():
+            try:
+                self._lock_for_writing()
+                pending = CollectJob.query.filter(CollectJob.status.in_(('queued', 'running'))).count()
+                if pending >= max_pending:
+                    return False
+                db.session.add(CollectJob(id=job['id'], owner=job['owner'], status=job['status'],
+                                          submitted=job['submitted'], finished=job['finished']))
+                db.session.commit()
+                return True
+            finally:
+                db.session.rollback()
+
+    @staticmethod
+    def _lock_for_writing():
+        connection = db.session.connection()
+        if connection.dialect.name == 'sqlite':
+            # pysqlite defers BEGIN until the first write: take the database write lock now
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        elif connection.dialect.name == 'postgresql':
+            # conflicts with itself and with every write, not with reads
+            connection.exec_driver_sql('LOCK TABLE collect_job IN SHARE ROW EXCLUSIVE MODE')
+
+    def get(self, job_id):
+        with app.app_context():
+            row = CollectJob.query.get(job_id)
+            return self._job(row) if row is not None else None
+
+    def update(self, job_id, **fields):
+        for name in ('result', 'partial'):
+            if name in fields:
+                fields[name] = json.dumps(fields[name]) if fields[name] is not None else None
+        with app.app_context():
+            CollectJob.query.filter_by(id=job_id).update(fields)
+            db.session.commit()
+
+    def expire(self, ttl):
+        now = time.time()
+        with app.app_context():
+            CollectJob.query.filter(CollectJob.finished.is_(None), CollectJob.submitted < now - ttl) \
+                            .update({'status': 'failed', 'finished': now}, synchronize_session=False)
+            CollectJob.query.filter(CollectJob.finished < now - ttl).delete(synchronize_session=False)
+            db.session.commit()
@@ -0,0 +1,316 @@
+"""
+Latency benchmark of the capture -> predict -> store pipeline
+
+    python bench.py [--length 40] [--gap-rate 0.05] [--runs 50] [--tsfresh] [--e2e]
+                    [--session-backend memory|sql|dynamo] [--dynamo-local http://localhost:8000]
+                    [--save-baseline bench_baseline.json]
+                    [--baseline bench_baseline.json --tolerance 0.2]
+
+    - synthetic Mindwave-shaped recordings of <length> readings, a <gap-rate> fraction of
+      them with dropped (0) bands, generated from a fixed seed
+    - times every stage separately: load_data, _clean_data, _data2seq, tsfresh formatting
+      (windows_to_long), feature extraction (native, and tsfresh with --tsfresh), model
+      loading, VotingClassifier.predict and result assembly
+    - --e2e drives GET /collect + polling of /collect/<job> through the Flask test client,
+      with a fake ThinkGear headset on a local socket and an in-memory session store
+      (--session-backend sql: the SQL store in the benchmark's SQLite database, dynamo:
+      the Dynamo class, against DynamoDB Local / moto with --dynamo-local)
+    - reports p50/p95/p99/mean latency (ms), throughput (1/s) and peak RSS; with --baseline,
+      exits with status 1 if a p50 is more than <tolerance> slower than the baseline
+    Models come from get_registry(), so MODEL_COMPACT / MODEL_EXECUTOR apply.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import numpy as np
+
+from storage import SessionStore
+
+RAW_COLUMNS = ['attention', 'meditation', 'delta', 'theta', 'lowAlpha', 'highAlpha', 'lowBeta', 'highBeta', 'lowGamma', 'highGamma']
+
+
+#========== synthetic data ==========#
+
+def synthetic_readings(length, gap_rate=0.0, seed=0):
+    """(length, 10) int array of Mindwave-like readings; a gap_rate fraction of them has 0 bands. """
+    rng = np.random.RandomState(seed)
+    readings = np.empty((length, len(RAW_COLUMNS)), dtype=np.int64)
+    readings[:, :2] = rng.randint(1, 101, size=(length, 2))
+    # band powers are roughly log-normal, from tens to millions
+    readings[:, 2:] = np.exp(rng.normal(10, 1.5, size=(length, 8))).astype(np.int64) + 1
+    gaps = rng.rand(length) < gap_rate
+    readings[gaps, 2 + rng.randint(0, 8, size=gaps.sum())] = 0
+    return readings
+
+
+def synthetic_recording(length, gap_rate=0.0, seed=0, start=1.6e9):
+    """Json of a recording, as returned by Mindwave.collect_data(). """
+    readings = synthetic_readings(length, gap_rate, seed)
+    return json.dumps({repr(start + i): [str(v) for v in row] for i, row in enumerate(readings.tolist())})
+
+
+class FakeHeadset(object):
+    """ThinkGear connector stand-in: streams synthetic eSense/eegPower frames to every client. """
+    def __init__(self, gap_rate=0.0, interval=0.0):
+        self.gap_rate = gap_rate
+        self.interval = interval
+        self._server = socket.socket()
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(16)
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        seed = 0
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            seed += 1
+            threading.Thread(target=self._serve, args=(conn, seed), daemon=True).start()
+
+    def _serve(self, conn, seed):
+        try:
+            while True:
+                frames = []
+                for row in synthetic_readings(64, self.gap_rate, seed).tolist():
+                    frames.append(json.dumps({'eSense': {'attention': row[0], 'meditation': row[1]},
+                                              'eegPower': dict(zip(RAW_COLUMNS[2:], row[2:])),
+                                              'poorSignalLevel': 0}))
+                seed += 1000
+                conn.sendall(('\r'.join(frames) + '\r').encode('utf-8'))
+                if self.interval:
+                    time.sleep(self.interval)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def close(self):
+        self._server.close()
+
+
+#========== statistics ==========#
+
+def summarize(samples):
+    """Latency samples (seconds) -> {p50, p95, p99, mean (ms), throughput (1/s), n}. """
+    samples = np.asarray(samples, dtype=float)
+    if samples.size == 0:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+    return {'p50': p50, 'p95': p95, 'p99': p99, 'mean': samples.mean() * 1000,
+            'throughput': 1.0 / samples.mean() if samples.mean() > 0 else float('inf'), 'n': int(samples.size)}
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (None where unavailable). """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+#========== stages ==========#
+
+def bench_model_loading(runs):
+    from registry import ModelRegistry
+    samples = []
+    for _ in range(runs):
+        registry = ModelRegistry(compact_path=os.environ.get('MODEL_COMPACT'))
+        start = time.perf_counter()
+        registry.load()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_stages(recordings, use_tsfresh=False):
+    """Runs the EmotionML stages on every recording, returns {stage: [seconds]}. """
+    from EmotionML import EmotionML, windows_to_long, COLUMNS
+    from features import extract_minimal_features
+    from registry import get_registry
+    voting_clf = get_registry().voting_classifier()
+    stages = ['load_data', '_clean_data', '_data2seq', 'tsfresh_format', 'extract_features']
+    if use_tsfresh:
+        from tsfresh import extract_features
+        from tsfresh.feature_extraction import MinimalFCParameters
+        stages.append('extract_features_tsfresh')
+    stages += ['predict', 'assemble_result']
+    samples = {stage: [] for stage in stages}
+
+    def timed(stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        out = fn(*args, **kwargs)
+        samples[stage].append(time.perf_counter() - start)
+        return out
+
+    for json_data in recordings:
+        ML = EmotionML(feature_cache=False)
+        timed('load_data', ML.load_data, json_data)
+        timed('_clean_data', ML._clean_data)
+        timed('_data2seq', ML._data2seq)
+        long_format = timed('tsfresh_format', windows_to_long, ML.sequences)
+        ML.MLInput = timed('extract_features', extract_minimal_features, ML.sequences, COLUMNS)
+        if use_tsfresh:
+            timed('extract_features_tsfresh', extract_features, long_format, column_id='id',
+                  column_sort='time', default_fc_parameters=MinimalFCParameters(), disable_progressbar=True)
+        if len(ML.MLInput) == 0:
+            continue
+        _, display_probs = timed('predict', voting_clf.predict, ML.MLInput)
+        timed('assemble_result', ML._assemble_result, display_probs)
+    return samples
+
+
+def bench_e2e(runs, gap_rate, dynamo_local=None, session_backend=None):
+    """Times GET /collect until /collect/<job> returns the result, returns [seconds].
+    session_backend: 'memory', 'sql' or 'dynamo' (default: dynamo with dynamo_local, else memory). """
+    session_backend = session_backend or ('dynamo' if dynamo_local else 'memory')
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    if session_backend == 'sql':
+        os.environ['SESSION_BACKEND'] = 'sql'
+    elif session_backend == 'dynamo':
+        os.environ['SESSION_BACKEND'] = 'dynamo'
+        os.environ['DYNAMO_WRITE_BEHIND'] = '0'
+        if dynamo_local:
+            os.environ['AWS_ENDPOINT_URL'] = dynamo_local
+    from app import app, db, routes
+    from app.models import User
+    from history import History
+
+    headset = FakeHeadset(gap_rate)
+    app.config.update(MINDWAVE_HOST='127.0.0.1', MINDWAVE_PORT=headset.port)
+    if session_backend == 'memory':
+        routes._history = History(MemoryStore())
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    samples = []
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get('/collect')
+        assert response.status_code == 202, 'ERROR: /collect returned {}'.format(response.status_code)
+        job_url = '/collect/' + response.get_json()['job']
+        while True:
+            response = client.get(job_url)
+            if response.status_code != 202:
+                break
+            time.sleep(0.001)
+        assert response.status_code == 200, 'ERROR: {} returned {}'.format(job_url, response.status_code)
+        samples.append(time.perf_counter() - start)
+    headset.close()
+    return samples
+
+
+class MemoryStore(SessionStore):
+    """In-memory SessionStore stand-in for DynamoDB. """
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def dynamoAdd(self, userName, time, data, result, cls=None):
+        with self._lock:
+            self._items[(userName, time)] = self.makeItem(userName, time, data, result, cls)
+
+    def dynamoQuery(self, userName):
+        with self._lock:
+            return [item for key, item in sorted(self._items.items()) if key[0] == userName]
+
+    def dynamoSummaries(self, userName):
+        return [{k: item[k] for k in ('time', 'result', 'cls') if k in item} for item in self.dynamoQuery(userName)]
+
+    def dynamoGetData(self, userName, time):
+        with self._lock:
+            return self._items[(userName, time)]['data']
+
+
+#========== report ==========#
+
+def compare(results, baseline, tolerance):
+    """Names of the stages whose p50 is more than <tolerance> slower than in the baseline. """
+    regressions = []
+    for stage, stats in results['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if base and stats and stats['p50'] > base['p50'] * (1 + tolerance):
+            regressions.append(stage)
+    return regressions
+
+
+def print_report(results, baseline=None):
+    print('{:<26} {:>9} {:>9} {:>9} {:>9} {:>11} {:>9}'.format(
+        'stage', 'p50 ms', 'p95 ms', 'p99 ms', 'mean ms', 'per second', 'vs base'))
+    for stage, stats in results['stages'].items():
+        if not stats:
+            continue
+        base = (baseline or {}).get('stages', {}).get(stage)
+        delta = '{:+.0%}'.format(stats['p50'] / base['p50'] - 1) if base and base['p50'] else ''
+        print('{:<26} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>11.1f} {:>9}'.format(
+            stage, stats['p50'], stats['p95'], stats['p99'], stats['mean'], stats['throughput'], delta))
+    if results['peak_rss'] is not None:
+        print('peak RSS: {:.1f} MB'.format(results['peak_rss'] / 2**20))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the capture -> predict -> store pipeline.')
+    parser.add_argument('--length', type=int, default=40, help='readings per synthetic recording')
+    parser.add_argument('--gap-rate', type=float, default=0.05, help='fraction of readings with dropped bands')
+    parser.add_argument('--runs', type=int, default=50, help='recordings per stage')
+    parser.add_argument('--model-runs', type=int, default=3, help='ensemble loads to time')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tsfresh', action='store_true', help='also time tsfresh extract_features')
+    parser.add_argument('--e2e', action='store_true', help='also time the Flask /collect path')
+    parser.add_argument('--e2e-runs', type=int, default=20)
+    parser.add_argument('--session-backend', choices=['memory', 'sql', 'dynamo'], default=None,
+                        help='session store of --e2e (default: dynamo with --dynamo-local, else memory)')
+    parser.add_argument('--dynamo-local', default=None, help='endpoint of DynamoDB Local / moto for --e2e')
+    parser.add_argument('--baseline', default=None, help='json of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p50 slowdown vs the baseline')
+    parser.add_argument('--save-baseline', default=None, help='write the results to this json')
+    args = parser.parse_args(argv)
+
+    recordings = [synthetic_recording(args.length, args.gap_rate, args.seed + i) for i in range(args.runs)]
+    stages = {'model_loading': bench_model_loading(args.model_runs)}
+    stages.update(bench_stages(recordings, args.tsfresh))
+    if args.e2e:
+        stages['e2e_collect'] = bench_e2e(args.e2e_runs, args.gap_rate, args.dynamo_local, args.session_backend)
+    results = {'config': {k: v for k, v in vars(args).items() if k not in ('baseline', 'save_baseline')},
+               'stages': {stage: summarize(samples) for stage, samples in stages.items()},
+               'peak_rss': peak_rss()}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('REGRESSION (p50 > {:.0%} slower than baseline): {}'.format(args.tolerance, ', '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
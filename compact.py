@@ -0,0 +1,326 @@
+"""
+Compact ensemble export
+    export_ensemble():
+    - converts the fitted ensemble into flat NumPy arrays, saved in one .npz file
+    - tree ensembles (RandomForest, GradientBoosting, AdaBoost, XGB): flattened node arrays
+    - GaussianNB, LinearDiscriminantAnalysis: parameter and coefficient matrices
+    - KNeighbors: packed training matrix and labels
+    load_ensemble():
+    - loads the file as (name, CompactEstimator) pairs, a drop-in for VotingClassifier
+    - scoring needs NumPy only (no sklearn/xgboost objects in memory)
+    Only binary classifiers are supported, like the rest of the pipeline.
+
+Usage: python compact.py [output.npz]   (exports the Models/ ensemble)
+"""
+
+import json
+import numpy as np
+
+META_KEY = '__meta__'
+
+
+#========== export ==========#
+
+def _float32_le(threshold, strict=False):
+    """Thresholds t' such that float32 x <= t' is the same test as x <= threshold (or x < threshold if strict). """
+    t32 = np.asarray(threshold, dtype=np.float64).astype(np.float32)
+    if strict:
+        return np.nextafter(t32, np.float32(-np.inf))
+    too_big = t32.astype(np.float64) > threshold
+    t32[too_big] = np.nextafter(t32[too_big], np.float32(-np.inf))
+    return t32
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=int)
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        if left[node] >= 0:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+            stack.extend([left[node], right[node]])
+    return int(depth.max())
+
+
+def _pack_trees(trees):
+    """Concatenates trees into one node table. Leaves point to themselves, so every
+    sample can take the same number (depth) of steps.
+
+    trees: list of (left, right, feature, threshold, value); children -1 mark a leaf,
+           threshold is float32 and a sample goes left if x[feature] <= threshold,
+           value has shape (n_nodes, n_outputs)
+    """
+    lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+    offset = 0
+    depth = 0
+    for left, right, feature, threshold, value in trees:
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        depth = max(depth, _tree_depth(left, right))
+        own = np.arange(len(left))
+        leaf = left < 0
+        lefts.append(np.where(leaf, own, left) + offset)
+        rights.append(np.where(leaf, own, right) + offset)
+        features.append(np.where(leaf, 0, feature))
+        thresholds.append(np.asarray(threshold, dtype=np.float32))
+        values.append(np.asarray(value, dtype=np.float64))
+        roots.append(offset)
+        offset += len(left)
+    return {'left': np.concatenate(lefts).astype(np.int32),
+            'right': np.concatenate(rights).astype(np.int32),
+            'feature': np.concatenate(features).astype(np.int32),
+            'threshold': np.concatenate(thresholds),
+            'value': np.concatenate(values),
+            'roots': np.asarray(roots, dtype=np.int32)}, depth
+
+
+def _sklearn_tree(tree, value):
+    t = tree.tree_
+    return (t.children_left, t.children_right, t.feature, _float32_le(t.threshold), value)
+
+
+def _leaf_proba(tree):
+    value = tree.tree_.value[:, 0, :].astype(np.float64)
+    total = value.sum(axis=1, keepdims=True)
+    total[total == 0] = 1.0
+    return value / total
+
+
+def _export_forest(model):
+    n = len(model.estimators_)
+    trees = [_sklearn_tree(t, _leaf_proba(t) / n) for t in model.estimators_]
+    return trees, {'link': 'identity'}
+
+
+def _export_gradient_boosting(model):
+    assert model.estimators_.shape[1] == 1, 'ERROR: only binary GradientBoostingClassifier is supported'
+    trees = [_sklearn_tree(t, t.tree_.value[:, 0, :1] * model.learning_rate) for t in model.estimators_[:, 0]]
+    zeros = np.zeros((1, model.estimators_[0, 0].tree_.n_features))
+    if hasattr(model, '_raw_predict_init'):
+        init = model._raw_predict_init(zeros)
+    else:   # scikit-learn 0.20
+        init = model._init_decision_function(zeros)
+    return trees, {'link': 'sigmoid', 'offset': float(np.ravel(init)[0])}
+
+
+def _export_adaboost(model):
+    # scikit-learn >= 1.6 dropped the algorithm parameter and always uses SAMME
+    algorithm = getattr(model, 'algorithm', 'SAMME')
+    assert algorithm in ('SAMME', 'SAMME.R'), 'ERROR: unknown AdaBoostClassifier algorithm %r' % algorithm
+    n_classes = model.n_classes_
+    trees = []
+    for t, weight in zip(model.estimators_, model.estimator_weights_):
+        proba = _leaf_proba(t)
+        if algorithm == 'SAMME.R':
+            eps = np.finfo(proba.dtype).eps
+            log_proba = np.log(np.maximum(proba, eps))
+            contribution = (n_classes - 1) * (log_proba - log_proba.mean(axis=1, keepdims=True))
+        else:
+            # discrete weighted vote: +w for the class the leaf predicts, -w/(K-1) for the others
+            voted = np.arange(n_classes) == np.argmax(proba, axis=1)[:, np.newaxis]
+            contribution = weight * np.where(voted, 1.0, -1.0 / (n_classes - 1))
+        trees.append(_sklearn_tree(t, contribution))
+    return trees, {'link': 'samme', 'scale': float(model.estimator_weights_.sum()), 'n_classes': int(n_classes)}
+
+
+def _xgb_json_trees(booster):
+    """Trees from the JSON model format (xgboost >= 1.0): exact float32 split values. """
+    model = json.loads(bytes(booster.save_raw(raw_format='json')).decode('utf-8'))
+    learner = model['learner']
+    trees = []
+    for tree in learner['gradient_booster']['model']['trees']:
+        left = np.asarray(tree['left_children'])
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        value = np.where(left < 0, conditions, 0.0)[:, np.newaxis]
+        trees.append((left, tree['right_children'], tree['split_indices'],
+                      _float32_le(conditions, strict=True), value))
+    # a list like '[5E-1]' in xgboost >= 3.0
+    return trees, float(learner['learner_model_param']['base_score'].strip('[]'))
+
+
+def _xgb_dump_trees(booster, base_score):
+    """Trees from the text dump (old xgboost, e.g. 0.82). """
+    names = booster.feature_names
+    trees = []
+    for dump in booster.get_dump(dump_format='json'):
+        nodes = {}
+        stack = [json.loads(dump)]
+        while stack:
+            node = stack.pop()
+            nodes[node['nodeid']] = node
+            stack.extend(node.get('children', []))
+        n = max(nodes) + 1
+        left, right = -np.ones(n, dtype=np.int64), -np.ones(n, dtype=np.int64)
+        feature, threshold, value = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.float32), np.zeros((n, 1))
+        for i, node in nodes.items():
+            if 'leaf' in node:
+                value[i, 0] = node['leaf']
+                continue
+            left[i], right[i] = node['yes'], node['no']
+            split = node['split']
+            feature[i] = names.index(split) if names and split in names else int(split.lstrip('f'))
+            threshold[i] = node['split_condition']
+        trees.append((left, right, feature, _float32_le(threshold, strict=True), value))
+    return trees, base_score
+
+
+def _export_xgb(model):
+    assert getattr(model, 'objective', 'binary:logistic') == 'binary:logistic', \
+           'ERROR: only binary:logistic XGBClassifier is supported'
+    booster = model.get_booster()
+    try:
+        trees, base_score = _xgb_json_trees(booster)
+    except TypeError:   # save_raw() has no raw_format before xgboost 1.0
+        base_score = model.base_score if model.base_score is not None else 0.5
+        trees, base_score = _xgb_dump_trees(booster, base_score)
+    return trees, {'link': 'sigmoid', 'offset': float(np.log(base_score / (1.0 - base_score)))}
+
+
+def _export_one(model):
+    """Returns (kind, arrays, meta) for one fitted model. """
+    assert len(model.classes_) == 2, 'ERROR: only binary classifiers are supported'
+    cls = type(model).__name__
+    if cls in ('RandomForestClassifier', 'ExtraTreesClassifier', 'GradientBoostingClassifier',
+               'AdaBoostClassifier', 'XGBClassifier', 'DecisionTreeClassifier'):
+        if cls == 'GradientBoostingClassifier':
+            trees, meta = _export_gradient_boosting(model)
+        elif cls == 'AdaBoostClassifier':
+            trees, meta = _export_adaboost(model)
+        elif cls == 'XGBClassifier':
+            trees, meta = _export_xgb(model)
+        elif cls == 'DecisionTreeClassifier':
+            trees, meta = [_sklearn_tree(model, _leaf_proba(model))], {'link': 'identity'}
+        else:
+            trees, meta = _export_forest(model)
+        arrays, meta['depth'] = _pack_trees(trees)
+        return 'trees', arrays, meta
+    if cls == 'KNeighborsClassifier':
+        assert model.weights in ('uniform', 'distance'), 'ERROR: callable KNN weights are not supported'
+        p = 2 if model.metric == 'euclidean' else model.p
+        assert model.metric in ('minkowski', 'euclidean'), 'ERROR: only minkowski KNN metrics are supported'
+        arrays = {'fit_X': np.asarray(model._fit_X, dtype=np.float64), 'y': np.asarray(model._y, dtype=np.int32)}
+        return 'knn', arrays, {'k': int(model.n_neighbors), 'p': float(p), 'weights': model.weights}
+    if cls == 'GaussianNB':
+        var = model.var_ if hasattr(model, 'var_') else model.sigma_
+        const = np.log(model.class_prior_) - 0.5 * np.sum(np.log(2. * np.pi * var), axis=1)
+        return 'gaussian_nb', {'theta': model.theta_, 'var': var, 'const': const}, {}
+    if cls == 'LinearDiscriminantAnalysis':
+        return 'linear', {'coef': np.ravel(model.coef_), 'intercept': np.ravel(model.intercept_)[:1]}, {}
+    raise TypeError('Cannot export %s' % cls)
+
+
+def export_ensemble(estimators, path):
+    """Saves (name, fitted model) pairs in the compact format. """
+    arrays = {}
+    meta = {'order': []}
+    for name, model in estimators:
+        kind, model_arrays, model_meta = _export_one(model)
+        model_meta['kind'] = kind
+        arrays[name + '/classes'] = np.asarray(model.classes_)
+        for key, value in model_arrays.items():
+            arrays[name + '/' + key] = value
+        meta[name] = model_meta
+        meta['order'].append(name)
+    arrays[META_KEY] = np.array(json.dumps(meta))
+    np.savez_compressed(path, **arrays)
+
+
+#========== scoring ==========#
+
+class CompactEstimator(object):
+    """Pure NumPy scorer for one exported model, with predict/predict_proba like sklearn. """
+
+    # rows per block when computing KNN distances
+    KNN_BLOCK = 256
+
+    def __init__(self, kind, arrays, meta):
+        self.kind = kind
+        self.arrays = arrays
+        self.meta = meta
+        self.classes_ = arrays['classes']
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.kind == 'trees':
+            return self._trees_proba(X)
+        if self.kind == 'knn':
+            return self._knn_proba(X)
+        if self.kind == 'gaussian_nb':
+            return self._nb_proba(X)
+        return self._binary(X.dot(self.arrays['coef']) + self.arrays['intercept'][0])
+
+    def _binary(self, raw):
+        p = 1.0 / (1.0 + np.exp(-raw))
+        return np.column_stack([1 - p, p])
+
+    def _trees_proba(self, X):
+        a = self.arrays
+        X32 = X.astype(np.float32)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        node = np.repeat(a['roots'][np.newaxis, :], X.shape[0], axis=0)
+        for _ in range(self.meta['depth']):
+            go_left = X32[rows, a['feature'][node]] <= a['threshold'][node]
+            node = np.where(go_left, a['left'][node], a['right'][node])
+        total = a['value'][node].sum(axis=1)
+        link = self.meta['link']
+        if link == 'sigmoid':
+            return self._binary(total[:, 0] + self.meta['offset'])
+        if link == 'samme':
+            proba = np.exp(total / self.meta['scale'] / (self.meta['n_classes'] - 1))
+            normalizer = proba.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            return proba / normalizer
+        return total
+
+    def _knn_proba(self, X):
+        fit_X, y = self.arrays['fit_X'], self.arrays['y']
+        k, p = self.meta['k'], self.meta['p']
+        proba = np.zeros((X.shape[0], len(self.classes_)))
+        for start in range(0, X.shape[0], self.KNN_BLOCK):
+            diff = np.abs(X[start:start+self.KNN_BLOCK, np.newaxis, :] - fit_X[np.newaxis, :, :])
+            dist = (diff ** p).sum(axis=2)
+            neighbors = np.argsort(dist, axis=1, kind='mergesort')[:, :k]
+            if self.meta['weights'] == 'distance':
+                d = np.take_along_axis(dist, neighbors, axis=1) ** (1.0 / p)
+                with np.errstate(divide='ignore'):
+                    w = 1.0 / d
+                exact = np.isinf(w)
+                w[exact.any(axis=1)] = exact[exact.any(axis=1)]
+            else:
+                w = np.ones(neighbors.shape)
+            block = proba[start:start+self.KNN_BLOCK]
+            for c in range(len(self.classes_)):
+                block[:, c] = (w * (y[neighbors] == c)).sum(axis=1)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def _nb_proba(self, X):
+        a = self.arrays
+        jll = a['const'][np.newaxis, :] - 0.5 * (((X[:, np.newaxis, :] - a['theta']) ** 2) / a['var']).sum(axis=2)
+        jll -= jll.max(axis=1, keepdims=True)
+        proba = np.exp(jll)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+
+def load_ensemble(path):
+    """Loads a compact ensemble as (name, CompactEstimator) pairs in the exported order. """
+    with np.load(path, allow_pickle=False) as f:
+        files = {key: f[key] for key in f.files}
+    meta = json.loads(str(files.pop(META_KEY)))
+    estimators = []
+    for name in meta['order']:
+        prefix = name + '/'
+        arrays = {key[len(prefix):]: value for key, value in files.items() if key.startswith(prefix)}
+        estimators.append((name, CompactEstimator(meta[name]['kind'], arrays, meta[name])))
+    return estimators
+
+
+if __name__ == '__main__':
+    import sys
+    import os
+    from registry import ModelRegistry, MODEL_DIR
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(MODEL_DIR, 'ensemble_compact.npz')
+    export_ensemble(ModelRegistry().estimators(), path)
+    print('Compact ensemble written to ' + path)
@@ -7,3 +7,32 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # /collect job queue: concurrent captures per web worker and how many may wait in total
+    # (job state is kept in the app database, so any worker can answer /collect/<id>)
+    COLLECT_WORKERS = int(os.environ.get('COLLECT_WORKERS') or 2)
+    COLLECT_MAX_PENDING = int(os.environ.get('COLLECT_MAX_PENDING') or 8)
+    # emotion history backend: 'dynamo' (AWS DynamoDB) or 'sql' (local SQLALCHEMY_DATABASE_URI)
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or 'dynamo'
+    # DynamoDB writes go through a write-behind queue; failed batches are kept in this journal
+    DYNAMO_WRITE_BEHIND = os.environ.get('DYNAMO_WRITE_BEHIND', '1') != '0'
+    DYNAMO_JOURNAL = os.environ.get('DYNAMO_JOURNAL') or os.path.join(basedir, 'dynamo_journal.jsonl')
+    # seconds a worker serves its cached /profile history before re-reading it from the store
+    # (the cache is per worker: tests stored through other workers show up after this)
+    HISTORY_CACHE_TTL = float(os.environ.get('HISTORY_CACHE_TTL') or 60)
+    # gaps of at most this many invalid headset samples are interpolated instead of dropped
+    CLEAN_MAX_GAP = int(os.environ.get('CLEAN_MAX_GAP') or 0)
+    # log level of the app and pipeline modules (e.g. INFO, DEBUG); logging is off if unset
+    LOG_LEVEL = os.environ.get('LOG_LEVEL')
+    # seconds between stack samples of the /metrics/profile sampling profiler; off if unset
+    METRICS_PROFILE = float(os.environ.get('METRICS_PROFILE') or 0)
+    # ThinkGear connector of the headset
+    MINDWAVE_HOST = os.environ.get('MINDWAVE_HOST') or '127.0.0.1'
+    MINDWAVE_PORT = int(os.environ.get('MINDWAVE_PORT') or 13854)
+    # import the pipeline and load the ensemble at start-up (in the master, before forking workers)
+    PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '0') != '0'
+    # headset capture length in seconds, and how the recording is cut into scored sequences:
+    # hop between sequence starts (0: no overlap), extra sequence sizes, recency half-life of the vote
+    CAPTURE_SECONDS = int(os.environ.get('CAPTURE_SECONDS') or 40)
+    SEQ_HOP = int(os.environ.get('SEQ_HOP') or 0)
+    SEQ_SIZES = [int(size) for size in (os.environ.get('SEQ_SIZES') or '8').split(',')]
+    RECENCY_HALF_LIFE = float(os.environ.get('RECENCY_HALF_LIFE') or 0)
@@ -0,0 +1,182 @@
+"""
+class FeatureCache:
+    - caches the feature matrix (MLInput) of a recording, keyed by feature_key()
+    - in-memory LRU tier of at most max_items matrices
+    - optional on-disk tier in cache_dir: one <key>.npy per recording, read back
+      memory-mapped, least recently used files evicted above max_disk_bytes
+    - thread-safe, disk writes are atomic (several processes may share cache_dir)
+
+feature_key():
+    - sha1 of the cleaned band array plus the window and feature settings, so re-scoring
+      the same recordings with another ensemble skips cleaning and feature extraction
+
+get_feature_cache():
+    - returns the process-wide FeatureCache used by EmotionML
+    - FEATURE_CACHE_ITEMS=<n> (default 256, 0 disables the memory tier),
+      FEATURE_CACHE_DIR=<dir> enables the disk tier, FEATURE_CACHE_BYTES=<n> bounds it (default 1 GB)
+"""
+
+import os
+import hashlib
+import threading
+import logging
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def feature_key(cleaned, **settings):
+    """Hash of a cleaned (N, bands) array and the settings that turn it into features. """
+    cleaned = np.ascontiguousarray(cleaned, dtype=np.float64)
+    h = hashlib.sha1()
+    h.update(repr(cleaned.shape).encode('utf-8'))
+    h.update(repr(sorted(settings.items())).encode('utf-8'))
+    h.update(cleaned.tobytes())
+    return h.hexdigest()
+
+
+class FeatureCache(object):
+    def __init__(self, max_items=256, cache_dir=None, max_disk_bytes=1 << 30):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key):
+        """Returns the cached features (read-only) or None. """
+        with self._lock:
+            features = self._memory.get(key)
+            if features is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return features
+        features = self._load(key)
+        with self._lock:
+            if features is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, features)
+        return features
+
+    def put(self, key, features):
+        features = np.array(features, dtype=np.float64)
+        features.setflags(write=False)
+        with self._lock:
+            self._remember(key, features)
+        if self.cache_dir:
+            self._store(key, features)
+        return features
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.npy'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._memory), 'hits': self.hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'disk_bytes': self._disk_bytes()}
+
+    #========== memory tier ==========#
+
+    def _remember(self, key, features):
+        if self.max_items <= 0:
+            return
+        self._memory[key] = features
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    #========== disk tier ==========#
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            features = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            # corrupt or truncated file: a miss, overwritten by the next put()
+            log.warning('Could not read feature cache %s: %s', path, e)
+            return None
+        # mark as recently used for eviction (best effort: the features are valid either way)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return features
+
+    def _store(self, key, features):
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, features)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            log.warning('Could not write feature cache %s: %s', self._path(key), e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _disk_files(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.npy'):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def _disk_bytes(self):
+        if not self.cache_dir:
+            return 0
+        return sum(size for _, size, _ in self._disk_files())
+
+    def _evict(self):
+        """Removes least recently used files until the disk tier fits in max_disk_bytes. """
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_feature_cache():
+    """Returns the process-wide FeatureCache. """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FeatureCache(max_items=int(os.environ.get('FEATURE_CACHE_ITEMS') or 256),
+                                      cache_dir=os.environ.get('FEATURE_CACHE_DIR') or None,
+                                      max_disk_bytes=int(os.environ.get('FEATURE_CACHE_BYTES') or 1 << 30))
+    return _cache
@@ -0,0 +1,52 @@
+"""
+Native feature extraction equivalent to tsfresh MinimalFCParameters
+    - works directly on (num_windows, seq_size, bands) arrays with vectorized reductions
+    - returns the same columns, in the same order, as tsfresh.extract_features
+      (tsfresh pivots its result, so columns are sorted by '<band>__<feature>')
+"""
+
+import numpy as np
+
+# tsfresh feature calculators enabled by MinimalFCParameters
+FEATURE_CALCULATORS = {
+    'sum_values': lambda w: w.sum(axis=1),
+    'median': lambda w: np.median(w, axis=1),
+    'mean': lambda w: w.mean(axis=1),
+    'length': lambda w: np.full((w.shape[0], w.shape[2]), w.shape[1], dtype=float),
+    'standard_deviation': lambda w: w.std(axis=1),
+    'variance': lambda w: w.var(axis=1),
+    'maximum': lambda w: w.max(axis=1),
+    'minimum': lambda w: w.min(axis=1),
+}
+
+
+def feature_names(columns):
+    """Returns the feature column names in tsfresh output order. """
+    return sorted('{}__{}'.format(c, f) for c in columns for f in FEATURE_CALCULATORS)
+
+
+def extract_minimal_features(windows, columns):
+    """Extracts MinimalFCParameters features from windows.
+
+    Parameter
+    ----------
+    windows: array of shape (num_windows, seq_size, bands)
+    columns: band names, in the order of the last axis of windows
+
+    Return
+    ----------
+    features: array of shape (num_windows, bands * len(FEATURE_CALCULATORS)),
+              columns ordered as feature_names(columns)
+    """
+    windows = np.asarray(windows, dtype=float)
+    assert windows.ndim == 3 and windows.shape[2] == len(columns), \
+           'ERROR: windows must have shape (num_windows, seq_size, {})'.format(len(columns))
+    num_windows, bands = windows.shape[0], windows.shape[2]
+    names = list(FEATURE_CALCULATORS)
+    # (num_windows, features, bands) then map to the sorted column order
+    stacked = np.empty((num_windows, len(names), bands))
+    for i, name in enumerate(names):
+        stacked[:, i, :] = FEATURE_CALCULATORS[name](windows)
+    position = {'{}__{}'.format(c, f): (i, j) for j, c in enumerate(columns) for i, f in enumerate(names)}
+    order = [position[n] for n in feature_names(columns)]
+    return stacked[:, [i for i, _ in order], [j for _, j in order]]
@@ -1,7 +1,16 @@
 """
 get_aws: 
 functions to get aws credentials using boto3
+- credentials are cached and refreshed <REFRESH_MARGIN> seconds before they expire
+- getClient(): one client per service and region shared by all threads (boto3 clients are
+  thread safe), rebuilt only when the credentials change, so connections are reused
+- getResource(): resources are not thread safe, so they are cached per thread
+- AWS_ENDPOINT_URL (read whenever a client is built) points everything at a local stand-in
+  (DynamoDB Local, moto server) with the default credential chain instead of Cognito
 """
+import os
+import threading
+from datetime import datetime, timezone
 import boto3
 
 # Placeholders for AWS IDs
@@ -10,8 +19,35 @@ ACCOUNT_ID = ""
 IDENTITY_POOL_ID = ""
 ROLE_ARN = ""
 
+REFRESH_MARGIN = 300
 
-def getCredentials():
+_credentials = None
+_credentials_lock = threading.Lock()
+_clients = {}
+_clients_lock = threading.Lock()
+_local = threading.local()
+
+
+def endpointUrl():
+	# local stand-in of AWS, if any
+	return os.environ.get('AWS_ENDPOINT_URL')
+
+
+def _expiresSoon(credentials):
+	remaining = credentials['Expiration'] - datetime.now(timezone.utc)
+	return remaining.total_seconds() < REFRESH_MARGIN
+
+
+def getCredentials(force=False):
+	# Cached temporary credentials, refreshed shortly before they expire
+	global _credentials
+	with _credentials_lock:
+		if force or _credentials is None or _expiresSoon(_credentials):
+			_credentials = _fetchCredentials()
+		return _credentials
+
+
+def _fetchCredentials():
 	# Get AWS account related details
 	# Use cognito to get an identity from AWS for the application residing on Edison
 	# boto3.client function helps you get a client object of any AWS service
@@ -31,21 +67,40 @@ def getCredentials():
 	return credentials
 
 
-def getResource(resourceName,region = "us-east-1"):
-	credentials = getCredentials()
-	resource = boto3.resource(resourceName,
-			 region,
+def _build(kind, name, region, endpoint, credentials):
+	session = boto3.session.Session()
+	factory = session.resource if kind == 'resource' else session.client
+	if credentials is None:
+		return factory(name, region, endpoint_url=endpoint)
+	return factory(name,
+	         region,
 	        aws_access_key_id= credentials['AccessKeyId'],
 	        aws_secret_access_key=credentials['SecretAccessKey'],
 	        aws_session_token=credentials['SessionToken'])
-	return resource
+
+
+def _current(cache, lock, kind, name, region):
+	# cached handle of (kind, name, region, endpoint), rebuilt when credentials change
+	endpoint = endpointUrl()
+	credentials = None if endpoint else getCredentials()
+	key = (kind, name, region, endpoint)
+	entry = cache.get(key)
+	if entry is None or entry[0] is not credentials:
+		with lock:
+			entry = cache.get(key)
+			if entry is None or entry[0] is not credentials:
+				entry = cache[key] = (credentials, _build(kind, name, region, endpoint, credentials))
+	return entry[1]
+
+
+def getResource(resourceName,region = "us-east-1"):
+	# per thread: boto3 resources are not thread safe
+	cache = getattr(_local, 'cache', None)
+	if cache is None:
+		cache = _local.cache = {}
+	return _current(cache, _clients_lock, 'resource', resourceName, region)
 
 def getClient(clientName,region = "us-east-1"):
-	credentials = getCredentials()
-	client = boto3.client(clientName,
-			 region,
-	        aws_access_key_id= credentials['AccessKeyId'],
-	        aws_secret_access_key=credentials['SecretAccessKey'],
-	        aws_session_token=credentials['SessionToken'])
-	return client
+	# shared by all threads
+	return _current(_clients, _clients_lock, 'client', clientName, region)
 
@@ -0,0 +1,120 @@
+"""
+class History:
+    - per-user emotion history for /profile, on top of a Dynamo-like store
+    - reads only summary fields (time, result, class) with paginated, projected queries
+    - keeps a per-user summary cache, updated in place by add() so /profile does not
+      re-read the whole history after every new test
+    - the cache is per process: tests stored through another web worker show up once the
+      entry is older than <ttl> seconds and is re-read from the store
+    Items use a sortable ISO 8601 'time' key (iso_now()); legacy items keyed by
+    '%a, %d %b %Y %X GMT' strings are converted when read. Legacy items without a stored
+    class are decoded once per process, their class is kept across reloads.
+"""
+
+import time
+import threading
+from time import gmtime, strftime
+
+from session_codec import decode_session
+
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+LEGACY_FORMAT = '%a, %d %b %Y %X GMT'
+
+
+def iso_now():
+    return strftime(ISO_FORMAT, gmtime())
+
+
+def to_iso(t):
+    """Converts a legacy time key to ISO 8601, ISO keys are returned as is. """
+    if t[:1].isdigit():
+        return t
+    return strftime(ISO_FORMAT, time.strptime(t, LEGACY_FORMAT))
+
+
+class History(object):
+    def __init__(self, store, ttl=60):
+        self.store = store
+        self.ttl = ttl
+        # userName -> (summary, {time: cls}, loaded at)
+        self._cache = {}
+        # (userName, time) -> class of items stored without one (never changes)
+        self._legacy_classes = {}
+        self._lock = threading.Lock()
+
+    def add(self, userName, time, data, result, cls):
+        """Stores one test result and updates the cached summary of the user. """
+        self.store.dynamoAdd(userName, time, data, result, cls)
+        with self._lock:
+            entry = self._cache.get(userName)
+            if entry is not None:
+                summary, classes, loaded = entry
+                summary, classes = self._with_item(summary, classes, {'time': to_iso(time), 'result': result, 'cls': cls})
+                self._cache[userName] = (summary, classes, loaded)
+
+    def summary(self, userName):
+        """Returns {earliest, latest, num, data: [{time, result}], pie} or {} if there is no history. """
+        with self._lock:
+            entry = self._cache.get(userName)
+        if entry is None or time.time() - entry[2] > self.ttl:
+            loaded = time.time()
+            summary, classes = self._load(userName)
+            entry = (summary, classes, loaded)
+            with self._lock:
+                self._cache[userName] = entry
+        return entry[0]
+
+    def invalidate(self, userName=None):
+        with self._lock:
+            if userName is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(userName, None)
+
+    def _load(self, userName):
+        data = []
+        classes = {}
+        pie = [0, 0, 0, 0, 0]
+        legacy = False
+        for item in self.store.dynamoSummaries(userName):
+            cls = item.get('cls')
+            if cls is None:
+                # written before summary fields existed: class only lives in the data blob
+                key = (userName, item['time'])
+                cls = self._legacy_classes.get(key)
+                if cls is None:
+                    cls = decode_session(self.store.dynamoGetData(userName, item['time']))['vote0'][1]
+                    with self._lock:
+                        self._legacy_classes[key] = cls
+            legacy = legacy or not item['time'][:1].isdigit()
+            data.append({'time': to_iso(item['time']), 'result': item['result']})
+            classes[data[-1]['time']] = int(cls)
+            pie[int(cls)-1] += 1
+        if legacy:
+            data.sort(key=lambda d: d['time'])
+        return self._summarize(data, pie), classes
+
+    def _summarize(self, data, pie):
+        if not data:
+            return {}
+        return {'earliest': data[0]['time'],
+                'latest': data[-1]['time'],
+                'num': len(data),
+                'data': data,
+                'pie': pie}
+
+    def _with_item(self, summary, classes, item):
+        """Returns copies of summary and classes with one more item (kept in time order).
+        An item with the time of a cached one replaces it, as the store overwrites it. """
+        data = list(summary.get('data', []))
+        pie = list(summary.get('pie', [0, 0, 0, 0, 0]))
+        classes = dict(classes)
+        if item['time'] in classes:
+            data = [d for d in data if d['time'] != item['time']]
+            pie[classes[item['time']]-1] -= 1
+        data.append({'time': item['time'], 'result': item['result']})
+        if len(data) > 1 and data[-2]['time'] > data[-1]['time']:
+            data.sort(key=lambda d: d['time'])
+        classes[item['time']] = int(item['cls'])
+        pie[int(item['cls'])-1] += 1
+        return self._summarize(data, pie), classes
@@ -0,0 +1,177 @@
+"""
+Process-wide metrics (counters and timers) in the Prometheus text format
+    inc(name, value, **labels):
+    - adds to the counter <name>_total
+    timer(name, **labels) / observe(name, seconds, **labels):
+    - context manager (or decorator) timing a block into the histogram <name>_seconds
+    render():
+    - all metrics in the Prometheus text exposition format (served at /metrics)
+
+class SamplingProfiler:
+    - optional: samples the stacks of all threads every <interval> seconds in a daemon thread
+      and counts them as collapsed stacks (flame graph input), served at /metrics/profile
+      to signed-in users
+    - METRICS_PROFILE=<interval> starts the process-wide one (see start_profiler)
+"""
+
+import os
+import sys
+import time
+import threading
+import functools
+from collections import defaultdict
+
+# histogram buckets in seconds, from socket reads to whole captures
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters = defaultdict(float)      # (name, labels) -> value
+_histograms = {}                    # (name, labels) -> [bucket counts..., sum, count]
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Adds <value> to the counter <name>_total. """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += value
+
+
+def observe(name, seconds, **labels):
+    """Records one duration in the histogram <name>_seconds. """
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+                break
+        hist[-2] += seconds
+        hist[-1] += 1
+
+
+class timer(object):
+    """Times a block (with timer(...):) or a function (@timer(...)) into <name>_seconds. """
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self._start, **self.labels)
+        if exc_type is not None:
+            inc(self.name + '_errors', **self.labels)
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(self.name, **self.labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in labels) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format. """
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(hist)) for key, hist in _histograms.items())
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            typed.add(name)
+            lines.append('# TYPE {}_total counter'.format(name))
+        lines.append('{}_total{} {}'.format(name, _labels(labels), repr(float(value))))
+    for (name, labels), hist in histograms:
+        if name not in typed:
+            typed.add(name)
+            lines.append('# TYPE {}_seconds histogram'.format(name))
+        cumulative = 0
+        for bound, count in zip(BUCKETS, hist):
+            cumulative += count
+            lines.append('{}_seconds_bucket{} {}'.format(name, _labels(labels, [('le', repr(bound))]), cumulative))
+        lines.append('{}_seconds_bucket{} {}'.format(name, _labels(labels, [('le', '+Inf')]), hist[-1]))
+        lines.append('{}_seconds_sum{} {}'.format(name, _labels(labels), repr(float(hist[-2]))))
+        lines.append('{}_seconds_count{} {}'.format(name, _labels(labels), hist[-1]))
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler(object):
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = defaultdict(int)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                with self._lock:
+                    self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Samples as collapsed stacks ('frame;frame;frame count' per line). """
+        with self._lock:
+            items = sorted(self.samples.items(), key=lambda item: -item[1])
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in items)
+
+
+_profiler = None
+
+
+def start_profiler(interval=None):
+    """Starts the process-wide SamplingProfiler (interval from METRICS_PROFILE if not given). """
+    global _profiler
+    interval = interval or float(os.environ.get('METRICS_PROFILE') or 0)
+    if _profiler is None and interval > 0:
+        _profiler = SamplingProfiler(interval).start()
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
@@ -0,0 +1,56 @@
+"""emotion sessions and collect jobs
+
+Revision ID: 37fa841bd2fb
+Revises: 780739b227a7
+Create Date: 2026-10-17 18:51:35.939786
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '37fa841bd2fb'
+down_revision = '780739b227a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # earlier versions created these tables on first use: keep them and add what is missing
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if 'emotion_session' not in tables:
+        op.create_table('emotion_session',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=64), nullable=False),
+        sa.Column('time', sa.String(length=32), nullable=False),
+        sa.Column('result', sa.String(length=8), nullable=True),
+        sa.Column('cls', sa.Integer(), nullable=True),
+        sa.Column('data', sa.LargeBinary(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_emotion_session_user_time', 'emotion_session', ['username', 'time'], unique=True)
+    elif 'ix_emotion_session_user_time' not in [index['name'] for index in inspector.get_indexes('emotion_session')]:
+        op.create_index('ix_emotion_session_user_time', 'emotion_session', ['username', 'time'], unique=True)
+    if 'collect_job' not in tables:
+        op.create_table('collect_job',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('owner', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('partial', sa.Text(), nullable=True),
+        sa.Column('submitted', sa.Float(), nullable=False),
+        sa.Column('finished', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_collect_job_status'), 'collect_job', ['status'], unique=False)
+    elif 'partial' not in [column['name'] for column in inspector.get_columns('collect_job')]:
+        op.add_column('collect_job', sa.Column('partial', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_collect_job_status'), table_name='collect_job')
+    op.drop_table('collect_job')
+    op.drop_index('ix_emotion_session_user_time', table_name='emotion_session')
+    op.drop_table('emotion_session')
@@ -0,0 +1,362 @@
+"""
+Local inference server shared by all web workers
+
+class ModelServer:
+    - owns the one copy of the ensemble (a ModelRegistry, same MODEL_* settings as get_registry)
+    - listens on a Unix socket (multiprocessing.connection); messages are pickles, so both
+      sides authenticate each other with the MODEL_SERVER_KEY authkey and refuse to run without it
+    - the socket lives in a private directory (mode 0700, owned by this user), by default
+      $XDG_RUNTIME_DIR/emotion-models/ or /tmp/emotion-models-<uid>/; a stale socket is only
+      removed if it is a socket owned by this user
+    - every request is checked (list of finite (n, n_features) matrices) before it joins a batch,
+      so a bad request fails alone
+    - a batcher thread merges the feature matrices of concurrent requests (up to max_batch
+      matrices, waiting at most max_delay seconds for more) into one predict_groups call
+    - a request not answered by the batcher within <timeout> seconds (MODEL_SERVER_TIMEOUT,
+      default 30) gets a timeout error instead of holding its client forever
+
+class RemoteRegistry / RemoteVotingClassifier:
+    - client side, same voting_classifier().predict() / predict_groups() interface as
+      ModelRegistry, one connection per thread
+    - get_registry() returns a RemoteRegistry when MODEL_SERVER=<socket path> is set, so
+      EmotionML uses the server without changes and workers never load the models
+    - waits for an answer a little longer than the server timeout, then drops the connection
+      and raises TimeoutError (e.g. the server hangs or is stopped)
+
+    MODEL_SERVER_KEY=<secret> python model_server.py [--socket PATH] [--max-batch 64] [--max-delay 0.002] [--timeout 30]
+"""
+
+import os
+import stat
+import time
+import queue
+import logging
+import argparse
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# seconds a request may wait for the batcher; clients give up CLIENT_GRACE seconds later
+DEFAULT_TIMEOUT = 30.0
+CLIENT_GRACE = 5.0
+
+
+def default_timeout():
+    timeout = os.environ.get('MODEL_SERVER_TIMEOUT')
+    return float(timeout) if timeout else DEFAULT_TIMEOUT
+
+
+def default_socket():
+    """Socket path in this user's private runtime directory. """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'emotion-models', 'models.sock')
+    return os.path.join(tempfile.gettempdir(), 'emotion-models-{}'.format(os.getuid()), 'models.sock')
+
+
+def _authkey(authkey=None):
+    """The shared secret of server and clients (MODEL_SERVER_KEY); there is no unauthenticated mode. """
+    if authkey is None:
+        key = os.environ.get('MODEL_SERVER_KEY')
+        authkey = key.encode('utf-8') if key else None
+    if not authkey:
+        raise ValueError('MODEL_SERVER_KEY must be set: the model server exchanges pickles and '
+                         'only talks to authenticated peers')
+    return authkey
+
+
+def _private_dir(path):
+    """Creates the directory of the socket (mode 0700), or checks that it is private to this user. """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('{} must be a directory owned by this user with mode 0700'.format(directory))
+
+
+def _remove_stale_socket(path):
+    """Removes a socket left by an earlier server, refuses to touch anything else. """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise FileExistsError('{} exists and is not a socket of this user'.format(path))
+    os.remove(path)
+
+
+class _Request(object):
+    def __init__(self, Xs):
+        self.Xs = Xs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ModelServer(object):
+    def __init__(self, address=None, registry=None, max_batch=64, max_delay=0.002, authkey=None, n_features=None,
+                 timeout=None):
+        self.authkey = _authkey(authkey)
+        if registry is None:
+            from registry import local_registry
+            registry = local_registry()
+        if n_features is None:
+            from EmotionML import COLUMNS
+            from features import feature_names
+            n_features = len(feature_names(COLUMNS))
+        self.address = address or default_socket()
+        self.registry = registry
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.n_features = n_features
+        self.timeout = timeout or default_timeout()
+        self._requests = queue.Queue()
+        self._listener = None
+        self._closed = False
+        self._ready = threading.Event()
+        self._startup_error = None
+
+    def serve_forever(self):
+        """Loads the ensemble, then accepts clients until close(). """
+        try:
+            self.registry.voting_classifier()
+            _private_dir(self.address)
+            _remove_stale_socket(self.address)
+            self._listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+            os.chmod(self.address, 0o600)
+        except BaseException as e:
+            self._startup_error = e
+            raise
+        finally:
+            self._ready.set()
+        threading.Thread(target=self._batcher, name='model-server-batcher', daemon=True).start()
+        log.info('Model server listening on %s', self.address)
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                if self._closed:
+                    break
+                log.warning('Could not accept a client: %s', e)
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def start(self):
+        """Serves in a daemon thread, returns once the socket accepts clients. """
+        threading.Thread(target=self._serve_quietly, name='model-server', daemon=True).start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+        return self
+
+    def _serve_quietly(self):
+        try:
+            self.serve_forever()
+        except Exception:
+            # reported by start()
+            pass
+
+    def close(self):
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+        self._requests.put(None)
+
+    #========== clients ==========#
+
+    def _handle(self, conn):
+        """Serves one client connection: one request at a time, answered in order. """
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    # unpicklable or truncated message
+                    reply = ('error', 'bad request: {}'.format(e))
+                else:
+                    reply = self._reply(message)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def _reply(self, message):
+        if not (isinstance(message, tuple) and len(message) == 2):
+            return ('error', 'bad request: expected (operation, payload)')
+        op, payload = message
+        if op == 'predict':
+            try:
+                Xs = self._check(payload)
+            except (TypeError, ValueError) as e:
+                metrics.inc('model_server_rejected')
+                return ('error', 'bad request: {}'.format(e))
+            request = _Request(Xs)
+            self._requests.put(request)
+            if not request.done.wait(self.timeout):
+                # the batcher is stuck (or gone); its late answer is dropped
+                metrics.inc('model_server_timeouts')
+                log.error('No answer from the batcher within %.1f s', self.timeout)
+                return ('timeout', 'no answer from the ensemble within {:.1f} s'.format(self.timeout))
+            return ('error', request.error) if request.error else ('ok', request.result)
+        if op == 'stats':
+            return ('ok', self.registry.stats())
+        return ('error', 'unknown operation {!r}'.format(op))
+
+    def _check(self, payload):
+        """Feature matrices of a predict request, raises ValueError/TypeError if malformed. """
+        if not isinstance(payload, (list, tuple)):
+            raise TypeError('payload must be a list of feature matrices')
+        Xs = []
+        for X in payload:
+            X = np.asarray(X, dtype=float)
+            if X.ndim != 2 or X.shape[1] != self.n_features:
+                raise ValueError('feature matrices must have shape (n, {}), got {}'.format(self.n_features, X.shape))
+            if not np.isfinite(X).all():
+                raise ValueError('feature matrices must be finite')
+            Xs.append(X)
+        return Xs
+
+    #========== micro-batching ==========#
+
+    def _next_batch(self):
+        """Blocks for a request, then gathers more until max_batch matrices or max_delay. """
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        size = len(first.Xs)
+        deadline = time.perf_counter() + self.max_delay
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._requests.put(None)
+                break
+            batch.append(request)
+            size += len(request.Xs)
+        return batch
+
+    def _batcher(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            Xs = [X for request in batch for X in request.Xs]
+            metrics.inc('model_server_requests', len(batch))
+            metrics.inc('model_server_batches')
+            try:
+                with metrics.timer('model_server_batch'):
+                    groups = self.registry.voting_classifier().predict_groups(Xs) if Xs else []
+            except Exception as e:
+                log.exception('Batch of %d requests failed', len(batch))
+                if len(batch) == 1:
+                    batch[0].error = '{}: {}'.format(type(e).__name__, e)
+                    batch[0].done.set()
+                else:
+                    # find the request that breaks the batch, answer the others
+                    for request in batch:
+                        self._predict_alone(request)
+                continue
+            start = 0
+            for request in batch:
+                request.result = groups[start:start+len(request.Xs)]
+                start += len(request.Xs)
+                request.done.set()
+
+    def _predict_alone(self, request):
+        try:
+            request.result = self.registry.voting_classifier().predict_groups(request.Xs) if request.Xs else []
+        except Exception as e:
+            request.error = '{}: {}'.format(type(e).__name__, e)
+        request.done.set()
+
+
+class RemoteVotingClassifier(object):
+    def __init__(self, address, authkey=None, timeout=None):
+        self.address = address
+        self.authkey = _authkey(authkey)
+        self.timeout = timeout or default_timeout() + CLIENT_GRACE
+        self._local = threading.local()
+
+    def _call(self, op, payload=None):
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            try:
+                if conn is None:
+                    conn = self._local.conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+                conn.send((op, payload))
+                answered = conn.poll(self.timeout)
+                if answered:
+                    status, result = conn.recv()
+                    break
+            except (EOFError, OSError):
+                # server restarted: reconnect once
+                self._local.conn = None
+                if attempt:
+                    raise ConnectionError('model server at {} is not available'.format(self.address))
+                continue
+            # a late answer would be read by the next call: start over on a new connection
+            conn.close()
+            self._local.conn = None
+            raise TimeoutError('model server at {} did not answer within {:.1f} s'.format(self.address, self.timeout))
+        if status == 'timeout':
+            raise TimeoutError('model server: ' + result)
+        if status != 'ok':
+            raise RuntimeError('model server: ' + result)
+        return result
+
+    def predict(self, X):
+        """Same as VotingClassifier.predict, computed by the server. """
+        return self.predict_groups([X])[0]
+
+    def predict_groups(self, Xs):
+        return self._call('predict', [np.asarray(X, dtype=float) for X in Xs])
+
+    def stats(self):
+        return self._call('stats')
+
+
+class RemoteRegistry(object):
+    def __init__(self, address=None, authkey=None, timeout=None):
+        self.address = address or default_socket()
+        self._voting_clf = RemoteVotingClassifier(self.address, authkey, timeout)
+
+    def voting_classifier(self):
+        return self._voting_clf
+
+    def stats(self):
+        return self._voting_clf.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the ensemble to local web workers over a Unix socket.')
+    parser.add_argument('--socket', default=os.environ.get('MODEL_SERVER') or None,
+                        help='socket path, in a directory private to this user (default: %s)' % default_socket())
+    parser.add_argument('--max-batch', type=int, default=64, help='feature matrices per ensemble call')
+    parser.add_argument('--max-delay', type=float, default=0.002, help='seconds to wait for more requests')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds a request may wait for the ensemble (default: MODEL_SERVER_TIMEOUT or 30)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    server = ModelServer(args.socket, max_batch=args.max_batch, max_delay=args.max_delay, timeout=args.timeout)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+class ReadingBuffer:
+    - preallocated ring buffer of headset readings as structured NumPy records
+      (time float64, attention..highGamma int32), filled in place by Mindwave.collect_buffer()
+    - values() returns the (N, 10) int32 readings as a view (no copy unless the ring wrapped)
+    - to_json() / from_json() convert from/to the json of Mindwave.collect_data(), which is
+      kept only as an export format
+    - from_arrays() / from_session() fill a buffer from arrays, or from a stored session dict
+"""
+
+import json
+import numpy as np
+
+RAW_COLUMNS = ['attention', 'meditation', 'delta', 'theta', 'lowAlpha', 'highAlpha', 'lowBeta', 'highBeta', 'lowGamma', 'highGamma']
+READING_DTYPE = np.dtype([('time', '<f8')] + [(c, '<i4') for c in RAW_COLUMNS])
+
+
+class ReadingBuffer(object):
+    def __init__(self, capacity=40):
+        assert capacity > 0, 'ERROR: capacity must be positive'
+        self._records = np.zeros(capacity, dtype=READING_DTYPE)
+        self._start = 0     # index of the oldest reading
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def capacity(self):
+        return len(self._records)
+
+    def append(self, t, values):
+        """Writes one reading in place, overwriting the oldest one when the buffer is full. """
+        i = (self._start + self._count) % self.capacity
+        self._records[i] = (t,) + tuple(values)
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+
+    def records(self):
+        """Readings in arrival order (a view unless the ring wrapped). """
+        end = self._start + self._count
+        if end <= self.capacity:
+            return self._records[self._start:end]
+        return np.concatenate([self._records[self._start:], self._records[:end - self.capacity]])
+
+    def times(self):
+        return self.records()['time']
+
+    def values(self):
+        """(N, 10) int32 array of the RAW_COLUMNS values. """
+        records = self.records()
+        if len(records) == 0:
+            return np.empty((0, len(RAW_COLUMNS)), dtype='<i4')
+        return np.ndarray(shape=(len(records), len(RAW_COLUMNS)), dtype='<i4', buffer=records,
+                          offset=READING_DTYPE.fields['attention'][1], strides=(READING_DTYPE.itemsize, 4))
+
+    def to_json(self):
+        """Exports the readings in the json format of Mindwave.collect_data(). """
+        return json.dumps({repr(t): [str(v) for v in row]
+                           for t, row in zip(self.times().tolist(), self.values().tolist())})
+
+    @classmethod
+    def from_json(cls, json_data):
+        loaded = json.loads(json_data)
+        buffer = cls(max(len(loaded), 1))
+        for t, entry in loaded.items():
+            buffer.append(float(t), [int(float(v)) for v in entry])
+        return buffer
+
+    @classmethod
+    def from_arrays(cls, times, values):
+        """Buffer holding timestamps (N,) and RAW_COLUMNS values (N, 10), filled in one copy. """
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        assert values.shape == (len(times), len(RAW_COLUMNS)), \
+               'ERROR: values must have shape ({}, {})'.format(len(times), len(RAW_COLUMNS))
+        buffer = cls(max(len(times), 1))
+        records = buffer._records[:len(times)]
+        records['time'] = times
+        for i, c in enumerate(RAW_COLUMNS):
+            records[c] = values[:, i]
+        buffer._count = len(times)
+        return buffer
+
+    @classmethod
+    def from_session(cls, session):
+        """Buffer holding the readings of a session dict (EmotionML.predict result, see session_codec). """
+        values = np.column_stack([np.asarray(session[c], dtype=np.float64) for c in RAW_COLUMNS]) \
+                 if session['feat_time'] else np.empty((0, len(RAW_COLUMNS)))
+        return cls.from_arrays([float(t) for t in session['feat_time']], values)
@@ -0,0 +1,258 @@
+"""
+class ModelRegistry:
+    - loads the pickled ensemble in Models/ once per process
+    - hands the same ready-built VotingClassifier to every caller
+    - reloads the ensemble when any model file changes on disk (mtime)
+    - keeps load time, file size and an estimate of the memory footprint per estimator
+    - with compact_path, serves the NumPy-only ensemble written by compact.py instead
+    - estimators whose prediction is not thread-safe (THREAD_UNSAFE, e.g. xgboost's
+      Booster.predict) are shared through a LockedEstimator, so concurrent requests and
+      the thread executor call them one at a time
+
+class PreloadedProcessPool:
+    - process pool whose workers load the ensemble once at start-up
+    - VotingClassifier calls estimators by name, so models are never pickled per call
+
+get_registry():
+    - returns the process-wide ModelRegistry used by EmotionML
+    - MODEL_EXECUTOR=serial|thread|process and MODEL_TIMEOUT=<seconds> select how the
+      estimators run (see make_executor)
+    - MODEL_COMPACT=<file.npz> serves a compact ensemble (see compact.py)
+    - MODEL_SERVER=<socket path> uses the shared model server instead of loading the
+      models in this process (see model_server.py, needs MODEL_SERVER_KEY)
+"""
+
+import os
+import time
+import pickle
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from voting import VotingClassifier
+from compact import load_ensemble
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Models')
+# (name, file) in the order the VotingClassifier expects them
+ENSEMBLE = [('xgb', 'XGBClassifier_model.pkl'),
+            ('knn', 'KNeighborsClassifier_model.pkl'),
+            ('rf', 'RandomForestClassifier_model.pkl'),
+            ('gb', 'GradientBoostingClassifier_model.pkl'),
+            ('adaB', 'AdaBoostClassifier_model.pkl'),
+            ('nb', 'GaussianNB_model.pkl'),
+            ('lda', 'LinearDiscriminantAnalysis_model.pkl')]
+
+
+# estimator classes whose predict/predict_proba must not run concurrently on one object
+THREAD_UNSAFE = ('XGBClassifier',)
+
+
+class LockedEstimator(object):
+    """Proxy of a shared estimator that serializes its predict and predict_proba calls. """
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self._lock = threading.Lock()
+
+    def predict(self, X):
+        with self._lock:
+            return self.estimator.predict(X)
+
+    def predict_proba(self, X):
+        with self._lock:
+            return self.estimator.predict_proba(X)
+
+    def __getattr__(self, name):
+        return getattr(self.estimator, name)
+
+
+def _shareable(model):
+    return LockedEstimator(model) if type(model).__name__ in THREAD_UNSAFE else model
+
+
+def model_nbytes(model, _seen=None):
+    """Estimated memory footprint of a model: nbytes of the arrays and buffers reachable from it. """
+    # id -> object, holding on to the temporary state objects so their ids are not reused
+    seen = _seen if _seen is not None else {}
+    if id(model) in seen:
+        return 0
+    seen[id(model)] = model
+    if isinstance(model, np.ndarray):
+        if model.dtype == object:
+            return model.nbytes + sum(model_nbytes(v, seen) for v in model.flat)
+        return model.nbytes
+    if isinstance(model, (bytes, bytearray)):
+        return len(model)
+    if isinstance(model, (str, int, float, bool, type(None))):
+        return 0
+    if isinstance(model, dict):
+        return sum(model_nbytes(v, seen) for v in model.values())
+    if isinstance(model, (list, tuple)):
+        return sum(model_nbytes(v, seen) for v in model)
+    # the pickled state: covers extension types such as sklearn's Tree and xgboost's Booster
+    try:
+        state = model.__getstate__() if hasattr(model, '__getstate__') else vars(model)
+    except Exception:
+        state = getattr(model, '__dict__', None)
+    return model_nbytes(state, seen) if isinstance(state, (dict, list, tuple)) else 0
+
+
+class ModelRegistry(object):
+    def __init__(self, model_dir=MODEL_DIR, ensemble=ENSEMBLE, voting='hard', executor=None, timeout=None,
+                 compact_path=None):
+        self.model_dir = model_dir
+        self.ensemble = list(ensemble)
+        self.compact_path = compact_path
+        self.voting = voting
+        self.executor = executor
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._mtimes = None
+        self._estimators = None
+        self._voting_clf = None
+        self._stats = {}
+
+    def _paths(self):
+        return [(name, os.path.join(self.model_dir, fname)) for name, fname in self.ensemble]
+
+    def _sources(self):
+        if self.compact_path:
+            return [self.compact_path]
+        return [path for _, path in self._paths()]
+
+    def _current_mtimes(self):
+        return [os.stat(path).st_mtime for path in self._sources()]
+
+    def _load_one(self, path):
+        """Helper function: unpickles one model, returns (model, seconds). """
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+        return model, time.perf_counter() - start
+
+    def _load_compact(self):
+        """Helper function: loads the compact ensemble, returns (estimators, stats). """
+        start = time.perf_counter()
+        estimators = load_ensemble(self.compact_path)
+        elapsed = time.perf_counter() - start
+        stats = {}
+        for name, model in estimators:
+            stats[name] = {'path': self.compact_path,
+                           'load_time': elapsed / len(estimators),
+                           'memory_bytes': sum(a.nbytes for a in model.arrays.values()),
+                           'file_bytes': os.path.getsize(self.compact_path)}
+        return estimators, stats
+
+    def load(self):
+        """(Re)loads every model of the ensemble and rebuilds the VotingClassifier. """
+        with self._lock:
+            mtimes = self._current_mtimes()
+            if self.compact_path:
+                estimators, stats = self._load_compact()
+            else:
+                estimators = []
+                stats = {}
+                for name, path in self._paths():
+                    model, elapsed = self._load_one(path)
+                    estimators.append((name, model))
+                    stats[name] = {'path': path,
+                                   'load_time': elapsed,
+                                   'memory_bytes': model_nbytes(model),
+                                   'file_bytes': os.path.getsize(path)}
+            self._estimators = estimators
+            self._voting_clf = VotingClassifier(estimators=[(name, _shareable(model)) for name, model in estimators],
+                                                voting=self.voting,
+                                                executor=self.executor, timeout=self.timeout)
+            self._stats = stats
+            self._mtimes = mtimes
+
+    def is_stale(self):
+        """True if nothing is loaded yet or a model file changed since the last load. """
+        if self._mtimes is None:
+            return True
+        try:
+            return self._current_mtimes() != self._mtimes
+        except OSError:
+            # a file is being replaced; keep serving the loaded ensemble
+            return False
+
+    def voting_classifier(self):
+        """Returns the shared VotingClassifier, loading or reloading it if needed. """
+        if self.is_stale():
+            with self._lock:
+                if self.is_stale():
+                    self.load()
+        return self._voting_clf
+
+    def estimators(self):
+        """Returns the loaded (name, model) pairs. """
+        self.voting_classifier()
+        return list(self._estimators)
+
+    def estimator(self, name):
+        """Returns one loaded model by name, as the VotingClassifier shares it (a LockedEstimator if not thread-safe). """
+        self.voting_classifier()
+        return self._voting_clf.named_estimators[name]
+
+    def stats(self):
+        """Returns load time (seconds), file size and estimated memory footprint (bytes) per estimator. """
+        with self._lock:
+            return {name: dict(s) for name, s in self._stats.items()}
+
+
+def _init_worker(model_dir, ensemble, compact_path):
+    """Process pool initializer: loads the ensemble once in the worker. """
+    global _registry
+    _registry = ModelRegistry(model_dir, ensemble, compact_path=compact_path)
+    _registry.load()
+
+
+def _call_estimator(name, method, X):
+    return getattr(get_registry().estimator(name), method)(X)
+
+
+class PreloadedProcessPool(ProcessPoolExecutor):
+    def __init__(self, max_workers=None, model_dir=MODEL_DIR, ensemble=ENSEMBLE, compact_path=None):
+        ProcessPoolExecutor.__init__(self, max_workers, initializer=_init_worker,
+                                     initargs=(model_dir, list(ensemble), compact_path))
+
+    def submit_estimator(self, name, method, X):
+        """Runs <method>(X) of the worker's copy of estimator <name>. """
+        return self.submit(_call_estimator, name, method, X)
+
+
+def make_executor(kind, max_workers=None, compact_path=None):
+    """Returns an executor for VotingClassifier: 'serial' (None), 'thread' or 'process'. """
+    if kind in (None, '', 'serial'):
+        return None
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers or len(ENSEMBLE))
+    if kind == 'process':
+        return PreloadedProcessPool(max_workers, compact_path=compact_path)
+    raise ValueError('Unknown executor: %r' % kind)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def local_registry():
+    """Builds a ModelRegistry configured by MODEL_EXECUTOR, MODEL_TIMEOUT and MODEL_COMPACT. """
+    timeout = os.environ.get('MODEL_TIMEOUT')
+    compact_path = os.environ.get('MODEL_COMPACT')
+    executor = make_executor(os.environ.get('MODEL_EXECUTOR'), compact_path=compact_path)
+    return ModelRegistry(executor=executor, timeout=float(timeout) if timeout else None,
+                         compact_path=compact_path)
+
+
+def get_registry():
+    """Returns the process-wide ModelRegistry (a model_server.RemoteRegistry with MODEL_SERVER). """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                if os.environ.get('MODEL_SERVER'):
+                    from model_server import RemoteRegistry
+                    _registry = RemoteRegistry(os.environ['MODEL_SERVER'])
+                else:
+                    _registry = local_registry()
+    return _registry
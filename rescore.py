@@ -0,0 +1,273 @@
+"""
+Offline re-scoring of archived sessions with the current ensemble
+
+    python rescore.py OUT_DIR --dynamo [--segment i --total-segments n]
+    python rescore.py OUT_DIR --sql
+    python rescore.py OUT_DIR recordings/*.json recordings/*.npy
+
+    - sessions are streamed from the DynamoDB table (paginated scan), the local SQL store,
+      or files: .json (Mindwave.collect_data() json, or a stored session dict) and
+      .npy (readings.READING_DTYPE records, or an (N, 11) array of time + RAW_COLUMNS)
+    - chunks of sessions are scored in a process pool; every worker loads the ensemble
+      once (get_registry) and scores a chunk with one VotingClassifier.predict_groups call
+    - results are written as columnar chunks OUT_DIR/part-NNNNN.npz (columns: user, time,
+      cls, percentage, windows, old_cls, error), each written atomically
+    - sessions already scored in OUT_DIR are skipped, so an interrupted run is resumed by
+      running the same command again; sessions that failed are scored again, and
+      read_results() keeps the latest row of every session
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+
+from readings import ReadingBuffer, READING_DTYPE, RAW_COLUMNS
+from session_codec import decode_session
+
+COLUMNS = ['user', 'time', 'cls', 'percentage', 'windows', 'old_cls', 'error']
+
+
+#========== sources ==========#
+
+def _session_blob(data):
+    """Helper function: Dynamo Binary / SQL bytes / legacy json str -> picklable bytes or str. """
+    if isinstance(data, str):
+        return data
+    return bytes(getattr(data, 'value', data))
+
+
+def store_sessions(store, **scan_args):
+    """Yields (user, time, payload, old_cls) for every item of a SessionStore. """
+    for item in store.dynamoScan(**scan_args):
+        cls = item.get('cls')
+        yield item['userName'], item['time'], ('session', _session_blob(item['data'])), \
+              int(cls) if cls is not None else -1
+
+
+def file_sessions(patterns):
+    """Yields (path, '', payload, -1) for every matching .json / .npy file. """
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if path.endswith('.npy'):
+                yield path, '', ('npy', path), -1
+            else:
+                yield path, '', ('json', path), -1
+
+
+def load_buffer(payload):
+    """Turns a source payload into a ReadingBuffer. """
+    kind, value = payload
+    if kind == 'session':
+        return ReadingBuffer.from_session(decode_session(value))
+    if kind == 'npy':
+        array = np.load(value)
+        if array.dtype.names:
+            array = array.astype(READING_DTYPE)
+            return ReadingBuffer.from_arrays(array['time'], np.column_stack([array[c] for c in RAW_COLUMNS]))
+        assert array.ndim == 2 and array.shape[1] == len(RAW_COLUMNS) + 1, \
+               'ERROR: {} is not an (N, 11) array of time + readings'.format(value)
+        return ReadingBuffer.from_arrays(array[:, 0], array[:, 1:])
+    with open(value) as f:
+        loaded = json.load(f)
+    if 'feat_time' in loaded:
+        return ReadingBuffer.from_session(loaded)
+    return ReadingBuffer.from_json(json.dumps(loaded))
+
+
+#========== workers ==========#
+
+def _init_worker():
+    """Loads the ensemble once per worker process. """
+    from registry import get_registry
+    get_registry().voting_classifier()
+
+
+def score_chunk(chunk, kwargs=None):
+    """Scores a list of (user, time, payload, old_cls), returns the rows as a dict of columns. """
+    from EmotionML import EmotionML
+    from registry import get_registry
+    buffers, errors = [], []
+    for _, _, payload, _ in chunk:
+        try:
+            buffers.append(load_buffer(payload))
+            errors.append('')
+        except Exception as e:
+            errors.append('{}: {}'.format(type(e).__name__, e))
+    scored = iter(EmotionML.score_batch(buffers, get_registry(), **(kwargs or {})))
+    rows = {c: [] for c in COLUMNS}
+    for (user, t, _, old_cls), error in zip(chunk, errors):
+        if not error:
+            ML, display_probs, error = next(scored)
+        if error:
+            percentage, cls, windows = np.nan, -1, 0
+        else:
+            percentage, cls, _ = ML.vote(ML.aggregate(display_probs))
+            windows = len(display_probs)
+        for c, v in zip(COLUMNS, (user, t, cls, percentage, windows, old_cls, error)):
+            rows[c].append(v)
+    return rows
+
+
+#========== output ==========#
+
+class ChunkWriter(object):
+    def __init__(self, out_dir, chunk_size=1000):
+        self.out_dir = out_dir
+        self.chunk_size = chunk_size
+        os.makedirs(out_dir, exist_ok=True)
+        self.parts = sorted(glob.glob(os.path.join(out_dir, 'part-*.npz')))
+        self._rows = {c: [] for c in COLUMNS}
+
+    def done_keys(self):
+        """(user, time) of every session already scored (rows with an error do not count). """
+        keys = set()
+        for path in self.parts:
+            with np.load(path) as part:
+                keys.update(key for key, error in zip(zip(part['user'].tolist(), part['time'].tolist()),
+                                                      part['error'].tolist()) if not error)
+        return keys
+
+    def add(self, rows):
+        for c in COLUMNS:
+            self._rows[c].extend(rows[c])
+        if len(self._rows['user']) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows['user']:
+            return
+        path = os.path.join(self.out_dir, 'part-{:05d}.npz'.format(len(self.parts)))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     user=np.array(self._rows['user'], dtype=str),
+                     time=np.array(self._rows['time'], dtype=str),
+                     cls=np.array(self._rows['cls'], dtype=np.int8),
+                     percentage=np.array(self._rows['percentage'], dtype=np.float32),
+                     windows=np.array(self._rows['windows'], dtype=np.int32),
+                     old_cls=np.array(self._rows['old_cls'], dtype=np.int8),
+                     error=np.array(self._rows['error'], dtype=str))
+        os.replace(tmp_path, path)
+        self.parts.append(path)
+        self._rows = {c: [] for c in COLUMNS}
+
+
+def read_results(out_dir):
+    """Concatenates all chunks of OUT_DIR into one dict of columns, the latest row of every session. """
+    parts = [np.load(path) for path in sorted(glob.glob(os.path.join(out_dir, 'part-*.npz')))]
+    if not parts:
+        return {c: np.array([]) for c in COLUMNS}
+    results = {c: np.concatenate([part[c] for part in parts]) for c in COLUMNS}
+    latest = {key: i for i, key in enumerate(zip(results['user'].tolist(), results['time'].tolist()))}
+    rows = np.array(sorted(latest.values()), dtype=int)
+    return {c: results[c][rows] for c in COLUMNS}
+
+
+#========== driver ==========#
+
+def _chunks(sessions, size):
+    chunk = []
+    for session in sessions:
+        chunk.append(session)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rescore(sessions, out_dir, workers=None, batch_size=32, chunk_size=1000, progress=10.0, kwargs=None):
+    """Scores sessions (iterable of (user, time, payload, old_cls)) into out_dir, returns counters. """
+    writer = ChunkWriter(out_dir, chunk_size)
+    done = writer.done_keys()
+    counts = {'scored': 0, 'failed': 0, 'skipped': 0}
+    start = last_report = time.time()
+
+    def todo():
+        for session in sessions:
+            if (session[0], session[1]) in done:
+                counts['skipped'] += 1
+            else:
+                yield session
+
+    def collect(future):
+        rows = future.result()
+        failed = sum(1 for e in rows['error'] if e)
+        counts['failed'] += failed
+        counts['scored'] += len(rows['user']) - failed
+        writer.add(rows)
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = set()
+        try:
+            for chunk in _chunks(todo(), batch_size):
+                # bounded number of chunks in flight, so sources are streamed
+                while len(pending) >= 2 * workers:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        collect(future)
+                pending.add(pool.submit(score_chunk, chunk, kwargs))
+                if progress and time.time() - last_report >= progress:
+                    last_report = time.time()
+                    _report(counts, start)
+            for future in wait(pending).done:
+                collect(future)
+        finally:
+            # keep whatever finished, so a rerun resumes from here
+            writer.flush()
+    _report(counts, start)
+    return counts
+
+
+def _report(counts, start):
+    elapsed = max(time.time() - start, 1e-9)
+    processed = counts['scored'] + counts['failed']
+    print('{} scored, {} failed, {} skipped (already done) - {:.1f} sessions/s'.format(
+        counts['scored'], counts['failed'], counts['skipped'], processed / elapsed))
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-score archived sessions with the current ensemble.')
+    parser.add_argument('out_dir', help='directory of the part-NNNNN.npz result chunks')
+    parser.add_argument('files', nargs='*', help='.json / .npy recordings (globs allowed)')
+    parser.add_argument('--dynamo', action='store_true', help='scan the DynamoDB table')
+    parser.add_argument('--sql', action='store_true', help='scan the local SQL session store')
+    parser.add_argument('--segment', type=int, default=None, help='parallel scan segment of this run')
+    parser.add_argument('--total-segments', type=int, default=None, help='number of parallel scan segments')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=32, help='sessions per worker task')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='sessions per output chunk')
+    parser.add_argument('--progress', type=float, default=10.0, help='seconds between progress reports')
+    parser.add_argument('--max-gap', type=int, default=0, help='interpolate gaps of at most this many samples')
+    parser.add_argument('--hop-size', type=int, default=None, help='samples between sequence starts (overlap)')
+    parser.add_argument('--seq-sizes', type=int, nargs='+', default=None, help='sequence sizes to score')
+    parser.add_argument('--recency-half-life', type=float, default=None, help='recency weighting of the vote')
+    args = parser.parse_args(argv)
+    assert args.dynamo + args.sql + bool(args.files) == 1, 'ERROR: give exactly one of --dynamo, --sql or files'
+
+    if args.dynamo:
+        from Dynamo import Dynamo
+        scan_args = {}
+        if args.total_segments:
+            scan_args = {'segment': args.segment or 0, 'total_segments': args.total_segments}
+        sessions = store_sessions(Dynamo.shared(), **scan_args)
+    elif args.sql:
+        from app.sql_store import SqlStore
+        sessions = store_sessions(SqlStore())
+    else:
+        sessions = file_sessions(args.files)
+    rescore(sessions, args.out_dir, workers=args.workers, batch_size=args.batch_size,
+            chunk_size=args.chunk_size, progress=args.progress,
+            kwargs={'max_gap': args.max_gap, 'hop_size': args.hop_size, 'seq_sizes': args.seq_sizes,
+                    'recency_half_life': args.recency_half_life})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Compact binary encoding of a recorded session (the dict returned by EmotionML.predict)
+    encode_session():
+    - 'feat_time' -> float64 timestamps, the 10 RAW_COLUMNS series -> int32
+    - every other key (vote0..vote5, ...) -> small JSON header
+    - optional delta encoding (exact: timestamps on their int64 bit patterns, bands modulo 2**32)
+      and zlib compression
+    decode_session():
+    - decodes bytes from encode_session(), or a legacy JSON string, back to the dict
+      (series as lists of ints, timestamps as the same strings Mindwave produced)
+    - raises ValueError for anything else (unknown flags, truncated or non-JSON data)
+
+Layout: MAGIC | flags (1 byte) | header length (uint32) | header JSON | payload
+        payload = timestamps (n float64) + bands (10 x n int32), zlib-compressed if FLAG_ZLIB
+"""
+
+import json
+import zlib
+import struct
+import numpy as np
+
+MAGIC = b'EEG1'
+FLAG_DELTA = 1
+FLAG_ZLIB = 2
+SERIES = ['attention', 'meditation', 'delta', 'theta', 'lowAlpha', 'highAlpha', 'lowBeta', 'highBeta', 'lowGamma', 'highGamma']
+TIME_KEY = 'feat_time'
+_PREFIX = struct.Struct('<4sBI')
+
+
+def encode_session(res, delta=True, compress=True):
+    """Encodes a session dict to bytes. """
+    header = {k: v for k, v in res.items() if k not in SERIES and k != TIME_KEY}
+    times = np.asarray([float(t) for t in res.get(TIME_KEY, [])], dtype='<f8')
+    n = len(times)
+    bands = np.empty((len(SERIES), n), dtype='<i4')
+    for i, name in enumerate(SERIES):
+        values = np.asarray(res.get(name, []), dtype=np.float64)
+        assert values.shape == (n,), 'ERROR: series {} has {} samples, expected {}'.format(name, len(values), n)
+        bands[i] = values
+    header['n'] = n
+    flags = 0
+    bits = times.view('<i8')
+    if delta:
+        flags |= FLAG_DELTA
+        bits = np.diff(bits, prepend=np.int64(0)).astype('<i8')
+        bands = np.diff(bands, axis=1, prepend=np.int32(0)).astype('<i4')
+    payload = bits.tobytes() + bands.tobytes()
+    if compress:
+        flags |= FLAG_ZLIB
+        payload = zlib.compress(payload)
+    header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return _PREFIX.pack(MAGIC, flags, len(header)) + header + payload
+
+
+def decode_session(blob):
+    """Decodes bytes from encode_session(), a boto3 Binary, or a legacy JSON string. """
+    if isinstance(blob, str):
+        return json.loads(blob)
+    blob = bytes(getattr(blob, 'value', blob))
+    if not blob.startswith(MAGIC):
+        return json.loads(blob.decode('utf-8'))
+    _, flags, header_len = _PREFIX.unpack_from(blob)
+    if flags & ~(FLAG_DELTA | FLAG_ZLIB):
+        raise ValueError('unknown session encoding flags {:#04x}'.format(flags))
+    start = _PREFIX.size
+    res = json.loads(blob[start:start+header_len].decode('utf-8'))
+    payload = blob[start+header_len:]
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    n = res.pop('n')
+    bits = np.frombuffer(payload, dtype='<i8', count=n)
+    bands = np.frombuffer(payload, dtype='<i4', offset=8*n).reshape(len(SERIES), n)
+    if flags & FLAG_DELTA:
+        bits = np.cumsum(bits, dtype='<i8')
+        bands = np.cumsum(bands, axis=1, dtype='<i4')
+    res[TIME_KEY] = [repr(t) for t in bits.view('<f8').tolist()]
+    for i, name in enumerate(SERIES):
+        res[name] = bands[i].tolist()
+    return res
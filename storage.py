@@ -0,0 +1,45 @@
+"""
+class SessionStore:
+    - interface of the emotion history backends (Dynamo, app.sql_store.SqlStore)
+    - keeps the Dynamo method names, so History and WriteBehind work with any backend
+    Items are dicts with userName, time (ISO 8601), data (session_codec bytes or legacy
+    JSON), result (average probability in %, as a string) and cls (overall class 1-5).
+"""
+
+
+class SessionStore(object):
+    def makeItem(self, userName, time, data, result, cls=None):
+        item = {
+           'userName' : userName,
+           'time' : time,
+           'data' : data,
+           'result': result
+        }
+        if cls is not None:
+            item['cls'] = cls
+        return item
+
+    def dynamoAdd(self, userName, time, data, result, cls=None):
+        """Stores one item, replacing any item with the same userName and time. """
+        raise NotImplementedError
+
+    def dynamoAddBatch(self, items):
+        """Stores items made by makeItem(). """
+        for item in items:
+            self.dynamoAdd(item['userName'], item['time'], item['data'], item['result'], item.get('cls'))
+
+    def dynamoQuery(self, userName):
+        """Returns all items of a user in time order. """
+        raise NotImplementedError
+
+    def dynamoSummaries(self, userName):
+        """Returns time, result and cls (if stored) of all items of a user in time order. """
+        raise NotImplementedError
+
+    def dynamoGetData(self, userName, time):
+        """Returns the data blob of one item. """
+        raise NotImplementedError
+
+    def dynamoScan(self):
+        """Yields every item of every user (no order guaranteed). """
+        raise NotImplementedError
@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import socket
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RAW_COLUMNS = ['attention', 'meditation', 'delta', 'theta', 'lowAlpha', 'highAlpha', 'lowBeta', 'highBeta', 'lowGamma', 'highGamma']
+
+
+def make_recording(length=40, seed=0, start=1.6e9):
+    """Json of a Mindwave-shaped recording, as returned by Mindwave.collect_data(). """
+    rng = np.random.RandomState(seed)
+    readings = np.empty((length, len(RAW_COLUMNS)), dtype=np.int64)
+    readings[:, :2] = rng.randint(1, 101, size=(length, 2))
+    readings[:, 2:] = np.exp(rng.normal(10, 1.5, size=(length, 8))).astype(np.int64) + 1
+    return json.dumps({repr(start + i): [str(v) for v in row] for i, row in enumerate(readings.tolist())})
+
+
+@pytest.fixture
+def recording():
+    return make_recording()
+
+
+class FirstFeatureVote(object):
+    """VotingClassifier stand-in: the probability of a row is its first feature (modulo
+    <modulo>, scaled to [0, 1), if given); rows with a negative probability fail. """
+    def __init__(self, modulo=None):
+        self.modulo = modulo
+
+    def predict(self, X):
+        probs = np.asarray(X, dtype=float)[:, 0]
+        if self.modulo:
+            probs = (probs % self.modulo) / self.modulo
+        if (probs < 0).any():
+            raise ValueError('negative probability')
+        return (probs > 0.5).astype(int), probs.tolist()
+
+    def predict_groups(self, Xs):
+        return [self.predict(X) for X in Xs]
+
+
+class StandInRegistry(object):
+    def __init__(self, voting_clf):
+        self._voting_clf = voting_clf
+
+    def voting_classifier(self):
+        return self._voting_clf
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def stand_in_registry(request):
+    """Registry serving a FirstFeatureVote; indirect parametrization sets its modulo. """
+    return StandInRegistry(FirstFeatureVote(getattr(request, 'param', None)))
+
+
+@pytest.fixture(scope='session')
+def flask_app(tmp_path_factory):
+    """The app on a fresh SQLite database (the config is read when app is first imported). """
+    os.environ['DATABASE_URL'] = 'sqlite:///' + str(tmp_path_factory.mktemp('app') / 'app.db')
+    os.environ['SESSION_BACKEND'] = 'sql'
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def login(flask_app):
+    """Returns login(username): a test client logged in as that (new) user. """
+    from app import db
+    from app.models import User
+
+    def login(username):
+        with flask_app.app_context():
+            user = User.query.filter_by(username=username).first()
+            if user is None:
+                user = User(username=username, email=username + '@example.com')
+                user.set_password(username)
+                db.session.add(user)
+                db.session.commit()
+            user_id = user.id
+        client = flask_app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return login
+
+
+@pytest.fixture(scope='session')
+def moto_endpoint():
+    """URL of a moto server (DynamoDB stand-in) for this test session. """
+    moto_server = pytest.importorskip('moto.server')
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = moto_server.ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    yield 'http://127.0.0.1:{}'.format(port)
+    server.stop()
+
+
+@pytest.fixture
+def dynamo(moto_endpoint, monkeypatch):
+    """A Dynamo on the moto server. """
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ENDPOINT_URL', moto_endpoint)
+    from Dynamo import Dynamo
+    return Dynamo()
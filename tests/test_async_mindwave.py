@@ -0,0 +1,63 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import AsyncMindwave
+from bench import FakeHeadset
+
+
+class SilentHeadset(object):
+    """Accepts connections and never sends anything. """
+    def __init__(self):
+        self._server = socket.socket()
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(4)
+        self.port = self._server.getsockname()[1]
+        self._clients = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                self._clients.append(self._server.accept()[0])
+            except OSError:
+                return
+
+    def close(self):
+        self._server.close()
+        for conn in self._clients:
+            conn.close()
+
+
+@pytest.fixture
+def headsets():
+    live, silent = FakeHeadset(), SilentHeadset()
+    yield live, silent
+    live.close()
+    silent.close()
+
+
+def test_a_silent_headset_times_out_alone(headsets):
+    live, silent = headsets
+    endpoints = ['127.0.0.1:{}'.format(live.port), ('127.0.0.1', silent.port)]
+    start = time.perf_counter()
+    results = asyncio.run(AsyncMindwave.collect_many(endpoints, duration=40, timeout=1.0))
+    assert time.perf_counter() - start < 3.0
+    assert len(json.loads(results[endpoints[0]])) == 40
+    assert results[endpoints[1]] is None
+
+
+def test_the_timeout_covers_connecting(monkeypatch):
+    async def never_connects(host, port):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(asyncio, 'open_connection', never_connects)
+    headset = AsyncMindwave.AsyncMindwave(port=1)
+    start = time.perf_counter()
+    assert asyncio.run(headset.collect_data(duration=40, timeout=0.2)) is None
+    assert headset.timed_out and time.perf_counter() - start < 2.0
+    assert headset.stats['readings'] == 0
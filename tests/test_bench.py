@@ -0,0 +1,40 @@
+import json
+
+import numpy as np
+import pytest
+
+import bench
+import registry
+
+
+def test_summarize_reports_percentiles_in_ms():
+    stats = bench.summarize([0.001 * i for i in range(1, 101)])
+    assert stats['n'] == 100
+    assert stats['p50'] == pytest.approx(50.5)
+    assert stats['p99'] == pytest.approx(99.01)
+    assert stats['mean'] == pytest.approx(50.5)
+    assert stats['throughput'] == pytest.approx(1 / 0.0505)
+    assert bench.summarize([]) == {}
+
+
+def test_compare_flags_slower_stages_only():
+    baseline = {'stages': {'predict': {'p50': 10.0}, 'clean': {'p50': 1.0}}}
+    results = {'stages': {'predict': {'p50': 12.5}, 'clean': {'p50': 1.1}, 'new_stage': {'p50': 5.0}}}
+    assert bench.compare(results, baseline, 0.2) == ['predict']
+    assert bench.compare(results, baseline, 0.3) == []
+
+
+def test_synthetic_recordings_are_reproducible():
+    a, b = bench.synthetic_recording(40, 0.2, seed=3), bench.synthetic_recording(40, 0.2, seed=3)
+    assert a == b
+    readings = np.array(list(json.loads(a).values()), dtype=int)
+    assert readings.shape == (40, 10)
+    assert (readings[:, 2:] == 0).any(axis=1).sum() > 0
+
+
+@pytest.mark.parametrize('stand_in_registry', [100], indirect=True)
+def test_every_stage_is_timed(stand_in_registry, monkeypatch):
+    monkeypatch.setattr(registry, '_registry', stand_in_registry)
+    recordings = [bench.synthetic_recording(length, 0.0, seed) for seed, length in enumerate([40, 20, 12])]
+    samples = bench.bench_stages(recordings)
+    assert all(len(samples[stage]) == 3 for stage in samples)
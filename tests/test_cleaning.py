@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+
+from EmotionML import EmotionML, clean_bands
+
+
+def _bands(rows=10):
+    return [[str(100 * (r + 1) + b) for b in range(8)] for r in range(rows)]
+
+
+def test_short_gaps_of_non_numeric_readings_are_interpolated():
+    values = _bands()
+    values[3][2] = 'n/a'
+    values[6][0] = ''
+    cleaned, report = clean_bands(values, max_gap=1)
+    assert cleaned.shape == (10, 8) and cleaned.flags.writeable
+    assert cleaned[3, 2] == (302 + 502) / 2.0 and cleaned[6, 0] == (600 + 800) / 2.0
+    assert report['interpolated'] == 2 and report['dropped'] == 0
+    assert report['invalid']['lowAlpha'] == 1 and report['invalid']['delta'] == 1
+
+
+def test_gaps_longer_than_max_gap_are_dropped():
+    values = _bands()
+    values[3][2] = values[4][2] = 'n/a'
+    values[7][1] = '0'
+    cleaned, report = clean_bands(values, max_gap=1)
+    assert cleaned.shape == (8, 8) and report['dropped'] == 2 and report['interpolated'] == 1
+    assert report['gaps'] == {'count': 2, 'longest': 2, 'mean': 1.5, 'interpolated': 1}
+
+
+def test_max_gap_in_the_pipeline(recording):
+    loaded = json.loads(recording)
+    first = sorted(loaded)[5]
+    loaded[first][4] = 'x'
+    ML = EmotionML(feature_cache=False, max_gap=2)
+    ML.load_data(json.dumps(loaded))
+    ML._clean_data()
+    assert ML.quality['kept'] == ML.quality['samples'] == 40
+    assert ML.quality['interpolated'] == 1
+    assert np.isfinite(ML.cleaned.values).all()
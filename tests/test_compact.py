@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.ensemble import AdaBoostClassifier, ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+import compact
+
+
+def _data(n, seed):
+    rng = np.random.RandomState(seed)
+    X = rng.rand(n, 16) * 1e5
+    y = ((X[:, 0] + X[:, 5] + rng.rand(n) * 5e4) > 1.2e5).astype(int)
+    return X, y
+
+
+def _xgb():
+    xgboost = pytest.importorskip('xgboost')
+    return xgboost.XGBClassifier(n_estimators=30, max_depth=4)
+
+
+MODELS = {
+    'rf': lambda: RandomForestClassifier(20, random_state=0),
+    'extra_trees': lambda: ExtraTreesClassifier(20, random_state=0),
+    'gb': lambda: GradientBoostingClassifier(n_estimators=30, random_state=0),
+    'adaB': lambda: AdaBoostClassifier(n_estimators=30, random_state=0),
+    'tree': lambda: DecisionTreeClassifier(random_state=0),
+    'xgb': _xgb,
+    'knn': lambda: KNeighborsClassifier(5),
+    'knn_distance': lambda: KNeighborsClassifier(4, weights='distance'),
+    'nb': lambda: GaussianNB(),
+    'lda': lambda: LinearDiscriminantAnalysis(),
+}
+
+
+@pytest.mark.parametrize('name', sorted(MODELS))
+def test_compact_matches_fitted_model(name, tmp_path):
+    X, y = _data(400, 0)
+    X_test, _ = _data(300, 1)
+    model = MODELS[name]().fit(X, y)
+    path = str(tmp_path / 'ensemble.npz')
+    compact.export_ensemble([(name, model)], path)
+    (loaded_name, estimator), = compact.load_ensemble(path)
+    assert loaded_name == name
+    np.testing.assert_allclose(estimator.predict_proba(X_test), model.predict_proba(X_test), atol=1e-6)
+    np.testing.assert_array_equal(estimator.predict(X_test), model.predict(X_test))
+
+
+def test_samme_r_adaboost_matches_fitted_model(tmp_path):
+    if 'algorithm' not in AdaBoostClassifier().get_params():
+        pytest.skip('this scikit-learn has no SAMME.R')
+    X, y = _data(400, 0)
+    X_test, _ = _data(300, 1)
+    model = AdaBoostClassifier(n_estimators=30, algorithm='SAMME.R', random_state=0).fit(X, y)
+    path = str(tmp_path / 'ensemble.npz')
+    compact.export_ensemble([('adaB', model)], path)
+    (_, estimator), = compact.load_ensemble(path)
+    np.testing.assert_allclose(estimator.predict_proba(X_test), model.predict_proba(X_test), atol=1e-6)
+
+
+def test_unsupported_estimator_is_rejected(tmp_path):
+    X, y = _data(100, 0)
+    with pytest.raises(TypeError):
+        compact.export_ensemble([('lr', LogisticRegression().fit(X, y))], str(tmp_path / 'ensemble.npz'))
@@ -0,0 +1,53 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import get_aws
+
+
+def test_one_client_is_shared_by_all_threads(dynamo, moto_endpoint):
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(get_aws.getClient('dynamodb'))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(client is dynamo.client for client in clients)
+    # the endpoint is read when the client is built, not when get_aws is imported
+    assert dynamo.client.meta.endpoint_url == moto_endpoint
+
+
+def test_credentials_are_cached_until_they_expire(monkeypatch):
+    fetched = []
+
+    def fetch():
+        expires = datetime.now(timezone.utc) + timedelta(seconds=3600 if not fetched else 60)
+        fetched.append({'AccessKeyId': 'id{}'.format(len(fetched)), 'SecretAccessKey': 'secret',
+                        'SessionToken': 'token', 'Expiration': expires})
+        return fetched[-1]
+
+    monkeypatch.delenv('AWS_ENDPOINT_URL', raising=False)
+    monkeypatch.setattr(get_aws, '_fetchCredentials', fetch)
+    monkeypatch.setattr(get_aws, '_credentials', None)
+    monkeypatch.setattr(get_aws, '_clients', {})
+    client = get_aws.getClient('dynamodb')
+    assert get_aws.getClient('dynamodb') is client and len(fetched) == 1
+    # about to expire: new credentials, new client
+    monkeypatch.setattr(get_aws, '_credentials', dict(fetched[0], Expiration=datetime.now(timezone.utc)))
+    refreshed = get_aws.getClient('dynamodb')
+    assert refreshed is not client and len(fetched) == 2
+    assert refreshed._request_signer._credentials.access_key == 'id1'
+
+
+def test_batches_round_trip(dynamo):
+    items = [dynamo.makeItem('batch', '2020-01-01T00:00:{:02d}Z'.format(i), bytes([i]), str(i), i % 5 + 1)
+             for i in range(30)]
+    # a later item of the same key replaces the earlier one
+    items.append(dynamo.makeItem('batch', items[3]['time'], b'new', '99', 5))
+    dynamo.dynamoAddBatch(items)
+    stored = dynamo.dynamoQuery('batch')
+    assert [item['time'] for item in stored] == [item['time'] for item in items[:30]]
+    assert stored[3]['result'] == '99' and bytes(stored[3]['data'].value) == b'new'
+    summaries = list(dynamo.dynamoSummaries('batch'))
+    assert summaries[0] == {'time': items[0]['time'], 'result': '0', 'cls': 1}
+    assert bytes(dynamo.dynamoGetData('batch', items[7]['time']).value) == bytes([7])
+    assert sum(1 for item in dynamo.dynamoScan() if item['userName'] == 'batch') == 30
@@ -0,0 +1,76 @@
+import io
+import os
+
+import numpy as np
+
+from feature_cache import FeatureCache, feature_key
+
+
+def _features(i):
+    return np.full((5, 3), float(i))
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = FeatureCache(max_items=2)
+    for i in range(2):
+        cache.put('k{}'.format(i), _features(i))
+    cache.get('k0')
+    cache.put('k2', _features(2))
+    assert cache.get('k1') is None
+    assert cache.get('k0')[0, 0] == 0 and cache.get('k2')[0, 0] == 2
+    stored = cache.get('k0')
+    assert not stored.flags.writeable
+    assert cache.stats()['items'] == 2 and cache.stats()['misses'] == 1
+
+
+def test_disk_tier_is_shared_by_new_instances(tmp_path):
+    key = feature_key(np.ones((40, 8)), seq_sizes=(8,), hop_size=None)
+    FeatureCache(cache_dir=str(tmp_path)).put(key, _features(7))
+    cache = FeatureCache(cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(cache.get(key), _features(7))
+    assert cache.stats()['disk_hits'] == 1
+    # then served from memory
+    cache.get(key)
+    assert cache.stats()['hits'] == 1
+
+
+def test_disk_tier_evicts_down_to_its_size(tmp_path):
+    one_file = len(_npy_bytes(_features(0)))
+    cache_dir = tmp_path / 'cache'
+    cache = FeatureCache(max_items=0, cache_dir=str(cache_dir), max_disk_bytes=2 * one_file)
+    for i in range(2):
+        cache.put('k{}'.format(i), _features(i))
+        os.utime(cache._path('k{}'.format(i)), (i, i))
+    cache.get('k0')     # most recently used now
+    cache.put('k2', _features(2))
+    assert sorted(os.listdir(str(cache_dir))) == ['k0.npy', 'k2.npy']
+
+
+def _npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def test_corrupt_and_partial_files_are_misses(tmp_path):
+    cache = FeatureCache(max_items=0, cache_dir=str(tmp_path))
+    cache.put('partial', _features(1))
+    with open(cache._path('partial'), 'r+b') as f:
+        f.truncate(os.path.getsize(cache._path('partial')) - 16)
+    with open(cache._path('corrupt'), 'wb') as f:
+        f.write(b'not an npy file')
+    assert cache.get('partial') is None and cache.get('corrupt') is None
+    assert cache.stats()['misses'] == 2
+    cache.put('corrupt', _features(2))
+    assert cache.get('corrupt')[0, 0] == 2
+
+
+def test_a_failing_utime_does_not_lose_the_hit(tmp_path, monkeypatch):
+    cache = FeatureCache(max_items=0, cache_dir=str(tmp_path))
+    cache.put('k', _features(4))
+
+    def read_only(*args, **kwargs):
+        raise PermissionError('read-only cache directory')
+
+    monkeypatch.setattr(os, 'utime', read_only)
+    assert cache.get('k')[0, 0] == 4
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from EmotionML import EmotionML, windows_to_long, COLUMNS
+from features import extract_minimal_features, feature_names
+
+
+def _sequences(json_data):
+    ML = EmotionML(feature_cache=False)
+    ML.load_data(json_data)
+    ML._clean_data()
+    ML._data2seq()
+    return ML.sequences
+
+
+def test_matches_tsfresh_minimal_parameters(recording):
+    tsfresh = pytest.importorskip('tsfresh')
+    from tsfresh.feature_extraction import MinimalFCParameters
+    sequences = _sequences(recording)
+    expected = tsfresh.extract_features(windows_to_long(sequences), column_id='id', column_sort='time',
+                                        default_fc_parameters=MinimalFCParameters(), disable_progressbar=True)
+    names = feature_names(COLUMNS)
+    # tsfresh releases after the pinned 0.11.2 add calculators to MinimalFCParameters and
+    # stop sorting the columns, so compare by name
+    assert set(names) <= set(expected.columns)
+    np.testing.assert_allclose(extract_minimal_features(sequences, COLUMNS), expected[names].values, rtol=1e-9)
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import history
+from bench import MemoryStore
+from history import History
+
+
+class CountingStore(MemoryStore):
+    def __init__(self):
+        MemoryStore.__init__(self)
+        self.summaries = 0
+        self.data_reads = 0
+
+    def dynamoSummaries(self, userName):
+        self.summaries += 1
+        return MemoryStore.dynamoSummaries(self, userName)
+
+    def dynamoGetData(self, userName, time):
+        self.data_reads += 1
+        return MemoryStore.dynamoGetData(self, userName, time)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(history.time, 'time', lambda: now[0])
+    return now
+
+
+def test_summaries_are_cached_for_ttl_seconds(clock):
+    store = CountingStore()
+    store.dynamoAdd('u', '2020-01-01T00:00:00Z', b'', '10', 1)
+    hist = History(store, ttl=60)
+    assert hist.summary('u')['num'] == 1
+    # stored by another worker: not seen until the entry expires
+    store.dynamoAdd('u', '2020-01-02T00:00:00Z', b'', '90', 5)
+    clock[0] += 59
+    assert hist.summary('u')['num'] == 1 and store.summaries == 1
+    clock[0] += 2
+    assert hist.summary('u')['num'] == 2 and store.summaries == 2
+
+
+def test_add_updates_the_cached_summary(clock):
+    store = CountingStore()
+    hist = History(store)
+    store.dynamoAdd('u', '2020-01-02T00:00:00Z', b'', '30', 2)
+    hist.summary('u')
+    hist.add('u', '2020-01-03T00:00:00Z', b'', '90', 5)
+    hist.add('u', '2020-01-01T00:00:00Z', b'', '10', 1)
+    # same time as a stored test: replaced
+    hist.add('u', '2020-01-02T00:00:00Z', b'', '70', 4)
+    summary = hist.summary('u')
+    assert store.summaries == 1
+    assert [(d['time'], d['result']) for d in summary['data']] == \
+           [('2020-01-01T00:00:00Z', '10'), ('2020-01-02T00:00:00Z', '70'), ('2020-01-03T00:00:00Z', '90')]
+    assert summary['pie'] == [1, 0, 0, 1, 1]
+    assert summary['earliest'] == '2020-01-01T00:00:00Z' and summary['latest'] == '2020-01-03T00:00:00Z'
+    # the cache matches what a reload reads
+    hist.invalidate('u')
+    assert hist.summary('u') == summary
+
+
+def test_legacy_items_are_converted_and_decoded_once(clock):
+    store = CountingStore()
+    # legacy: '%a, %d %b %Y %X GMT' keys, class only in the JSON data blob
+    store.dynamoAdd('u', 'Wed, 02 Jan 2019 10:00:00 GMT', json.dumps({'vote0': [80, 4, 'positive']}), '80')
+    store.dynamoAdd('u', 'Tue, 01 Jan 2019 09:30:00 GMT', json.dumps({'vote0': [20, 1, 'very negative']}), '20')
+    store.dynamoAdd('u', '2019-01-01T12:00:00Z', b'', '50', 3)
+    hist = History(store, ttl=0)
+    for _ in range(3):
+        clock[0] += 1
+        summary = hist.summary('u')
+    assert store.summaries == 3 and store.data_reads == 2
+    assert [d['time'] for d in summary['data']] == ['2019-01-01T09:30:00Z', '2019-01-01T12:00:00Z',
+                                                   '2019-01-02T10:00:00Z']
+    assert summary['pie'] == [1, 0, 1, 1, 0]
+
+
+def test_time_keys():
+    assert history.to_iso('Tue, 01 Jan 2019 09:30:00 GMT') == '2019-01-01T09:30:00Z'
+    assert history.to_iso('2019-01-01T09:30:00Z') == '2019-01-01T09:30:00Z'
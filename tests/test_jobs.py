@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from bench import FakeHeadset
+
+
+def _wait(client, job_url, timeout=10):
+    deadline = time.time() + timeout
+    while True:
+        response = client.get(job_url)
+        if response.status_code != 202 or time.time() > deadline:
+            return response
+        time.sleep(0.01)
+
+
+def test_partial_votes_are_served_while_the_job_runs(login, monkeypatch):
+    from app import routes
+    client = login('partial')
+    reported, release = threading.Event(), threading.Event()
+    vote = {'index': 0, 'size': 8, 'vote': [40, 2, 'negative']}
+
+    def capture(username):
+        routes.jobs.report(partial=[vote])
+        reported.set()
+        release.wait(10)
+        return {'vote0': [40, 2, 'negative']}
+
+    monkeypatch.setattr(routes, 'func1', capture)
+    job_url = '/collect/' + client.get('/collect').get_json()['job']
+    assert reported.wait(10)
+    response = client.get(job_url)
+    assert response.status_code == 202
+    assert response.get_json() == {'status': 'running', 'partial': [vote]}
+    release.set()
+    response = _wait(client, job_url)
+    assert response.status_code == 200 and response.get_json()['vote0'] == [40, 2, 'negative']
+
+
+@pytest.mark.parametrize('stand_in_registry', [100], indirect=True)
+def test_capture_publishes_every_sequence(login, stand_in_registry, monkeypatch):
+    import registry
+    from app import app, routes
+    monkeypatch.setattr(registry, '_registry', stand_in_registry)
+    headset = FakeHeadset()
+    monkeypatch.setitem(app.config, 'MINDWAVE_PORT', headset.port)
+    try:
+        client = login('capture')
+        job_id = client.get('/collect').get_json()['job']
+        response = _wait(client, '/collect/' + job_id)
+    finally:
+        headset.close()
+    assert response.status_code == 200
+    result = response.get_json()
+    job = routes.jobs.get(job_id)
+    assert [p['index'] for p in job['partial']] == list(range(5))
+    assert [p['vote'] for p in job['partial']] == [result['vote{}'.format(i)] for i in range(1, 6)]
+    assert routes.get_history().summary('capture')
+
+
+def test_collect_returns_a_job_id_to_poll(login, monkeypatch):
+    from app import routes
+    client = login('poll')
+    release = threading.Event()
+
+    def capture(username):
+        release.wait(10)
+        return {'vote0': [60, 3, 'positive']}
+
+    monkeypatch.setattr(routes, 'func1', capture)
+    response = client.get('/collect')
+    assert response.status_code == 202
+    job_id = response.get_json()['job']
+    response = client.get('/collect/' + job_id)
+    assert response.status_code == 202 and response.get_json()['status'] in ('queued', 'running')
+    # jobs are private to their owner
+    assert login('someone else').get('/collect/' + job_id).status_code == 404
+    release.set()
+    response = _wait(client, '/collect/' + job_id)
+    assert response.status_code == 200
+    assert response.get_json() == {'vote0': [60, 3, 'positive'], 'name': 'poll'}
+
+
+def test_collect_rejects_jobs_when_the_queue_is_full(login, monkeypatch):
+    from app import routes
+    client = login('full')
+    release = threading.Event()
+    monkeypatch.setattr(routes, 'func1', lambda username: release.wait(10) and {'vote0': [1, 1, 'neutral']})
+    monkeypatch.setattr(routes.jobs, 'max_pending', 1)
+    try:
+        job_url = '/collect/' + client.get('/collect').get_json()['job']
+        assert client.get('/collect').status_code == 503
+    finally:
+        release.set()
+    assert _wait(client, job_url).status_code == 200
+
+
+def test_a_failed_capture_is_reported(login, monkeypatch):
+    from app import routes
+    client = login('failed')
+    monkeypatch.setattr(routes, 'func1', lambda username: {})   # e.g. the headset timed out
+    response = _wait(client, '/collect/' + client.get('/collect').get_json()['job'])
+    assert response.status_code == 500 and response.get_json() == {'status': 'failed'}
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counters_are_rendered_per_label_set(fresh_metrics):
+    metrics.inc('jobs', status='done')
+    metrics.inc('jobs', 2, status='done')
+    metrics.inc('jobs', status='say "no"')
+    assert metrics.render().splitlines() == [
+        '# TYPE jobs_total counter',
+        'jobs_total{status="done"} 3.0',
+        'jobs_total{status="say \\"no\\""} 1.0',
+    ]
+
+
+def test_histograms_are_cumulative(fresh_metrics):
+    metrics.observe('collect', 0.003)
+    metrics.observe('collect', 0.003)
+    metrics.observe('collect', 0.2)
+    metrics.observe('collect', 100.0)      # above every bucket: only in +Inf
+    lines = metrics.render().splitlines()
+    assert lines[0] == '# TYPE collect_seconds histogram'
+    buckets = dict(line.rsplit(' ', 1) for line in lines if '_bucket' in line)
+    assert len(buckets) == len(metrics.BUCKETS) + 1
+    assert buckets['collect_seconds_bucket{le="0.0025"}'] == '0'
+    assert buckets['collect_seconds_bucket{le="0.005"}'] == '2'
+    assert buckets['collect_seconds_bucket{le="0.25"}'] == '3'
+    assert buckets['collect_seconds_bucket{le="60.0"}'] == '3'
+    assert buckets['collect_seconds_bucket{le="+Inf"}'] == '4'
+    assert 'collect_seconds_sum 100.206' in lines
+    assert 'collect_seconds_count 4' in lines
+
+
+def test_timer_counts_errors(fresh_metrics):
+    @metrics.timer('step', stage='one')
+    def fails():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        fails()
+    rendered = metrics.render()
+    assert 'step_errors_total{stage="one"} 1.0' in rendered
+    assert 'step_seconds_count{stage="one"} 1' in rendered
+
+
+def test_profiler_samples_other_threads():
+    stop = threading.Event()
+
+    def busy_wait():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    worker = threading.Thread(target=busy_wait)
+    worker.start()
+    profiler = metrics.SamplingProfiler(interval=0.001, max_depth=8).start()
+    try:
+        time.sleep(0.2)
+    finally:
+        profiler.stop()
+        stop.set()
+        worker.join()
+    lines = profiler.collapsed().splitlines()
+    stacks = [line.rsplit(' ', 1)[0].split(';') for line in lines]
+    assert any(stack[-1] == 'test_metrics.py:busy_wait' for stack in stacks)
+    assert max(len(stack) for stack in stacks) <= 8
+    counts = [int(line.rsplit(' ', 1)[1]) for line in lines]
+    assert counts == sorted(counts, reverse=True)
+
+
+def test_profile_is_for_signed_in_users(login, monkeypatch):
+    from app import app
+    profiler = metrics.SamplingProfiler()
+    profiler.samples['app.py:main;routes.py:collect'] = 3
+    monkeypatch.setattr(metrics, '_profiler', profiler)
+    assert app.test_client().get('/metrics/profile').status_code == 302
+    response = login('profile').get('/metrics/profile')
+    assert response.status_code == 200 and response.data == b'app.py:main;routes.py:collect 3\n'
@@ -0,0 +1,73 @@
+import json
+import socket
+import warnings
+
+import pytest
+
+import Mindwave
+from Mindwave import ThinkGearReader
+
+READING = {'eSense': {'attention': 50, 'meditation': 60},
+           'eegPower': {'delta': 1, 'theta': 2, 'lowAlpha': 3, 'highAlpha': 4, 'lowBeta': 5,
+                        'highBeta': 6, 'lowGamma': 7, 'highGamma': 8}}
+
+
+@pytest.fixture
+def pair():
+    ours, theirs = socket.socketpair()
+    yield ours, theirs
+    ours.close()
+    theirs.close()
+
+
+def test_frames_split_across_recv_calls():
+    reader = ThinkGearReader(sock=None)
+    frame = json.dumps(READING).encode('utf-8')
+    # a frame cut in the middle of its JSON, the terminator, and an empty '\r\n' frame
+    assert reader.feed(frame[:10]) == []
+    assert reader.feed(frame[10:]) == []
+    assert reader.feed(b'\r') == [READING]
+    assert reader.feed(b'\n{"poorSignalLevel": 200}\r\n{"blink') == [{'poorSignalLevel': 200}]
+    assert reader.feed(b'Strength": 55}\r') == [{'blinkStrength': 55}]
+    assert reader.stats() == {'frames': 3, 'malformed': 0, 'dropped': 0, 'timeouts': 0}
+
+
+def test_bad_frames_are_counted_and_skipped(monkeypatch):
+    monkeypatch.setattr(Mindwave, 'MAX_FRAME', 100)
+    reader = ThinkGearReader(sock=None)
+    assert reader.feed(b'{"broken": \r{"ok": 1}\r') == [{'ok': 1}]
+    # no terminator within MAX_FRAME bytes: the buffer is dropped, the next frame is read again
+    assert reader.feed(b'x' * 101) == []
+    assert reader.feed(b'\r{"ok": 2}\r') == [{'ok': 2}]
+    assert reader.stats() == {'frames': 2, 'malformed': 1, 'dropped': 1, 'timeouts': 0}
+
+
+def test_read_from_a_socket(pair):
+    ours, theirs = pair
+    reader = ThinkGearReader(ours, bufsize=8)     # smaller than a frame: several recv calls
+    assert reader.read(0.01) == [] and reader.timeouts == 1
+    theirs.sendall(b'{"ok": 1}\r{"ok": 2}\r')
+    messages = []
+    while len(messages) < 2:
+        messages += reader.read(1)
+    assert messages == [{'ok': 1}, {'ok': 2}]
+    theirs.close()
+    with pytest.raises(ConnectionError):
+        reader.read(1)
+
+
+def test_authenticate_closes_its_socket():
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        headset = Mindwave.Mindwave(appname='tests', host='127.0.0.1', port=server.getsockname()[1])
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', ResourceWarning)
+            headset.authenticate()
+        assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
+        conn, _ = server.accept()
+        with conn:
+            conn.settimeout(5)
+            request = json.loads(conn.recv(1024).decode('utf-8'))
+            assert request['appName'] == 'tests' and len(request['appKey']) == 40
+            assert conn.recv(1024) == b''    # closed by the headset side
@@ -0,0 +1,140 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+from multiprocessing import AuthenticationError
+
+from conftest import StandInRegistry
+from model_server import ModelServer, RemoteRegistry
+
+KEY = b'test-key'
+N_FEATURES = 4
+
+
+def _server(path, registry, **kwargs):
+    return ModelServer(str(path), registry=registry, authkey=KEY, n_features=N_FEATURES, **kwargs)
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    directory = tmp_path / 'run'
+    directory.mkdir(mode=0o700)
+    return directory / 'models.sock'
+
+
+def test_refuses_to_start_without_a_key(socket_path, stand_in_registry, monkeypatch):
+    monkeypatch.delenv('MODEL_SERVER_KEY', raising=False)
+    with pytest.raises(ValueError):
+        ModelServer(str(socket_path), registry=stand_in_registry, n_features=N_FEATURES)
+    with pytest.raises(ValueError):
+        RemoteRegistry(str(socket_path))
+
+
+def test_refuses_a_shared_directory(tmp_path, stand_in_registry):
+    directory = tmp_path / 'shared'
+    directory.mkdir()
+    os.chmod(str(directory), 0o777)
+    with pytest.raises(PermissionError):
+        _server(directory / 'models.sock', stand_in_registry).start()
+
+
+def test_does_not_remove_other_files(socket_path, stand_in_registry):
+    socket_path.write_text('not a socket')
+    with pytest.raises(FileExistsError):
+        _server(socket_path, stand_in_registry).serve_forever()
+    assert socket_path.read_text() == 'not a socket'
+
+
+def test_replaces_a_stale_socket_and_rejects_wrong_keys(socket_path, stand_in_registry):
+    server = _server(socket_path, stand_in_registry).start()
+    server.close()
+    server = _server(socket_path, stand_in_registry).start()
+    try:
+        group, = RemoteRegistry(str(socket_path), KEY).voting_classifier().predict_groups([np.full((2, N_FEATURES), 0.7)])
+        assert group[1] == [0.7, 0.7]
+        with pytest.raises(AuthenticationError):
+            RemoteRegistry(str(socket_path), b'wrong').voting_classifier().predict(np.zeros((1, N_FEATURES)))
+    finally:
+        server.close()
+
+
+def test_a_bad_request_fails_alone(socket_path, stand_in_registry):
+    server = _server(socket_path, stand_in_registry, max_delay=0.2).start()
+    remote = RemoteRegistry(str(socket_path), KEY).voting_classifier()
+    results = {}
+
+    def call(name, X):
+        try:
+            results[name] = remote.predict(X)[1]
+        except RuntimeError as e:
+            results[name] = e
+
+    try:
+        threads = [threading.Thread(target=call, args=('good', np.full((3, N_FEATURES), 0.2))),
+                   threading.Thread(target=call, args=('wrong_shape', np.zeros((3, N_FEATURES + 1)))),
+                   threading.Thread(target=call, args=('not_finite', np.full((1, N_FEATURES), np.nan))),
+                   threading.Thread(target=call, args=('model_error', np.full((1, N_FEATURES), -1.0)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        server.close()
+    assert results['good'] == [0.2, 0.2, 0.2]
+    assert isinstance(results['wrong_shape'], RuntimeError) and 'shape' in str(results['wrong_shape'])
+    assert isinstance(results['not_finite'], RuntimeError)
+    assert isinstance(results['model_error'], RuntimeError) and 'negative' in str(results['model_error'])
+
+
+class Stalled(object):
+    """VotingClassifier stand-in that hangs until released. """
+    def __init__(self):
+        self.release = threading.Event()
+
+    def predict_groups(self, Xs):
+        self.release.wait()
+        return [(np.zeros(len(X), dtype=int), [0.5] * len(X)) for X in Xs]
+
+
+def test_server_answers_a_stalled_batch_with_a_timeout(socket_path):
+    stalled = Stalled()
+    server = _server(socket_path, StandInRegistry(stalled), timeout=0.2).start()
+    remote = RemoteRegistry(str(socket_path), KEY).voting_classifier()
+    try:
+        with pytest.raises(TimeoutError, match='no answer from the ensemble'):
+            remote.predict(np.zeros((1, N_FEATURES)))
+        # the connection is still in step: the next request gets its own answer
+        stalled.release.set()
+        assert remote.predict(np.zeros((2, N_FEATURES)))[1] == [0.5, 0.5]
+    finally:
+        stalled.release.set()
+        server.close()
+
+
+def test_client_gives_up_on_a_server_that_does_not_answer(socket_path):
+    stalled = Stalled()
+    server = _server(socket_path, StandInRegistry(stalled), timeout=30).start()
+    remote = RemoteRegistry(str(socket_path), KEY, timeout=0.2).voting_classifier()
+    try:
+        with pytest.raises(TimeoutError, match='did not answer'):
+            remote.predict(np.zeros((1, N_FEATURES)))
+        stalled.release.set()
+        # the late answer went to the dropped connection, not to this call
+        assert remote.predict(np.zeros((3, N_FEATURES)))[1] == [0.5, 0.5, 0.5]
+    finally:
+        stalled.release.set()
+        server.close()
+
+
+def test_requests_time_out_once_the_batcher_is_gone(socket_path, stand_in_registry):
+    server = _server(socket_path, stand_in_registry, timeout=0.2).start()
+    remote = RemoteRegistry(str(socket_path), KEY).voting_classifier()
+    assert remote.predict(np.full((1, N_FEATURES), 0.3))[1] == [0.3]
+    # stop the batcher only, the listener keeps accepting
+    server._requests.put(None)
+    try:
+        with pytest.raises(TimeoutError):
+            remote.predict(np.zeros((1, N_FEATURES)))
+    finally:
+        server.close()
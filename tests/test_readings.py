@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from EmotionML import EmotionML
+from readings import ReadingBuffer, RAW_COLUMNS
+import rescore
+from session_codec import encode_session
+
+
+def test_empty_buffer_has_no_values():
+    values = ReadingBuffer(4).values()
+    assert values.shape == (0, len(RAW_COLUMNS)) and values.dtype == np.dtype('<i4')
+
+
+def test_empty_capture_has_no_complete_sequence():
+    session = encode_session({'feat_time': [], **{c: [] for c in RAW_COLUMNS}})
+    rows = rescore.score_chunk([('user', 't', ('session', session), -1)])
+    assert rows['error'] == ['no complete sequence'] and rows['windows'] == [0]
+
+
+@pytest.mark.parametrize('stand_in_registry', [100], indirect=True)
+def test_buffer_and_json_paths_give_the_same_result(recording, stand_in_registry):
+    from_json = EmotionML(stand_in_registry, feature_cache=False)
+    from_json.load_data(recording)
+    from_json.preprocess()
+    from_buffer = EmotionML(stand_in_registry, feature_cache=False)
+    from_buffer.load_buffer(ReadingBuffer.from_json(recording))
+    from_buffer.preprocess()
+    assert from_buffer.predict() == from_json.predict()
+
+
+@pytest.mark.parametrize('stand_in_registry', [100], indirect=True)
+def test_batch_scores_around_an_empty_recording(recording, stand_in_registry):
+    empty = ReadingBuffer(4)
+    results = EmotionML.predict_batch([empty, recording], stand_in_registry, feature_cache=False)
+    assert results[0]['error'] == 'no complete sequence' and results[0]['vote0'][1] == -1
+    assert np.isnan(results[0]['vote0'][0])
+    single = EmotionML(stand_in_registry, feature_cache=False)
+    single.load_data(recording)
+    single.preprocess()
+    assert results[1] == single.predict()
+
+    empty_ML = EmotionML(stand_in_registry, feature_cache=False)
+    empty_ML.load_buffer(empty)
+    empty_ML.preprocess()
+    with pytest.raises(ValueError, match='no complete sequence'):
+        empty_ML.predict()
+
+
+@pytest.mark.parametrize('stand_in_registry', [100], indirect=True)
+def test_chunk_rows_follow_the_batch(recording, stand_in_registry, monkeypatch, tmp_path):
+    import registry
+    monkeypatch.setattr(registry, '_registry', stand_in_registry)
+    broken = tmp_path / 'broken.npy'
+    np.save(str(broken), np.zeros((3, 4)))
+    session = encode_session({'feat_time': [], **{c: [] for c in RAW_COLUMNS}})
+    rows = rescore.score_chunk([('a', '1', ('session', session), 2),
+                                ('b', '2', ('npy', str(broken)), -1),
+                                ('c', '3', ('json', _write(tmp_path / 'c.json', recording)), 4)])
+    assert rows['user'] == ['a', 'b', 'c'] and rows['old_cls'] == [2, -1, 4]
+    assert rows['error'][0] == 'no complete sequence' and rows['error'][1].startswith('AssertionError')
+    assert rows['cls'][:2] == [-1, -1] and np.isnan(rows['percentage'][:2]).all()
+    assert rows['error'][2] == '' and rows['windows'][2] == 5
+    assert EmotionML.predict_batch([recording], stand_in_registry, feature_cache=False)[0]['vote0'][:2] == \
+           [rows['percentage'][2], rows['cls'][2]]
+
+
+def _write(path, text):
+    path.write_text(text)
+    return str(path)
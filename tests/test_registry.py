@@ -0,0 +1,100 @@
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pytest
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.naive_bayes import GaussianNB
+
+from registry import ModelRegistry, LockedEstimator
+
+
+class XGBClassifier(object):
+    """Stand-in with the class name of xgboost's classifier; records overlapping calls. """
+    classes_ = np.array([0, 1])
+
+    def __init__(self):
+        self.active = 0
+        self.overlaps = 0
+
+    def predict_proba(self, X):
+        self.active += 1
+        if self.active > 1:
+            self.overlaps += 1
+        time.sleep(0.001)
+        self.active -= 1
+        return np.tile([0.3, 0.7], (len(X), 1))
+
+    def __getstate__(self):
+        return {'active': 0, 'overlaps': 0}
+
+
+def _data(seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.rand(60, 4)
+    return X, (X[:, 0] > 0.5).astype(int)
+
+
+def _dump(model, path):
+    with open(str(path), 'wb') as f:
+        pickle.dump(model, f)
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    X, y = _data()
+    _dump(GaussianNB().fit(X, y), tmp_path / 'nb.pkl')
+    _dump(LinearDiscriminantAnalysis().fit(X, y), tmp_path / 'lda.pkl')
+    return tmp_path
+
+
+ENSEMBLE = [('nb', 'nb.pkl'), ('lda', 'lda.pkl')]
+
+
+def test_stats(model_dir):
+    registry = ModelRegistry(str(model_dir), ENSEMBLE)
+    registry.voting_classifier()
+    stats = registry.stats()
+    assert sorted(stats) == ['lda', 'nb']
+    for name, fname in ENSEMBLE:
+        path = str(model_dir / fname)
+        assert stats[name]['path'] == path
+        assert stats[name]['file_bytes'] == os.path.getsize(path)
+        assert stats[name]['load_time'] >= 0
+        # estimate from the fitted arrays, e.g. GaussianNB's theta_ and var_
+        assert stats[name]['memory_bytes'] > 0
+    nb = registry.estimator('nb')
+    assert stats['nb']['memory_bytes'] >= nb.theta_.nbytes + nb.var_.nbytes
+
+
+def test_loads_once_and_reloads_changed_models(model_dir):
+    registry = ModelRegistry(str(model_dir), ENSEMBLE)
+    first = registry.voting_classifier()
+    assert registry.voting_classifier() is first and not registry.is_stale()
+    X, _ = _data(1)
+    _dump(GaussianNB().fit(X, 1 - (X[:, 1] > 0.5).astype(int)), model_dir / 'nb.pkl')
+    mtime = os.stat(str(model_dir / 'nb.pkl')).st_mtime + 10
+    os.utime(str(model_dir / 'nb.pkl'), (mtime, mtime))
+    assert registry.is_stale()
+    second = registry.voting_classifier()
+    assert second is not first
+    np.testing.assert_array_equal(registry.estimator('nb').theta_, registry.estimators()[0][1].theta_)
+    assert not np.array_equal(second.named_estimators['nb'].theta_, first.named_estimators['nb'].theta_)
+
+
+def test_thread_unsafe_estimators_are_called_one_at_a_time(model_dir):
+    _dump(XGBClassifier(), model_dir / 'xgb.pkl')
+    registry = ModelRegistry(str(model_dir), [('xgb', 'xgb.pkl')] + ENSEMBLE)
+    shared = registry.estimator('xgb')
+    assert isinstance(shared, LockedEstimator)
+    assert type(registry.estimators()[0][1]).__name__ == 'XGBClassifier'
+    X, _ = _data()
+    threads = [threading.Thread(target=lambda: [registry.voting_classifier().predict(X) for _ in range(20)])
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert shared.estimator.overlaps == 0
@@ -0,0 +1,65 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import registry
+import rescore
+from conftest import make_recording
+
+
+def _npy(path, seed, length=40):
+    recording = json.loads(make_recording(length, seed))
+    array = np.column_stack([np.array(list(recording), dtype=float),
+                             np.array(list(recording.values()), dtype=float)])
+    np.save(str(path), array)
+    return str(path)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _until(sessions, count):
+    for i, session in enumerate(sessions):
+        if i == count:
+            raise Interrupted()
+        yield session
+
+
+def _raw_rows(out_dir):
+    """All rows of all chunks, including the ones read_results() leaves out. """
+    rows = []
+    for name in sorted(os.listdir(out_dir)):
+        with np.load(os.path.join(out_dir, name)) as part:
+            rows += list(zip(part['user'].tolist(), part['error'].tolist()))
+    return rows
+
+
+@pytest.mark.parametrize('stand_in_registry', [100], indirect=True)
+def test_an_interrupted_run_resumes_where_it_stopped(tmp_path, stand_in_registry, monkeypatch):
+    monkeypatch.setattr(registry, '_registry', stand_in_registry)
+    files = [_npy(tmp_path / 'rec{}.npy'.format(i), i) for i in range(6)]
+    # too short to be scored on the first run, complete on the second
+    files.append(_npy(tmp_path / 'short.npy', 9, length=4))
+    out_dir = str(tmp_path / 'out')
+    sessions = list(rescore.file_sessions(files))
+
+    with pytest.raises(Interrupted):
+        rescore.rescore(_until(sessions[-1:] + sessions[:-1], 5), out_dir, workers=1, batch_size=1,
+                        chunk_size=1, progress=0)
+    first = _raw_rows(out_dir)
+    assert (files[-1], 'no complete sequence') in first
+
+    _npy(tmp_path / 'short.npy', 9)
+    counts = rescore.rescore(iter(sessions), out_dir, workers=1, batch_size=2, progress=0)
+    written = [user for user, error in first if not error]
+    assert counts == {'scored': 7 - len(written), 'failed': 0, 'skipped': len(written)}
+
+    rows = _raw_rows(out_dir)
+    scored = [user for user, error in rows if not error]
+    assert sorted(scored) == sorted(files), 'ERROR: a session was scored twice or skipped'
+    results = rescore.read_results(out_dir)
+    assert sorted(results['user'].tolist()) == sorted(files) and (results['error'] == '').all()
+    assert (results['windows'] == 5).all()
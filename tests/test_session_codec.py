@@ -0,0 +1,56 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+from boto3.dynamodb.types import Binary
+
+from session_codec import encode_session, decode_session, MAGIC, SERIES
+
+
+def _session(n=40):
+    rng = np.random.RandomState(3)
+    res = {'vote{}'.format(i): [50 + i, 3, 'neutral'] for i in range(6)}
+    res['feat_time'] = [repr(1.6e9 + i * 1.013 + rng.rand()) for i in range(n)]
+    for name in SERIES:
+        res[name] = rng.randint(1, 2**24, size=n).tolist()
+    # extremes of int32 survive the (modulo 2**32) delta encoding
+    res['delta'][:2] = [2**31 - 1, -2**31]
+    return res
+
+
+@pytest.mark.parametrize('delta', [True, False])
+@pytest.mark.parametrize('compress', [True, False])
+def test_round_trip(delta, compress):
+    res = _session()
+    blob = encode_session(res, delta=delta, compress=compress)
+    assert blob.startswith(MAGIC)
+    assert decode_session(blob) == res
+    assert decode_session(Binary(blob)) == res
+
+
+def test_empty_session_round_trips():
+    res = {'vote0': [0, 1, 'very negative'], 'feat_time': [], **{name: [] for name in SERIES}}
+    assert decode_session(encode_session(res)) == res
+
+
+def test_compressed_encoding_is_smaller_than_json():
+    res = _session(400)
+    assert len(encode_session(res)) < len(json.dumps(res)) / 2
+
+
+def test_legacy_json_items_decode():
+    res = {'vote0': [60, 4, 'positive'], 'feat_time': ['1600000000.0'], 'attention': ['40']}
+    assert decode_session(json.dumps(res)) == res
+    assert decode_session(json.dumps(res).encode('utf-8')) == res
+
+
+def test_bad_headers_are_rejected():
+    blob = encode_session(_session())
+    with pytest.raises(ValueError):
+        decode_session(b'EEG9' + blob[4:])
+    bad_flags = blob[:4] + struct.pack('<B', 0x80 | blob[4]) + blob[5:]
+    with pytest.raises(ValueError, match='flags'):
+        decode_session(bad_flags)
+    with pytest.raises(ValueError):
+        decode_session(encode_session(_session(), compress=False)[:-10])
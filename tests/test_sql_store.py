@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(flask_app):
+    from app.sql_store import SqlStore
+    return SqlStore()
+
+
+def test_sessions_round_trip(store):
+    store.dynamoAdd('sql', '2020-01-01T00:00:02Z', b'\x00second', '70', 4)
+    store.dynamoAddBatch([store.makeItem('sql', '2020-01-01T00:00:01Z', '{"legacy": "json"}', '20'),
+                          store.makeItem('other', '2020-01-01T00:00:01Z', b'other', '50', 3)])
+    assert [(item['time'], item['result'], item.get('cls')) for item in store.dynamoQuery('sql')] == \
+           [('2020-01-01T00:00:01Z', '20', None), ('2020-01-01T00:00:02Z', '70', 4)]
+    assert store.dynamoSummaries('sql') == [{'time': '2020-01-01T00:00:01Z', 'result': '20', 'cls': None},
+                                            {'time': '2020-01-01T00:00:02Z', 'result': '70', 'cls': 4}]
+    assert store.dynamoGetData('sql', '2020-01-01T00:00:02Z') == b'\x00second'
+    assert store.dynamoGetData('sql', '2020-01-01T00:00:01Z') == b'{"legacy": "json"}'
+
+    # same user and time: replaced, not added
+    store.dynamoAdd('sql', '2020-01-01T00:00:02Z', b'again', '90', 5)
+    assert [item['result'] for item in store.dynamoQuery('sql')] == ['20', '90']
+    scanned = {(item['userName'], item['time']): item['result'] for item in store.dynamoScan()}
+    assert scanned[('sql', '2020-01-01T00:00:02Z')] == '90' and scanned[('other', '2020-01-01T00:00:01Z')] == '50'
+
+
+def test_jobs_round_trip(flask_app):
+    from app.sql_store import SqlJobStore
+    jobs = SqlJobStore()
+    job = {'id': 'sqljob', 'owner': 'sql', 'status': 'queued', 'result': None, 'partial': None,
+           'submitted': time.time(), 'finished': None}
+    assert jobs.add_if_room(job, max_pending=100)
+    jobs.update('sqljob', status='running', partial=[{'index': 0, 'size': 8, 'vote': [40, 2, 'negative']}])
+    assert jobs.get('sqljob')['partial'] == [{'index': 0, 'size': 8, 'vote': [40, 2, 'negative']}]
+    jobs.update('sqljob', status='done', result={'vote0': [40, 2, 'negative']}, finished=time.time())
+    stored = jobs.get('sqljob')
+    assert stored['status'] == 'done' and stored['result'] == {'vote0': [40, 2, 'negative']}
+    jobs.expire(ttl=0)
+    assert jobs.get('sqljob') is None and jobs.get('unknown') is None
+
+
+def _submit(worker, count, max_pending, start):
+    from app import db
+    from app.sql_store import SqlJobStore
+    db.engine.dispose()     # connections of the parent process are not shared
+    jobs = SqlJobStore()
+    start.wait()
+    for i in range(count):
+        jobs.add_if_room({'id': 'race{}-{}'.format(worker, i), 'owner': 'race', 'status': 'queued',
+                          'result': None, 'partial': None, 'submitted': time.time(), 'finished': None},
+                         max_pending)
+
+
+def test_processes_never_exceed_max_pending(flask_app):
+    from app import db
+    from app.sql_store import CollectJob
+    context = multiprocessing.get_context('fork')
+    start = context.Event()
+    workers = [context.Process(target=_submit, args=(w, 10, 7, start)) for w in range(4)]
+    for p in workers:
+        p.start()
+    start.set()
+    for p in workers:
+        p.join(30)
+        assert p.exitcode == 0
+    with flask_app.app_context():
+        assert CollectJob.query.filter_by(owner='race').count() == 7
+        CollectJob.query.filter_by(owner='race').delete()
+        db.session.commit()
+
+
+def test_migrations_create_the_store_tables(tmp_path):
+    db_path = tmp_path / 'migrated.db'
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + str(db_path), FLASK_APP='server.py')
+    subprocess.run([sys.executable, '-m', 'flask', 'db', 'upgrade'], cwd=ROOT, env=env,
+                   check=True, capture_output=True)
+    with sqlite3.connect(str(db_path)) as conn:
+        names = {name for name, in conn.execute("select name from sqlite_master")}
+        columns = {name for _, name, *_ in conn.execute('pragma table_info(collect_job)')}
+    assert {'user', 'post', 'emotion_session', 'collect_job', 'ix_emotion_session_user_time'} <= names
+    assert 'partial' in columns
@@ -0,0 +1,48 @@
+import json
+
+import numpy as np
+import pytest
+
+from bench import FakeHeadset
+from EmotionML import EmotionML
+from Mindwave import Mindwave
+
+
+@pytest.fixture
+def headset():
+    headset = FakeHeadset(interval=0.01)
+    yield headset
+    headset.close()
+
+
+@pytest.mark.parametrize('stand_in_registry', [100], indirect=True)
+def test_votes_are_published_as_sequences_complete(headset, stand_in_registry):
+    consumed = []
+
+    def counted(readings):
+        for reading in readings:
+            consumed.append(reading)
+            yield reading
+
+    ML = EmotionML(stand_in_registry, feature_cache=False)
+    sensor = Mindwave(port=headset.port)
+    events = []
+    for event in ML.stream_predict(counted(sensor.stream_data(40))):
+        events.append((len(consumed), event))
+    assert not sensor.timed_out
+
+    windows = [event for _, event in events if event['type'] == 'window']
+    assert [event['index'] for event in windows] == list(range(5))
+    # each vote comes out with the reading that completes its sequence, not at the end
+    assert [n for n, event in events if event['type'] == 'window'] == [8, 16, 24, 32, 40]
+    n, last = events[-1]
+    assert n == 40 and last['type'] == 'result'
+
+    # same votes as scoring the whole capture at once
+    batch = EmotionML(stand_in_registry, feature_cache=False)
+    batch.load_data(json.dumps(dict(consumed)))
+    batch.preprocess()
+    result = batch.predict()
+    assert [event['vote'] for event in windows] == [result['vote{}'.format(i)] for i in range(1, 6)]
+    assert last['result']['vote0'] == result['vote0']
+    np.testing.assert_allclose(ML.MLInput, batch.MLInput)
@@ -0,0 +1,137 @@
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from voting import VotingClassifier
+
+
+def _baseline_predict(clf, X):
+    """VotingClassifier.predict before the single-pass rewrite: predict + bincount for hard
+    voting, _collect_probas for the probabilities, averaged per sample. """
+    probas = np.transpose(np.asarray([e.predict_proba(X) for e in clf.estimators]), (1, 0, 2))
+    if clf.voting == 'soft':
+        maj = np.argmax(np.average(probas, axis=1, weights=clf.weights), axis=1)
+    else:
+        predictions = np.asarray([e.predict(X) for e in clf.estimators]).T
+        maj = np.apply_along_axis(lambda x: np.argmax(np.bincount(x, weights=clf.weights)),
+                                  axis=1, arr=predictions.astype('int'))
+    all_probs = probas[:, :, 1]
+    prob = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)   # mean of an empty slice: nan
+        for i in range(len(maj)):
+            prob_i = all_probs[i]
+            prob.append(np.average(prob_i[prob_i < 0.5]) if maj[i] == 0 else np.average(prob_i[prob_i > 0.5]))
+    return maj, prob
+
+
+class Fixed(object):
+    """Estimator stand-in predicting the same class-1 probability for every sample. """
+    classes_ = np.array([0, 1])
+
+    def __init__(self, p):
+        self.p = p
+
+    def predict_proba(self, X):
+        return np.tile([1 - self.p, self.p], (len(X), 1))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(200, 6))
+    y = (X[:, 0] + 0.5 * X[:, 1] + rng.normal(scale=0.8, size=200) > 0).astype(int)
+    estimators = [('lr', LogisticRegression()), ('tree', DecisionTreeClassifier(max_depth=3, random_state=0)),
+                  ('nb', GaussianNB()), ('knn', KNeighborsClassifier(7)),
+                  ('rf', RandomForestClassifier(n_estimators=10, random_state=0))]
+    for _, estimator in estimators:
+        estimator.fit(X, y)
+    return estimators, rng.normal(size=(50, 6))
+
+
+@pytest.mark.parametrize('voting', ['hard', 'soft'])
+@pytest.mark.parametrize('weights', [None, [1, 2, 1, 0.5, 3]])
+def test_same_votes_as_before(fitted, voting, weights):
+    estimators, X = fitted
+    clf = VotingClassifier(estimators, voting=voting, weights=weights)
+    maj, prob = clf.predict(X)
+    expected_maj, expected_prob = _baseline_predict(clf, X)
+    np.testing.assert_array_equal(maj, expected_maj)
+    np.testing.assert_allclose(prob, expected_prob, rtol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize('voting, ps', [('hard', [0.5, 0.5, 0.7]), ('soft', [0.5, 0.5, 0.5])])
+def test_no_estimator_agrees_with_the_majority(voting, ps):
+    # probabilities of exactly 0.5 vote for class 0 without being below 0.5
+    clf = VotingClassifier([(str(i), Fixed(p)) for i, p in enumerate(ps)], voting=voting, weights=[2, 2, 1])
+    X = np.zeros((3, 2))
+    maj, prob = clf.predict(X)
+    expected_maj, expected_prob = _baseline_predict(clf, X)
+    np.testing.assert_array_equal(maj, expected_maj)
+    assert (maj == 0).all() and np.isnan(prob).all() and np.isnan(expected_prob).all()
+
+
+class Blocking(Fixed):
+    """Fixed stand-in whose calls wait until it is released. """
+    def __init__(self, p):
+        Fixed.__init__(self, p)
+        self.release = threading.Event()
+        self.calls = 0
+
+    def predict_proba(self, X):
+        self.calls += 1
+        self.release.wait(10)
+        return Fixed.predict_proba(self, X)
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(4)
+    yield executor
+    executor.shutdown(wait=False)
+
+
+def test_a_slow_estimator_sits_out_until_it_returns(executor):
+    slow = Blocking(0.9)
+    fast = [('a', Fixed(0.2)), ('b', Fixed(0.3))]
+    clf = VotingClassifier(fast + [('slow', slow)], voting='soft', weights=[1, 1, 5], executor=executor, timeout=0.2)
+    X = np.zeros((2, 2))
+    expected = VotingClassifier(fast, voting='soft', weights=[1, 1]).predict(X)
+    try:
+        for _ in range(2):
+            maj, prob = clf.predict(X)
+            np.testing.assert_array_equal(maj, expected[0])
+            np.testing.assert_allclose(prob, expected[1])
+        # the first call is still running: not called again
+        assert slow.calls == 1
+    finally:
+        slow.release.set()
+    clf._stragglers[2].result(timeout=10)
+    maj, prob = clf.predict(X)
+    assert slow.calls == 2 and (maj == 1).all() and prob == pytest.approx([0.9, 0.9])
+
+
+def test_every_estimator_timing_out_raises(executor):
+    estimators = [('a', Blocking(0.2)), ('b', Blocking(0.8))]
+    clf = VotingClassifier(estimators, executor=executor, timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            clf.predict(np.zeros((1, 2)))
+        # both still running: nothing left to vote
+        with pytest.raises(TimeoutError):
+            clf.predict(np.zeros((1, 2)))
+        assert [e.calls for _, e in estimators] == [1, 1]
+    finally:
+        for _, e in estimators:
+            e.release.set()
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import gc
+import sys
+
+import metrics
+import warmup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _imported_by_app(tmp_path):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + str(tmp_path / 'app.db'))
+    env.pop('PRELOAD_MODELS', None)
+    code = ('import sys, app; print(" ".join(m for m in ("numpy", "pandas", "boto3", "EmotionML", '
+            '"Mindwave", "Dynamo", "registry") if m in sys.modules))')
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return out.stdout.split()
+
+
+def test_app_starts_without_the_pipeline(tmp_path):
+    assert _imported_by_app(tmp_path) == []
+
+
+def test_import_times_are_recorded():
+    metrics.reset()
+    times = warmup.import_times(['numpy', 'EmotionML', 'no_such_module'])
+    assert times['numpy'] is not None and times['EmotionML'] is not None
+    assert times['no_such_module'] is None
+    text = metrics.render()
+    assert 'import_seconds_count{module="EmotionML"} 1' in text
+    assert 'module="no_such_module"' not in text
+
+
+def test_warmup_without_models():
+    try:
+        times = warmup.warmup(models=False)
+    finally:
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+    assert list(times) == warmup.MODULES
+    assert all(name in sys.modules for name in warmup.MODULES)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from EmotionML import EmotionML, make_windows, window_ends, windows_to_long, COLUMNS, NEW_COLUMNS
+
+
+def _loop_windows(values, seq_size):
+    """The row loop make_windows replaced: non-overlapping windows, leading remainder skipped. """
+    skip = values.shape[0] % seq_size
+    return np.asarray([values[skip+i*seq_size:skip+(i+1)*seq_size] for i in range(values.shape[0] // seq_size)])
+
+
+def _loop_long(windows):
+    """The per-window DataFrame loop windows_to_long replaced. """
+    frames = []
+    for i in range(windows.shape[0]):
+        df = pd.DataFrame(data=windows[i], columns=COLUMNS)
+        df = df.assign(id=[i]*windows.shape[1])
+        df = df.assign(time=df.index)
+        frames.append(df.reindex(columns=NEW_COLUMNS))
+    return pd.concat(frames).reset_index(drop=True).astype(float)
+
+
+@pytest.mark.parametrize('n', [40, 43, 8, 15])
+def test_windows_match_the_row_loop(n):
+    values = np.arange(n * 8, dtype=float).reshape(n, 8)
+    windows = make_windows(values, 8)
+    np.testing.assert_array_equal(windows, _loop_windows(values, 8))
+    assert not windows.flags.writeable
+
+
+def test_short_recordings_have_no_windows():
+    assert make_windows(np.ones((7, 8)), 8).shape == (0, 8, 8)
+
+
+def test_long_format_matches_the_dataframe_loop():
+    values = np.random.RandomState(0).rand(43, 8)
+    windows = make_windows(values, 8)
+    pd.testing.assert_frame_equal(windows_to_long(windows), _loop_long(windows))
+
+
+@pytest.mark.parametrize('n, seq_size, hop_size', [(40, 10, 3), (43, 10, 5), (10, 10, 4), (25, 8, 1)])
+def test_overlapping_windows_end_at_window_ends(n, seq_size, hop_size):
+    values = np.arange(n*2, dtype=float).reshape(n, 2)
+    windows = make_windows(values, seq_size, hop_size)
+    ends = window_ends(n, seq_size, hop_size)
+    assert len(windows) == len(ends)
+    assert ends[-1] == n, 'ERROR: the last window must end with the recording'
+    assert (np.diff(ends) == hop_size).all()
+    for window, end in zip(windows, ends):
+        np.testing.assert_array_equal(window, values[end-seq_size:end])
+
+
+def test_multi_resolution_windows_share_the_hop(recording):
+    ML = EmotionML(registry=object(), seq_sizes=(10, 20), hop_size=5, feature_cache=False)
+    ML.load_data(recording)
+    ML._clean_data()
+    ML._data2seq()
+    n = len(ML.cleaned)
+    assert [size for size, _ in ML.windows] == [10, 20]
+    np.testing.assert_array_equal(ML.window_ends, np.concatenate([window_ends(n, 10, 5), window_ends(n, 20, 5)]))
+
+
+def test_aggregate_weighs_recent_sequences_more():
+    probs, ends = [0.2, 0.8], [10, 20]
+    assert EmotionML(registry=object(), feature_cache=False).aggregate(probs, ends) == pytest.approx(0.5)
+    ML = EmotionML(registry=object(), recency_half_life=10, feature_cache=False)
+    # the older sequence is one half-life away from the end: weight 0.5
+    assert ML.aggregate(probs, ends) == pytest.approx((0.5*0.2 + 0.8) / 1.5)
+    assert ML.aggregate([0.2, 0.8, 0.5], [20, 20, 20]) == pytest.approx(0.5)
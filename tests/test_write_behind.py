@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+from write_behind import WriteBehind
+
+
+class Unavailable(object):
+    """Dynamo stand-in whose writes fail, reads are served by the real table. """
+    def __init__(self, dynamo):
+        self.dynamo = dynamo
+        self.makeItem = dynamo.makeItem
+        self.dynamoSummaries = dynamo.dynamoSummaries
+        self.dynamoQuery = dynamo.dynamoQuery
+        self.dynamoGetData = dynamo.dynamoGetData
+
+    def dynamoAddBatch(self, items):
+        raise ConnectionError('DynamoDB is down')
+
+
+def test_items_are_written_in_batches(dynamo, tmp_path):
+    store = WriteBehind(dynamo, str(tmp_path / 'journal.jsonl'), batch_size=5, flush_interval=0.05)
+    for i in range(12):
+        store.dynamoAdd('batched', '2020-01-01T00:00:{:02d}Z'.format(i), b'\x01\x02', str(i), 3)
+    assert store.flush(timeout=10)
+    store.close()
+    summaries = list(dynamo.dynamoSummaries('batched'))
+    assert [s['result'] for s in summaries] == [str(i) for i in range(12)]
+    assert bytes(dynamo.dynamoGetData('batched', '2020-01-01T00:00:03Z').value) == b'\x01\x02'
+
+
+def test_reads_do_not_wait_for_an_unavailable_table(dynamo, tmp_path):
+    journal = str(tmp_path / 'journal.jsonl')
+    dynamo.dynamoAdd('offline', '2020-01-01T00:00:00Z', b'old', '10', 1)
+    store = WriteBehind(Unavailable(dynamo), journal, flush_interval=0.05, max_retries=3, backoff=0.5)
+    store.dynamoAdd('offline', '2020-01-01T00:00:01Z', b'new', '90', 5)
+    start = time.perf_counter()
+    summaries = store.dynamoSummaries('offline')
+    assert time.perf_counter() - start < 1.0
+    assert [(s['time'], s['result']) for s in summaries] == [('2020-01-01T00:00:00Z', '10'),
+                                                             ('2020-01-01T00:00:01Z', '90')]
+    assert store.dynamoGetData('offline', '2020-01-01T00:00:01Z') == b'new'
+    store.close()
+
+    # journaled while the table was down, replayed by the next writer
+    store = WriteBehind(dynamo, journal, flush_interval=0.05)
+    assert store.flush(timeout=10)
+    store.close()
+    assert [s['result'] for s in dynamo.dynamoSummaries('offline')] == ['10', '90']
+
+
+class Recorder(object):
+    """Dynamo stand-in that keeps written batches, failing from its <fail_after>th batch on. """
+    def __init__(self, fail_after=None):
+        self.batches = []
+        self.fail_after = fail_after
+
+    def dynamoAddBatch(self, items):
+        if self.fail_after is not None and len(self.batches) >= self.fail_after:
+            raise ConnectionError('DynamoDB is down')
+        self.batches.append(list(items))
+
+    def written(self):
+        return [(item['userName'], item['time']) for batch in self.batches for item in batch]
+
+
+def _journal_only(journal, dynamo=None, batch_size=25):
+    """WriteBehind without a writer thread: journal and replay only. """
+    store = WriteBehind.__new__(WriteBehind)
+    store.dynamo = dynamo
+    store.journal_path = journal
+    store.batch_size = batch_size
+    store._queue = queue.Queue()
+    store._journal_lock = threading.Lock()
+    store._pending = {}
+    store._pending_lock = threading.Lock()
+    return store
+
+
+def _item(user, i):
+    return {'userName': user, 'time': str(i), 'data': b'x', 'result': '1'}
+
+
+def _append(journal, worker, count):
+    store = _journal_only(journal)
+    for i in range(count):
+        store._append_journal([_item('w{}'.format(worker), i)])
+
+
+def test_journal_is_shared_safely_by_processes(tmp_path):
+    journal = str(tmp_path / 'journal.jsonl')
+    context = multiprocessing.get_context('fork')
+    writers = [context.Process(target=_append, args=(journal, w, 200)) for w in range(4)]
+    for p in writers:
+        p.start()
+    dynamo = Recorder()
+    store = _journal_only(journal, dynamo)
+    while any(p.is_alive() for p in writers):
+        store._replay_journal()
+    for p in writers:
+        p.join()
+    store._replay_journal()
+    assert sorted((user, int(t)) for user, t in dynamo.written()) == \
+           [('w{}'.format(w), i) for w in range(4) for i in range(200)]
+
+
+def test_replay_keeps_what_was_not_written(tmp_path):
+    journal = str(tmp_path / 'journal.jsonl')
+    _journal_only(journal)._append_journal([_item('u', i) for i in range(5)])
+
+    failing = Recorder(fail_after=1)
+    store = _journal_only(journal, failing, batch_size=2)
+    store._replay_journal()
+    assert failing.written() == [('u', '0'), ('u', '1')]
+    # not written yet: still journaled, and still served to reads of this process
+    assert sorted(store._pending) == [('u', '2'), ('u', '3'), ('u', '4')]
+
+    dynamo = Recorder()
+    _journal_only(journal, dynamo, batch_size=2)._replay_journal()
+    assert dynamo.written() == [('u', '2'), ('u', '3'), ('u', '4')]
+    assert not os.path.exists(journal)
+
+
+def test_a_crash_during_replay_loses_nothing(tmp_path):
+    journal = str(tmp_path / 'journal.jsonl')
+    _journal_only(journal)._append_journal([_item('u', i) for i in range(3)])
+
+    class Crash(BaseException):
+        pass
+
+    class Dies(Recorder):
+        def dynamoAddBatch(self, items):
+            raise Crash()
+
+    # e.g. the process is killed while the batch is sent: the journal is untouched
+    with pytest.raises(Crash):
+        _journal_only(journal, Dies())._replay_journal()
+    dynamo = Recorder()
+    _journal_only(journal, dynamo)._replay_journal()
+    assert dynamo.written() == [('u', '0'), ('u', '1'), ('u', '2')]
@@ -6,17 +6,44 @@
 Custom Voting Classifier modified from Scikit-learn VotingClassifier
 - Uses Pre-trained Models
 - predict function:  returns predicted class and average probability for that class for display purpose
+- Optional executor: estimators run concurrently, and with a timeout the vote uses
+  only the estimators that answered in time. An estimator cannot be stopped once it runs:
+  until it returns it is left out of later votes instead of being submitted again
+- Every estimator call is timed into metrics (estimator_seconds{estimator=...,method=...})
 """
 
+import time
+import logging
+import threading
 import numpy as np
+from concurrent.futures import wait
+
+import metrics
+
+log = logging.getLogger(__name__)
 
 
 class VotingClassifier(object):
-    def __init__(self, estimators, voting='hard', weights=None):
+    def __init__(self, estimators, voting='hard', weights=None, executor=None, timeout=None):
+        """
+        executor : None (serial) or a concurrent.futures executor. An executor with a
+            submit_estimator(name, method, X) method (e.g. registry.PreloadedProcessPool)
+            is called by estimator name, so models are not pickled per call.
+        timeout : seconds to wait for the estimators when an executor is used. Estimators
+            that miss it are left out of the vote. Cancelling only stops the calls that
+            have not started: a call already running keeps its worker until it returns,
+            and its estimator sits out the votes until then, so slow estimators do not
+            pile up calls on the executor.
+        """
         self.estimators = [e[1] for e in estimators]
+        self.names = [e[0] for e in estimators]
         self.named_estimators = dict(estimators)
         self.voting = voting
         self.weights = weights
+        self.executor = executor
+        self.timeout = timeout
+        self._stragglers = {}   # estimator index -> call still running after its timeout
+        self._stragglers_lock = threading.Lock()
 
     def fit(self, X, y, sample_weight=None):
         raise NotImplementedError
@@ -37,39 +64,124 @@ class VotingClassifier(object):
         prob: array-like, shape = [n_samples]
             Average of predicted probabilities of the winning class. 
         """
-        prob = []
+        # every estimator runs predict_proba once; hard labels are derived from it
+        results, active = self._run('predict_proba', X)
+        probas = np.transpose(np.asarray(results), (1, 0, 2))
+        weights = self._weights(active)
         if self.voting == 'soft':   # soft voting
             # get winning class
-            maj = np.argmax(self.predict_proba(X), axis=1)
-            # get average for all probabilies predicted for class maj
-            all_probs = self._collect_probas(X)
-            all_probs = np.array([xi[:, 1] for xi in all_probs])
-            for i in range(len(maj)): 
-                prob_i = all_probs[i]
-                if maj[i] == 0: 
-                    prob.append(np.average(prob_i[prob_i<0.5]))
-                else: 
-                    prob.append(np.average(prob_i[prob_i>0.5]))
+            maj = np.argmax(np.average(probas, axis=1, weights=weights), axis=1)
         else:  # 'hard' voting
-            predictions = self._predict(X)
-            maj = np.apply_along_axis(lambda x:
-                                      np.argmax(np.bincount(x,
-                                                weights=self.weights)),
-                                      axis=1,
-                                      arr=predictions.astype('int'))
-            all_probs = self._collect_probas(X)
-            all_probs = np.array([xi[:, 1] for xi in all_probs])
-            for i in range(len(maj)): 
-                prob_i = all_probs[i]
-                if maj[i] == 0: 
-                    prob.append(np.average(prob_i[prob_i<0.5]))
-                else: 
-                    prob.append(np.average(prob_i[prob_i>0.5]))
+            maj = self._majority(self._labels_from_probas(probas, active), weights)
+        # get average for all probabilies predicted for class maj
+        prob = self._confident_average(probas[:, :, 1], maj)
         return maj, prob
 
+    def _run(self, method, X):
+        """Calls <method>(X) on every estimator.
+
+        Returns
+        ----------
+        results : list of the outputs of the estimators that answered
+        active : indices (into self.estimators) of those estimators
+        """
+        if self.executor is None:
+            results = []
+            for name, clf in zip(self.names, self.estimators):
+                with metrics.timer('estimator', estimator=name, method=method):
+                    results.append(getattr(clf, method)(X))
+            return results, list(range(len(self.estimators)))
+        with self._stragglers_lock:
+            self._stragglers = {i: f for i, f in self._stragglers.items() if not f.done()}
+            busy = set(self._stragglers)
+        if busy:
+            for i in sorted(busy):
+                metrics.inc('estimator_skipped', estimator=self.names[i])
+            log.warning('Estimators left out of the vote (still running): %s',
+                        ', '.join(self.names[i] for i in sorted(busy)))
+        indices = [i for i in range(len(self.estimators)) if i not in busy]
+        start = time.perf_counter()
+        if hasattr(self.executor, 'submit_estimator'):
+            futures = [self.executor.submit_estimator(self.names[i], method, X) for i in indices]
+        else:
+            futures = [self.executor.submit(getattr(self.estimators[i], method), X) for i in indices]
+
+        def timed(name):
+            # time from submission to completion, including the wait for a free worker
+            def done(f):
+                if not f.cancelled():
+                    metrics.observe('estimator', time.perf_counter() - start, estimator=name, method=method)
+            return done
+        for i, f in zip(indices, futures):
+            f.add_done_callback(timed(self.names[i]))
+        done, not_done = wait(futures, timeout=self.timeout)
+        with self._stragglers_lock:
+            for i, f in zip(indices, futures):
+                if f in not_done and not f.cancel():
+                    self._stragglers[i] = f
+        active = [i for i, f in zip(indices, futures) if f in done]
+        if not active:
+            metrics.inc('estimator_timeouts', len(futures))
+            raise TimeoutError('No estimator finished within %r seconds' % self.timeout)
+        if not_done:
+            missed = [self.names[i] for i, f in zip(indices, futures) if f in not_done]
+            for name in missed:
+                metrics.inc('estimator_timeouts', estimator=name)
+            log.warning('Estimators left out of the vote (timeout): %s', ', '.join(missed))
+        return [f.result() for f in futures if f in done], active
+
+    def _weights(self, active):
+        """Weights of the active estimators. """
+        if self.weights is None:
+            return None
+        return [self.weights[i] for i in active]
+
+    def _labels_from_probas(self, probas, active):
+        """Class labels per estimator, shape = [n_samples, n_classifiers]. """
+        n_classes = probas.shape[2]
+        classes = np.asarray([getattr(self.estimators[i], 'classes_', np.arange(n_classes))
+                              for i in active])
+        return classes[np.arange(len(classes)), np.argmax(probas, axis=2)].astype('int')
+
+    def _majority(self, predictions, weights=None):
+        """Weighted majority vote per sample, ties go to the smallest label. """
+        weights = np.ones(predictions.shape[1]) if weights is None else np.asarray(weights, dtype=float)
+        n_labels = predictions.max() + 1 if predictions.size else 1
+        one_hot = predictions[:, :, np.newaxis] == np.arange(n_labels)
+        votes = (one_hot * weights[np.newaxis, :, np.newaxis]).sum(axis=1)
+        return np.argmax(votes, axis=1)
+
+    def _confident_average(self, all_probs, maj):
+        """Average of the probabilities that agree with maj (< 0.5 for class 0, > 0.5 otherwise). """
+        agree = np.where(maj[:, np.newaxis] == 0, all_probs < 0.5, all_probs > 0.5)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = np.where(agree, all_probs, 0.0).sum(axis=1) / agree.sum(axis=1)
+        return list(avg)
+
+    def predict_groups(self, Xs):
+        """ Predict several feature matrices with one estimator pass.
+
+        Parameters
+        ----------
+        Xs : list of array-like, each shape = [n_samples_i, n_features]
+
+        Returns
+        ----------
+        list of (maj, prob), one per matrix in Xs, as returned by predict.
+        """
+        sizes = [len(X) for X in Xs]
+        maj, prob = self.predict(np.concatenate(Xs, axis=0))
+        ret = []
+        start = 0
+        for size in sizes:
+            ret.append((maj[start:start+size], prob[start:start+size]))
+            start += size
+        return ret
+
     def _collect_probas(self, X):
         """Collect results from clf.predict calls. """
-        probas = np.asarray([clf.predict_proba(X) for clf in self.estimators])
+        results, _ = self._run('predict_proba', X)
+        probas = np.asarray(results)
         probas = np.transpose(probas, (1, 0, 2))
         return probas
 
@@ -78,7 +190,9 @@ class VotingClassifier(object):
         if self.voting == 'hard':
             raise AttributeError("predict_proba is not available when"
                                  " voting=%r" % self.voting)
-        avg = np.average(self._collect_probas(X), axis=1, weights=self.weights)
+        results, active = self._run('predict_proba', X)
+        probas = np.transpose(np.asarray(results), (1, 0, 2))
+        avg = np.average(probas, axis=1, weights=self._weights(active))
         return avg
 
     @property
@@ -124,4 +238,5 @@ class VotingClassifier(object):
 
     def _predict(self, X):
         """Collect results from clf.predict calls. """
-        return np.asarray([clf.predict(X) for clf in self.estimators]).T
\ No newline at end of file
+        results, _ = self._run('predict', X)
+        return np.asarray(results).T
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+Warm start-up of the Flask server
+    warmup():
+    - imports the heavy modules of the pipeline and loads the ensemble of get_registry()
+    - measures the import time of every module, logs it and records it in metrics
+      (import_seconds{module=...})
+    - freezes the loaded objects out of the garbage collector, so workers forked afterwards
+      (e.g. gunicorn --preload with PRELOAD_MODELS=1) keep sharing their pages copy-on-write
+
+    python warmup.py
+    - prints the import time report (modules already imported by earlier ones count as 0)
+"""
+
+import gc
+import sys
+import time
+import logging
+import importlib
+
+import metrics
+
+# in dependency order, so each time is what that module adds on top of the earlier ones
+MODULES = ['numpy', 'pandas', 'boto3', 'features', 'EmotionML', 'Mindwave', 'Dynamo', 'registry']
+
+log = logging.getLogger(__name__)
+
+
+def import_times(modules=MODULES):
+    """Imports every module, returns {module: seconds} (None if it cannot be imported). """
+    times = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            log.warning('Could not import %s: %s', name, e)
+            times[name] = None
+            continue
+        times[name] = time.perf_counter() - start
+        metrics.observe('import', times[name], module=name)
+    return times
+
+
+def warmup(models=True):
+    """Imports the pipeline and loads the ensemble, returns {step: seconds}. """
+    times = import_times()
+    if models:
+        from registry import get_registry
+        start = time.perf_counter()
+        get_registry().voting_classifier()
+        times['models'] = time.perf_counter() - start
+        metrics.observe('import', times['models'], module='models')
+    # everything loaded so far lives until exit: keep the collector from touching (and so
+    # un-sharing) these pages in forked workers
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    for name, seconds in times.items():
+        if seconds is not None:
+            log.info('warm-up %-10s %8.1f ms', name, seconds * 1000)
+    return times
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    times = warmup(models='--no-models' not in sys.argv)
+    for name, seconds in times.items():
+        print('{:<10} {:>10}'.format(name, 'failed' if seconds is None else '{:.1f} ms'.format(seconds * 1000)))
+    print('{:<10} {:>10.1f} ms'.format('total', (time.perf_counter() - start) * 1000))
@@ -0,0 +1,238 @@
+"""
+class WriteBehind:
+    - asynchronous write-behind queue in front of Dynamo, same dynamoAdd() signature
+    - a background thread writes queued items in batches through batch_writer
+    - throttled or failed batches are retried with exponential backoff
+    - batches that still fail are appended to a local journal (JSON lines) and replayed
+      on start-up and after the next successful batch, so no result is lost; replayed items
+      leave the journal only once DynamoDB has accepted them
+    - the journal may be shared by several processes (web workers): appends and replays
+      hold an exclusive flock on <journal>.lock
+    - close() (also registered with atexit) flushes everything that is queued
+    Reads (dynamoQuery, dynamoSummaries, dynamoGetData) do not wait for the queue: items
+    this process has not written yet (queued, in flight or journaled) are merged into
+    the results of DynamoDB, so reads do not stall while DynamoDB is retried.
+"""
+
+import os
+import json
+import time
+import base64
+import atexit
+import logging
+import threading
+import queue
+try:
+    import fcntl
+except ImportError:     # no flock (Windows): the journal is only safe within one process
+    fcntl = None
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+class WriteBehind(object):
+    def __init__(self, dynamo, journal_path, batch_size=25, flush_interval=1.0, max_retries=5, backoff=0.2):
+        self.dynamo = dynamo
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._journal_lock = threading.Lock()
+        # (userName, time) -> item not written to DynamoDB yet by this process
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='dynamo-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    #========== store interface ==========#
+
+    def dynamoAdd(self, userName, time, data, result, cls=None):
+        assert not self._closed, 'ERROR: write-behind queue is closed'
+        item = self.dynamo.makeItem(userName, time, data, result, cls)
+        self._hold([item])
+        self._queue.put(item)
+
+    def dynamoQuery(self, userName):
+        return self._merge(self.dynamo.dynamoQuery(userName), self._pending_items(userName))
+
+    def dynamoSummaries(self, userName):
+        pending = [{k: item[k] for k in ('time', 'result', 'cls') if k in item}
+                   for item in self._pending_items(userName)]
+        return self._merge(self.dynamo.dynamoSummaries(userName), pending)
+
+    def dynamoGetData(self, userName, time):
+        with self._pending_lock:
+            item = self._pending.get((userName, time))
+        if item is not None:
+            return item['data']
+        return self.dynamo.dynamoGetData(userName, time)
+
+    def flush(self, timeout=None):
+        """Blocks until every queued item is written (or journaled), at most timeout seconds.
+        Returns False if items are still queued. """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    #========== items not written yet ==========#
+
+    def _hold(self, items):
+        with self._pending_lock:
+            for item in items:
+                self._pending[(item['userName'], item['time'])] = item
+
+    def _release(self, items):
+        with self._pending_lock:
+            for item in items:
+                key = (item['userName'], item['time'])
+                if self._pending.get(key) is item:
+                    del self._pending[key]
+
+    def _pending_items(self, userName):
+        with self._pending_lock:
+            return [item for (user, _), item in self._pending.items() if user == userName]
+
+    def _merge(self, stored, pending):
+        """Helper function: stored items of a user with the pending ones (which win), in time order. """
+        stored = list(stored)
+        if not pending:
+            return stored
+        times = set(item['time'] for item in pending)
+        return sorted([item for item in stored if item['time'] not in times] + pending, key=lambda item: item['time'])
+
+    #========== background writer ==========#
+
+    def _run(self):
+        if os.path.exists(self.journal_path):
+            self._replay_journal()
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+            items = [item for item in batch if item is not None]
+            if items:
+                self._write(items)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, items):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.dynamo.dynamoAddBatch(items)
+                self._release(items)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    log.warning('DynamoDB unavailable (%s), %d items journaled. ', e, len(items))
+                    metrics.inc('write_behind_journaled', len(items))
+                    self._append_journal(items)
+                    return
+                metrics.inc('write_behind_retries')
+                time.sleep(self.backoff * 2 ** attempt)
+        if os.path.exists(self.journal_path):
+            self._replay_journal()
+
+    #========== journal ==========#
+
+    def _locked_journal(self):
+        """Helper function: exclusive lock of the journal, across threads and processes. """
+        return _JournalLock(self._journal_lock, self.journal_path + '.lock')
+
+    def _append_journal(self, items):
+        with self._locked_journal():
+            with open(self.journal_path, 'a') as f:
+                for item in items:
+                    f.write(json.dumps(self._to_json(item)) + '\n')
+
+    def _replay_journal(self):
+        """Writes the journaled items in batches; the journal keeps every item not written yet. """
+        with self._locked_journal():
+            if not os.path.exists(self.journal_path):
+                return
+            with open(self.journal_path) as f:
+                items = [self._from_json(json.loads(line)) for line in f if line.strip()]
+            self._hold(items)
+            log.info('Replaying %d journaled items. ', len(items))
+            written = 0
+            try:
+                for start in range(0, len(items), self.batch_size):
+                    batch = items[start:start+self.batch_size]
+                    self.dynamo.dynamoAddBatch(batch)
+                    self._release(batch)
+                    written += len(batch)
+            except Exception as e:
+                log.warning('DynamoDB unavailable (%s), %d items stay journaled. ', e, len(items) - written)
+            metrics.inc('write_behind_replayed', written)
+            self._rewrite_journal(items[written:])
+
+    def _rewrite_journal(self, items):
+        """Replaces the journal by items (removes it if there are none); the journal lock must be held. """
+        if not items:
+            os.remove(self.journal_path)
+            return
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for item in items:
+                f.write(json.dumps(self._to_json(item)) + '\n')
+        os.replace(tmp_path, self.journal_path)
+
+    def _to_json(self, item):
+        item = dict(item)
+        if isinstance(item['data'], (bytes, bytearray)):
+            item['data_b64'] = base64.b64encode(item.pop('data')).decode('ascii')
+        return item
+
+    def _from_json(self, item):
+        if 'data_b64' in item:
+            item['data'] = base64.b64decode(item.pop('data_b64'))
+        return item
+
+
+class _JournalLock(object):
+    """Holds a thread lock and an exclusive flock on a lock file (if fcntl is available). """
+    def __init__(self, thread_lock, path):
+        self.thread_lock = thread_lock
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                self._file = open(self.path, 'a')
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                self._close()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.thread_lock.release()